@@ -0,0 +1,193 @@
+"""
+Batch review generation from a ratings file.
+
+Reads a CSV or JSONL file of reviewees and their per-behavior ratings, generates
+the feedback text for each across a process pool, and streams results to a
+JSONL file as each review finishes.
+
+Ratings are given in form order (see PerformanceReviewGenerator.behavior_items)
+as 0 (does not meet), 1 (meets) or 2 (exceeds).
+
+CSV columns:
+    name, pronoun_subject, pronoun_possessive, role, level, ratings, comment_<section>...
+    where ``ratings`` is a digit string such as "1121..." (spaces/commas are ignored).
+
+JSONL fields:
+    {"name": ..., "pronouns": ["they", "their"], "role": ..., "level": ...,
+     "ratings": [1, 1, 2, ...] or "1121...", "comments": {"<section>": "..."}}
+
+Usage:
+    python batch_review.py ratings.csv -o reviews.jsonl --workers 8
+    python batch_review.py ratings.csv -o reviews.jsonl --narratives --concurrency 16
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from narrative_engine import NarrativeEngine
+from performance_review_generator import PerformanceReviewGenerator
+from role_registry import registry
+
+
+def parse_ratings(value):
+    """Parses ratings given as a list of ints or a digit string like '1,1,2' / '112'."""
+    if isinstance(value, str):
+        return [int(c) for c in value if c.isdigit()]
+    return [int(r) for r in value]
+
+
+def normalize_row(row):
+    """Converts a CSV or JSONL record into the fields needed to generate a review."""
+    pronouns = row.get('pronouns') or [row.get('pronoun_subject') or 'they', row.get('pronoun_possessive') or 'their']
+    comments = dict(row.get('comments') or {})
+    for key, value in row.items():
+        if key.startswith('comment_') and value:
+            comments[key[len('comment_'):]] = value.strip()
+    return {
+        'name': row['name'],
+        'pronouns': list(pronouns),
+        'role': row['role'],
+        'level': row['level'].lower(),
+        'ratings': parse_ratings(row['ratings']),
+        'comments': comments,
+    }
+
+
+def read_rows(path):
+    """Yields raw records from a .csv or .jsonl ratings file."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _init_worker():
+    # Load every role definition once per worker process rather than once per row
+    for role in registry.list_roles():
+        registry.get(role)
+
+
+def generate_review(index, row, include_messages=False):
+    """Generates the feedback text for one record. Runs in a worker process."""
+    try:
+        review = normalize_row(row)
+        # The generator prints the selected level; keep worker output quiet
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = PerformanceReviewGenerator(
+                name=review['name'],
+                pronouns=review['pronouns'],
+                role=review['role'],
+                level=review['level'],
+            )
+        generator.apply_ratings(review['ratings'], review['comments'])
+        generator.give_feedback()
+        result = {
+            'row': index,
+            'name': review['name'],
+            'role': review['role'],
+            'level': review['level'],
+            'comments': review['comments'],
+            'feedback': generator.feedback,
+        }
+        if include_messages:
+            prompt = generator.build_prompt()
+            result['messages'] = prompt.messages
+            result['prompt_tokens'] = prompt.prompt_tokens
+        return result
+    except Exception as e:
+        return {'row': index, 'name': row.get('name'), 'error': f"{e.__class__.__name__}: {e}"}
+
+
+def run_batch(input_path, output_path, workers=None, max_in_flight=None, engine=None):
+    """
+    Generates reviews for every record in ``input_path`` and streams them to ``output_path``.
+    If a NarrativeEngine is given, each review's ChatGPT narrative is requested as soon as
+    its feedback is ready and the record is written once the narrative completes.
+    Returns (total, errors, elapsed_seconds).
+    """
+    workers = workers or os.cpu_count() or 1
+    # Bound outstanding work so memory stays flat for very large inputs
+    max_in_flight = max_in_flight or workers * 4
+    total = errors = 0
+    start = time.perf_counter()
+    with open(output_path, 'w', encoding='utf-8') as out, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # Review futures and narrative futures are waited on together
+        pending = {}
+
+        def write(result):
+            nonlocal total, errors
+            total += 1
+            if 'error' in result:
+                errors += 1
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                review = pending.pop(future)
+                if review is None:
+                    result = future.result()
+                    messages = result.pop('messages', None)
+                    if engine is not None and messages is not None:
+                        pending[engine.submit(messages, key=result['row'])] = result
+                        continue
+                    write(result)
+                else:
+                    narrative = future.result()
+                    if narrative.ok:
+                        review['chatgpt_result'] = narrative.text
+                        review['prompt_tokens_reported'] = getattr(narrative.usage, 'prompt_tokens', None)
+                    else:
+                        review['error'] = f"narrative failed: {narrative.error}"
+                    write(review)
+            out.flush()
+
+        for index, row in enumerate(read_rows(input_path)):
+            pending[executor.submit(generate_review, index, row, engine is not None)] = None
+            if len(pending) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+        while pending:
+            drain(FIRST_COMPLETED)
+    return total, errors, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate feedback for many reviewees from a ratings file.")
+    parser.add_argument('input', help="CSV or JSONL ratings file")
+    parser.add_argument('-o', '--output', default='reviews.jsonl', help="JSONL output file (default: reviews.jsonl)")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--narratives', action='store_true', help="Also generate a ChatGPT narrative per review")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent ChatGPT requests (default: 8)")
+    parser.add_argument('--rpm', type=float, default=500, help="ChatGPT requests per minute budget")
+    parser.add_argument('--tpm', type=float, default=200_000, help="ChatGPT tokens per minute budget")
+    args = parser.parse_args(argv)
+
+    engine = None
+    if args.narratives:
+        engine = NarrativeEngine(max_concurrency=args.concurrency, requests_per_minute=args.rpm,
+                                 tokens_per_minute=args.tpm)
+    try:
+        total, errors, elapsed = run_batch(args.input, args.output, args.workers, engine=engine)
+    finally:
+        if engine is not None:
+            engine.close()
+    rate = total / elapsed if elapsed else 0.0
+    print(f"Generated {total - errors}/{total} reviews in {elapsed:.2f}s ({rate:.1f} reviews/s); "
+          f"{errors} errors. Output: {args.output}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Inverted-index search over every behavior in ``role_definitions/``.
+
+Each role file gets its own index (term -> {behavior: term count}, plus a
+sorted vocabulary for prefix lookups), built from the shared role registry and
+rebuilt only when that file's version changes. Queries match every query term
+either exactly or as a prefix of an indexed term, and are ranked with BM25;
+prefix-only matches count for a little less than exact ones.
+
+Usage:
+    python behavior_search.py "on-call"
+    python behavior_search.py "mentor" --role "Software Engineer" --level senior -n 5
+"""
+
+import argparse
+import bisect
+import math
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Dict, List, Optional
+
+from review_model import ordered_sections
+from role_registry import RoleRegistry, registry
+
+# Placeholders are not searchable; display text uses these in their place
+DISPLAY_NAME = '[name]'
+DISPLAY_PRONOUNS = ('they', 'their')
+
+STOPWORDS = frozenset('a an and are as at be by for from in into is it its of on or that the their they this to with'.split())
+
+# BM25 parameters and the weight of a prefix-only match
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_WEIGHT = 0.7
+
+_PLACEHOLDER = re.compile(r'\{[^{}]*\}')
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens without placeholders or stopwords; 'on-call' gives ['on', 'call']."""
+    return [t for t in _TOKEN.findall(_PLACEHOLDER.sub(' ', text).lower()) if t not in STOPWORDS]
+
+
+def query_terms(query: str) -> List[str]:
+    # Unlike indexing, keep stopwords that are the only thing typed, e.g. "on" while typing "on-call"
+    tokens = _TOKEN.findall(query.lower())
+    terms = [t for t in tokens if t not in STOPWORDS]
+    return terms or tokens
+
+
+class RoleIndex:
+    """
+    Inverted index over one role definition version.
+    """
+    __slots__ = ("role", "version", "docs", "lengths", "postings", "vocabulary")
+
+    def __init__(self, role: str, version: str, docs: List[tuple]) -> None:
+        self.role = role
+        self.version = version
+        # (level, section, subsection, display text) per behavior
+        self.docs = docs
+        self.lengths = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, (_, _, _, text) in enumerate(docs):
+            counts = Counter(tokenize(text))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[doc_id] = count
+        self.vocabulary = sorted(self.postings)
+
+    def expand(self, term: str) -> List[str]:
+        """Indexed terms equal to or starting with ``term``."""
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(self.vocabulary, term + '\uffff', start)
+        return self.vocabulary[start:end]
+
+
+def build_role_index(role: str, roles: RoleRegistry = registry) -> RoleIndex:
+    definition = roles.get(role)
+    docs = []
+    for level in definition.templates:
+        view = roles.render_level(role, level, DISPLAY_NAME, DISPLAY_PRONOUNS)
+        for section in ordered_sections(view):
+            for subsection, behaviors in view[section].items():
+                docs.extend((level, section, subsection, text) for text in behaviors)
+    return RoleIndex(role, definition.version, docs)
+
+
+class BehaviorIndex:
+    """
+    Search across all roles, rebuilding a role's index only when its YAML changes.
+    """
+    def __init__(self, roles: RoleRegistry = registry) -> None:
+        self.roles = roles
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, RoleIndex] = {}
+        self.builds = 0
+
+    def indexes(self) -> List[RoleIndex]:
+        """Current per-role indexes; the registry's stat check decides what needs rebuilding."""
+        current = []
+        for role in self.roles.list_roles():
+            try:
+                version = self.roles.get(role).version
+            except Exception as e:
+                print(f'Skipping role {role} in search index: {e}')
+                continue
+            index = self._indexes.get(role)
+            if index is None or index.version != version:
+                with self._lock:
+                    index = self._indexes.get(role)
+                    if index is None or index.version != version:
+                        index = self._indexes[role] = build_role_index(role, self.roles)
+                        self.builds += 1
+            current.append(index)
+        return current
+
+    def search(self, query: str, role: Optional[str] = None, level: Optional[str] = None,
+               section: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """
+        Returns behaviors matching every term of ``query`` (each as a word or word prefix),
+        best first, as dicts of role, level, section, subsection, text and score.
+        """
+        terms = query_terms(query)
+        if not terms:
+            return []
+        indexes = [index for index in self.indexes() if role is None or index.role.lower() == role.lower()]
+        total_docs = sum(len(index.docs) for index in indexes) or 1
+        average_length = sum(sum(index.lengths) for index in indexes) / total_docs
+        # Expansions per term per role, and document frequencies across all roles for IDF
+        expansions = [{index.role: index.expand(term) for index in indexes} for term in terms]
+        df = Counter()
+        for by_role in expansions:
+            for index in indexes:
+                for word in by_role[index.role]:
+                    df[word] += len(index.postings[word])
+
+        hits = []
+        for index in indexes:
+            scores = None
+            for term, by_role in zip(terms, expansions):
+                term_scores = {}
+                for word in by_role[index.role]:
+                    idf = math.log(1 + (total_docs - df[word] + 0.5) / (df[word] + 0.5))
+                    weight = idf * (1.0 if word == term else PREFIX_WEIGHT)
+                    for doc_id, tf in index.postings[word].items():
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * index.lengths[doc_id] / average_length)
+                        score = weight * tf * (BM25_K1 + 1) / norm
+                        # Several expansions of one term in a behavior count once, at their best
+                        if score > term_scores.get(doc_id, 0.0):
+                            term_scores[doc_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc_id: s + term_scores[doc_id] for doc_id, s in scores.items() if doc_id in term_scores}
+                if not scores:
+                    break
+            for doc_id, score in (scores or {}).items():
+                doc_level, doc_section, subsection, text = index.docs[doc_id]
+                if (level is None or doc_level == level) and (section is None or doc_section == section):
+                    hits.append((score, index.role, doc_id))
+        hits.sort(key=lambda hit: (-hit[0], hit[1], hit[2]))
+        results = []
+        by_role = {index.role: index for index in indexes}
+        for score, role_name, doc_id in hits[:limit]:
+            doc_level, doc_section, subsection, text = by_role[role_name].docs[doc_id]
+            results.append({'role': role_name, 'level': doc_level, 'section': doc_section,
+                            'subsection': subsection, 'text': text, 'score': round(score, 3)})
+        return results
+
+    def stats(self) -> dict:
+        return {'roles': len(self._indexes), 'behaviors': sum(len(i.docs) for i in self._indexes.values()),
+                'terms': sum(len(i.postings) for i in self._indexes.values()), 'builds': self.builds}
+
+
+# Process-wide index over the shared registry
+behavior_index = BehaviorIndex()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search behaviors across all roles and levels.")
+    parser.add_argument('query', help="Words or word prefixes, e.g. 'on-call' or 'mentor'")
+    parser.add_argument('--role')
+    parser.add_argument('--level')
+    parser.add_argument('--section')
+    parser.add_argument('-n', '--limit', type=int, default=20)
+    args = parser.parse_args(argv)
+    results = behavior_index.search(args.query, args.role, args.level, args.section, args.limit)
+    for hit in results:
+        print(f"{hit['role']} / {hit['level']} / {hit['section']} / {hit['subsection']}  ({hit['score']})")
+        print(f"    {hit['text']}")
+    if not results:
+        print("No matching behaviors.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
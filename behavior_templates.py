@@ -0,0 +1,109 @@
+"""
+Precompiled behavior templates.
+
+Behavior strings in the role YAML use ``{name}`` and ``{pronouns[i]}``
+placeholders. Rather than calling ``str.format`` on every string for every
+request, each string is split once into literal parts and placeholder slots,
+and rendering is a direct join over those parts. Malformed placeholders are
+reported when the YAML is loaded instead of in the middle of a request.
+"""
+
+from string import Formatter
+from types import MappingProxyType
+from typing import Sequence
+
+# Pronoun slots collected by the UI: [subject, possessive]
+PRONOUN_SLOTS = 2
+
+# Slot marker for {name}; pronoun slots are their integer index
+NAME_SLOT = -1
+
+_formatter = Formatter()
+
+
+class TemplateError(ValueError):
+    """Raised when a behavior string contains an unsupported or malformed placeholder."""
+
+
+class BehaviorTemplate:
+    """
+    A behavior string pre-split into literal text and placeholder slots.
+    """
+    __slots__ = ("source", "parts")
+
+    def __init__(self, source: str, parts: tuple) -> None:
+        self.source = source
+        self.parts = parts
+
+    def render(self, name: str, pronouns: Sequence[str]) -> str:
+        if len(self.parts) == 1 and type(self.parts[0]) is str:
+            return self.parts[0]
+        return ''.join(
+            part if type(part) is str else (name if part == NAME_SLOT else pronouns[part])
+            for part in self.parts
+        )
+
+    def __repr__(self) -> str:
+        return f"BehaviorTemplate({self.source!r})"
+
+
+def _slot_for(field: str, where: str, source: str) -> int:
+    if field == 'name':
+        return NAME_SLOT
+    if field.startswith('pronouns[') and field.endswith(']'):
+        index = field[len('pronouns['):-1]
+        if index.isdigit() and int(index) < PRONOUN_SLOTS:
+            return int(index)
+    raise TemplateError(f"{where}: unsupported placeholder '{{{field}}}' in {source!r}")
+
+
+def compile_template(source: str, where: str = "behavior") -> BehaviorTemplate:
+    """
+    Compiles a behavior string into a BehaviorTemplate, raising TemplateError if it is malformed.
+    """
+    if not isinstance(source, str):
+        raise TemplateError(f"{where}: behavior must be a string, got {type(source).__name__}")
+    try:
+        parsed = list(_formatter.parse(source))
+    except ValueError as e:
+        raise TemplateError(f"{where}: malformed placeholder in {source!r}: {e}") from None
+    parts = []
+    for literal, field, format_spec, conversion in parsed:
+        if literal:
+            parts.append(literal)
+        if field is None:
+            continue
+        if format_spec or conversion:
+            raise TemplateError(f"{where}: format specs are not supported in {source!r}")
+        parts.append(_slot_for(field, where, source))
+    # Merge an empty template into a single literal so render() can take its fast path
+    return BehaviorTemplate(source, tuple(parts) or ('',))
+
+
+def compile_level(level_data, where: str = "level"):
+    """
+    Compiles a level's section -> subsection -> behaviors mapping into templates.
+    """
+    compiled = {}
+    for section, section_dict in level_data.items():
+        compiled[section] = MappingProxyType({
+            subsection: tuple(
+                compile_template(s, f"{where}/{section}/{subsection}")
+                for s in (behaviors or ())
+            )
+            for subsection, behaviors in section_dict.items()
+        })
+    return MappingProxyType(compiled)
+
+
+def render_level(compiled_level, name: str, pronouns: Sequence[str]):
+    """
+    Renders a compiled level for a reviewee into a read-only section -> subsection -> behaviors view.
+    """
+    return MappingProxyType({
+        section: MappingProxyType({
+            subsection: tuple(t.render(name, pronouns) for t in templates)
+            for subsection, templates in section_dict.items()
+        })
+        for section, section_dict in compiled_level.items()
+    })
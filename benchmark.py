@@ -0,0 +1,320 @@
+"""
+Performance benchmarks for the review generator and web app.
+
+Measures:
+  - PerformanceReviewGenerator construction per role/level (cold and warm registry)
+  - give_feedback rendering
+  - /feedback GET and POST, and the results page, through the Flask test client
+  - pickled session size after a submitted review
+  - /resume lookup with N drafts in the session index
+  - session read and write per session store with N active sessions
+  - all of the above for synthetic role YAMLs of growing size
+
+The LLM is never called: narrative jobs use a stub runner. Results are written
+as JSON and compared against a stored baseline; any benchmark slower than the
+baseline by more than the tolerance is reported as a regression.
+
+Usage:
+    python benchmark.py                       # run, compare with benchmark_baseline.json
+    python benchmark.py -o results.json       # also write results
+    python benchmark.py --update-baseline     # store this run as the new baseline
+    python benchmark.py --quick               # fewer repeats and smaller inputs
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import pickle
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+
+REAL_ROLES = [
+    ("Software Engineer", "junior"),
+    ("Software Engineer", "principal"),
+    ("Machine Learning Engineer", "senior"),
+    ("Engineering Manager", "m3"),
+]
+
+# (levels, sections, subsections per section, behaviors per subsection)
+SYNTHETIC_SIZES = [
+    (2, 4, 2, 3),
+    (6, 6, 3, 5),
+    (10, 8, 4, 8),
+]
+
+
+def timeit(fn, repeat, warmup=1):
+    """Runs fn repeatedly and returns timing stats in microseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'median_us': round(statistics.median(samples), 2),
+        'min_us': round(samples[0], 2),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        'n': repeat,
+    }
+
+
+def synthetic_role_yaml(levels, sections, subsections, behaviors):
+    """Builds a role definition with the given shape and realistic behavior strings."""
+    level_names = [f"l{i}" for i in range(levels)]
+    data = {'level_map': {name: name.upper() for name in level_names}, 'levels': {}}
+    for name in level_names:
+        data['levels'][name] = {
+            ('overview' if s == 0 else f"section {s}"): {
+                f"subsection {ss}": [
+                    f"{{name}} works with {{pronouns[1]}} team on behavior {b} of subsection {ss}, "
+                    f"and {{pronouns[0]}} raises risks early with {{pronouns[1]}} manager."
+                    for b in range(behaviors)
+                ]
+                for ss in range(subsections)
+            }
+            for s in range(sections)
+        }
+    return yaml.safe_dump(data, sort_keys=False)
+
+
+@contextlib.contextmanager
+def use_role_dir(path):
+    """Points the shared role registry at another directory for the duration of the block."""
+    from role_registry import registry
+    original = registry.role_dir
+    registry.role_dir = path
+    registry.clear()
+    try:
+        yield registry
+    finally:
+        registry.role_dir = original
+        registry.clear()
+
+
+@contextlib.contextmanager
+def quiet():
+    # The generator prints the selected level on construction
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_generator(results, role, level, repeat, prefix):
+    from performance_review_generator import PerformanceReviewGenerator
+    from role_registry import registry
+
+    def construct():
+        return PerformanceReviewGenerator(name='Bench User', pronouns=['they', 'their'], role=role, level=level)
+
+    def construct_cold():
+        registry.clear()
+        construct()
+
+    with quiet():
+        results[f'{prefix}/construct_cold'] = timeit(construct_cold, max(3, repeat // 10))
+        results[f'{prefix}/construct_warm'] = timeit(construct, repeat)
+        generator = construct()
+        items = generator.behavior_items()
+        ratings = [i % 3 for i in range(len(items))]
+        generator.apply_ratings(ratings, {section: 'Comment' for section in generator.ordered_sections()})
+        results[f'{prefix}/give_feedback'] = timeit(generator.give_feedback, repeat)
+    return len(items)
+
+
+def bench_webapp(results, sizes, role, level, repeat, prefix):
+    import webapp
+
+    client = webapp.app.test_client()
+    with quiet():
+        client.post('/', data={'name': 'Bench User', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                               'role': role, 'level': level})
+        client.get('/feedback')
+        with client.session_transaction() as sess:
+            size = sess['draft']['size']
+            sections = sess['draft']['sections']
+        form = {f'rating_{i}': str(i % 3) for i in range(size)}
+        form.update({f'comment_{section}': f'Comment for {section}' for section in sections})
+
+        results[f'{prefix}/feedback_get'] = timeit(lambda: client.get('/feedback'), repeat)
+        results[f'{prefix}/feedback_post'] = timeit(lambda: client.post('/feedback', data=form), repeat)
+
+        client.post('/feedback', data=form)
+        with client.session_transaction() as sess:
+            sess['chatgpt_result'] = 'Stub narrative.'
+            sizes[f'{prefix}/session_pickle_bytes'] = len(pickle.dumps(dict(sess), protocol=pickle.HIGHEST_PROTOCOL))
+        results[f'{prefix}/results_get'] = timeit(lambda: client.get('/chatgpt_results'), repeat)
+
+
+def bench_resume(results, draft_counts, repeat, workdir):
+    import webapp
+    from session_index import SessionIndex
+
+    for count in draft_counts:
+        index = SessionIndex(os.path.join(workdir, f'index_{count}.sqlite3'))
+        payload = {'user_info': {'name': 'Someone', 'pronouns': ['they', 'their'],
+                                 'role': 'Software Engineer', 'level': 'junior'}}
+        for i in range(count):
+            index.save(f'reviewer-{i % 50}', f'draft-{i}', payload)
+        results[f'resume/latest/{count}_drafts'] = timeit(lambda: index.latest('reviewer-7'), repeat)
+        original = webapp.session_index
+        webapp.session_index = index
+        try:
+            client = webapp.app.test_client()
+            client.set_cookie(webapp.REVIEWER_COOKIE, 'reviewer-7')
+            with quiet():
+                results[f'resume/index_page/{count}_drafts'] = timeit(lambda: client.get('/'), repeat)
+                results[f'resume/post/{count}_drafts'] = timeit(lambda: client.post('/resume'), repeat)
+        finally:
+            webapp.session_index = original
+
+
+def bench_sessions(results, session_counts, repeat, workdir):
+    from flask import Flask
+    from session_store import StoreSessionInterface
+    from shared_store import open_store
+
+    app = Flask(__name__)
+    app.secret_key = 'benchmark'
+    payload = {'draft_id': 'd' * 32, 'user_info': {'name': 'Someone', 'pronouns': ['they', 'their'],
+                                                   'role': 'Software Engineer', 'level': 'senior'},
+               'review': {'ratings': '012' * 40, 'comments': {'Results': 'x' * 500}}, 'chatgpt_result': 'y' * 2000}
+    for backend in ('filesystem', 'sqlite'):
+        for count in session_counts:
+            interface = StoreSessionInterface(open_store(f'{backend}://{workdir}', f'sessions_{count}'))
+            data = interface.serializer.dumps(payload).encode('utf-8')
+            for i in range(count):
+                interface.store.set(f'sid-{i}', data, 3600)
+            sid = f'sid-{count // 2}'
+            cookie = f"{app.config['SESSION_COOKIE_NAME']}={interface._signer(app).sign(sid).decode()}"
+            with app.test_request_context(headers={'Cookie': cookie}) as ctx:
+                response = app.response_class()
+
+                def save():
+                    session = interface.open_session(app, ctx.request)
+                    session['chatgpt_result'] = 'z' * 2000
+                    interface.save_session(app, session, response)
+
+                results[f'sessions/{backend}/{count}_active/read'] = timeit(
+                    lambda: interface.open_session(app, ctx.request), repeat)
+                results[f'sessions/{backend}/{count}_active/write'] = timeit(save, repeat)
+
+
+def run(quick=False):
+    import webapp
+    from session_index import SessionIndex
+
+    repeat = 20 if quick else 200
+    web_repeat = 10 if quick else 50
+    draft_counts = [100, 1000] if quick else [100, 1000, 10000]
+    session_counts = [100, 1000] if quick else [100, 1000, 10000]
+    synthetic_sizes = SYNTHETIC_SIZES[:2] if quick else SYNTHETIC_SIZES
+    results, sizes, behaviors = {}, {}, {}
+
+    workdir = tempfile.mkdtemp(prefix='review-bench-')
+    # Stub the LLM and keep benchmark drafts out of the real session index
+    webapp.narrative_jobs.runner = lambda review: {'chatgpt_result': 'Stub narrative.', 'chatgpt_cached': False}
+    webapp.session_index = SessionIndex(os.path.join(workdir, 'bench_index.sqlite3'))
+    try:
+        for role, level in REAL_ROLES:
+            prefix = f"{role.lower().replace(' ', '_')}/{level}"
+            behaviors[prefix] = bench_generator(results, role, level, repeat, prefix)
+            bench_webapp(results, sizes, role, level, web_repeat, prefix)
+
+        for shape in synthetic_sizes:
+            levels, sections, subsections, per = shape
+            role_dir = os.path.join(workdir, 'roles_' + '_'.join(map(str, shape)))
+            os.makedirs(role_dir)
+            with open(os.path.join(role_dir, 'synthetic_role.yaml'), 'w', encoding='utf-8') as f:
+                f.write(synthetic_role_yaml(*shape))
+            prefix = f"synthetic/{levels}x{sections}x{subsections}x{per}"
+            with use_role_dir(role_dir):
+                behaviors[prefix] = bench_generator(results, 'Synthetic Role', 'l0', repeat, prefix)
+                bench_webapp(results, sizes, 'Synthetic Role', 'l0', web_repeat, prefix)
+
+        bench_resume(results, draft_counts, web_repeat, workdir)
+        bench_sessions(results, session_counts, repeat, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': quick,
+        },
+        'behaviors': behaviors,
+        'results': results,
+        'sizes': sizes,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Returns a list of human-readable regressions relative to the baseline."""
+    regressions = []
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base and stats['median_us'] > base['median_us'] * (1 + tolerance):
+            regressions.append(f"{name}: {stats['median_us']:.1f}us vs baseline {base['median_us']:.1f}us "
+                               f"(+{(stats['median_us'] / base['median_us'] - 1) * 100:.0f}%)")
+    for name, size in current['sizes'].items():
+        base = baseline.get('sizes', {}).get(name)
+        if base and size > base * (1 + tolerance):
+            regressions.append(f"{name}: {size} bytes vs baseline {base} bytes")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the performance benchmark suite.")
+    parser.add_argument('-o', '--output', help="Write results JSON to this path")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before flagging a regression (default: 0.25)")
+    parser.add_argument('--quick', action='store_true', help="Fewer repeats and smaller inputs")
+    args = parser.parse_args(argv)
+
+    current = run(quick=args.quick)
+    for name, stats in current['results'].items():
+        print(f"{name:<60} {stats['median_us']:>12.1f}us  (min {stats['min_us']:.1f}us)")
+    for name, size in current['sizes'].items():
+        print(f"{name:<60} {size:>12} bytes")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
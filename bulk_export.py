@@ -0,0 +1,289 @@
+"""
+Streaming bulk export of logged reviews as a ZIP or tar archive.
+
+Reviews are selected from the review log by role, level and date range (see
+review_log.iter_entries), rendered as text, Markdown and/or JSON with their
+ChatGPT narrative on a pool of workers, and written into the archive in log
+order as they are produced. The archive is emitted as a stream of chunks, so it
+can be sent to an HTTP client or a file without ever being held in memory; at
+most ``max_in_flight`` rendered reviews are buffered at a time.
+
+Usage:
+    python bulk_export.py -o cycle.zip --since 2026-04-01 --until 2026-09-30
+    python bulk_export.py -o em.tar.gz --role "Engineering Manager" --format markdown --format json
+    python bulk_export.py -o - --level senior > senior.zip
+"""
+
+import argparse
+import datetime
+import io
+import os
+import sys
+import struct
+import tarfile
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Sequence
+
+from feedback_renderer import FORMATS, build_document, render
+from review_log import LOG_DIR, iter_entries
+
+ARCHIVES = {
+    'zip': ('application/zip', 'zip'),
+    'tar.gz': ('application/gzip', 'tar.gz'),
+    'tar': ('application/x-tar', 'tar'),
+}
+
+DEFAULT_FORMATS = ('markdown',)
+
+# Bytes of archive output collected before a chunk is handed on
+CHUNK_SIZE = 64 * 1024
+
+
+def safe(s) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in str(s or '').lower()).strip('_') or 'unknown'
+
+
+def entry_paths(entry: dict, number: int, formats: Sequence[str]) -> list:
+    """Archive paths for one review: role/level/<timestamp>_<name>_<number>.<ext> per format."""
+    user_info = entry.get('user_info') or {}
+    stamp = (entry.get('timestamp') or '')[:19].replace(':', '').replace('-', '') or 'undated'
+    stem = f"{safe(user_info.get('role'))}/{safe(user_info.get('level'))}/{stamp}_{safe(user_info.get('name'))}_{number}"
+    return [f"{stem}.{FORMATS[fmt][1]}" for fmt in formats]
+
+
+def render_entry(entry: dict, formats: Sequence[str], deflate: bool = False) -> list:
+    """
+    Renders one log entry in each format. Runs on an export worker. Returns [bytes], or with
+    ``deflate`` [(compressed bytes, crc32, size)] ready for a ZIP member.
+    """
+    user_info = entry.get('user_info') or {}
+    doc = build_document(
+        user_info.get('exceeds'), user_info.get('meets'), user_info.get('does_not_meet'), user_info.get('comments'),
+        name=user_info.get('name', ''), role=user_info.get('role', ''), level=user_info.get('level', ''),
+        narrative=entry.get('chatgpt_result'),
+    )
+    rendered = [render(doc, fmt).encode('utf-8') for fmt in formats]
+    if not deflate:
+        return rendered
+    # zlib releases the GIL, so compressing here runs in parallel across worker threads
+    members = []
+    for data in rendered:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        members.append((compressor.compress(data) + compressor.flush(), zlib.crc32(data), len(data)))
+    return members
+
+
+def iter_rendered(entries: Iterable[dict], formats: Sequence[str], executor=None, max_in_flight: int = 64,
+                  deflate: bool = False) -> Iterator[tuple]:
+    """
+    Yields (entry, render_entry() result) in input order, rendering up to ``max_in_flight``
+    entries ahead on ``executor`` (or inline without one).
+    """
+    if executor is None:
+        for entry in entries:
+            yield entry, render_entry(entry, formats, deflate)
+        return
+    pending = deque()
+    for entry in entries:
+        pending.append((entry, executor.submit(render_entry, entry, formats, deflate)))
+        if len(pending) >= max_in_flight:
+            entry, future = pending.popleft()
+            yield entry, future.result()
+    while pending:
+        entry, future = pending.popleft()
+        yield entry, future.result()
+
+
+class _ChunkSink:
+    """
+    Write-only, unseekable file object collecting archive output for the generator to drain.
+    """
+    def __init__(self) -> None:
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        if data:
+            self.chunks.append(bytes(data))
+            self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+class ZipStream:
+    """
+    Minimal streaming ZIP writer for members deflated up front.
+
+    zipfile keeps a record per member in memory until the archive is closed; here the
+    central directory records are spooled to a temporary file instead, so memory stays
+    flat however many members there are. Zip64 records are added when the member count
+    or archive size needs them.
+    """
+    def __init__(self, sink) -> None:
+        self.sink = sink
+        self.offset = 0
+        self.count = 0
+        self.directory = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+
+    def _write(self, data: bytes) -> None:
+        self.sink.write(data)
+        self.offset += len(data)
+
+    def add(self, path: str, compressed: bytes, crc: int, size: int, mtime: float) -> None:
+        name = path.encode('utf-8')
+        t = time.localtime(mtime)
+        dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        dos_date = (max(t.tm_year, 1980) - 1980) << 9 | (t.tm_mon << 5) | t.tm_mday
+        # Bit 11: the name is UTF-8
+        fields = (0x800, 8, dos_time, dos_date, crc, len(compressed), size, len(name))
+        header_offset = self.offset
+        self._write(struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, *fields, 0) + name)
+        self._write(compressed)
+        extra = b''
+        if header_offset >= 0xFFFFFFFF:
+            extra = struct.pack('<2HQ', 1, 8, header_offset)
+        self.directory.write(struct.pack(
+            '<4s6H3L5H2L', b'PK\x01\x02', 3 << 8 | 45, 45 if extra else 20, *fields, len(extra),
+            0, 0, 0, 0o100644 << 16, min(header_offset, 0xFFFFFFFF)) + name + extra)
+        self.count += 1
+
+    def finish(self) -> Iterator[None]:
+        """Writes the central directory and end records, pausing after each chunk so the sink can be drained."""
+        directory_offset = self.offset
+        self.directory.seek(0)
+        while True:
+            chunk = self.directory.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self._write(chunk)
+            yield
+        self.directory.close()
+        directory_size = self.offset - directory_offset
+        if self.count >= 0xFFFF or self.offset >= 0xFFFFFFFF:
+            zip64_offset = self.offset
+            self._write(struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0, self.count, self.count,
+                                    directory_size, directory_offset))
+            self._write(struct.pack('<4sLQL', b'PK\x06\x07', 0, zip64_offset, 1))
+        self._write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, min(self.count, 0xFFFF), min(self.count, 0xFFFF),
+                                min(directory_size, 0xFFFFFFFF), min(directory_offset, 0xFFFFFFFF), 0))
+
+
+def _entry_time(entry: dict) -> float:
+    try:
+        return datetime.datetime.fromisoformat(entry['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def iter_archive(entries: Iterable[dict], formats: Sequence[str] = DEFAULT_FORMATS, archive: str = 'zip',
+                 workers: Optional[int] = None, processes: bool = False, max_in_flight: int = 64,
+                 stats: Optional[dict] = None) -> Iterator[bytes]:
+    """
+    Yields the archive of ``entries`` as byte chunks of about CHUNK_SIZE. Reviews are rendered
+    (and for ZIP, compressed) on ``workers`` threads or processes and added in input order.
+    If ``stats`` is given, its 'reviews' and 'files' counts are updated as entries are written.
+    """
+    if archive not in ARCHIVES:
+        raise ValueError(f"Unknown archive '{archive}'. Must be one of {', '.join(ARCHIVES)}.")
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'. Must be one of {', '.join(FORMATS)}.")
+    stats = stats if stats is not None else {}
+    stats.setdefault('reviews', 0)
+    stats.setdefault('files', 0)
+    sink = _ChunkSink()
+    zipped = archive == 'zip'
+    workers = workers or min(8, os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers, thread_name_prefix='export')
+    try:
+        if zipped:
+            writer = ZipStream(sink)
+        else:
+            writer = tarfile.open(fileobj=sink, mode='w|gz' if archive == 'tar.gz' else 'w|')
+        rendered_entries = iter_rendered(entries, formats, pool, max_in_flight, deflate=zipped)
+        for number, (entry, rendered) in enumerate(rendered_entries, 1):
+            mtime = _entry_time(entry)
+            for path, member in zip(entry_paths(entry, number, formats), rendered):
+                if zipped:
+                    writer.add(path, *member, mtime)
+                else:
+                    info = tarfile.TarInfo(path)
+                    info.size, info.mtime, info.mode = len(member), int(mtime), 0o644
+                    writer.addfile(info, io.BytesIO(member))
+                    # tarfile remembers every member it wrote; nothing here needs them
+                    writer.members.clear()
+                stats['files'] += 1
+            stats['reviews'] += 1
+            if sink.size >= CHUNK_SIZE:
+                yield sink.drain()
+        if zipped:
+            for _ in writer.finish():
+                yield sink.drain()
+        else:
+            writer.close()
+        yield sink.drain()
+    finally:
+        # At most max_in_flight renders are left to finish if the consumer stopped early
+        pool.shutdown(wait=False)
+
+
+def select_entries(log_dir: str = LOG_DIR, role: Optional[str] = None, level: Optional[str] = None,
+                   since=None, until=None) -> Iterator[dict]:
+    """Logged reviews to export; a bare date as ``until`` includes that whole day."""
+    if isinstance(until, str) and until and 'T' not in until:
+        until += 'T23:59:59.999999'
+    return iter_entries(log_dir, role, level, since, until)
+
+
+def export_filename(archive: str, role: Optional[str] = None, level: Optional[str] = None) -> str:
+    parts = ['reviews'] + [safe(p) for p in (role, level) if p] + [datetime.date.today().isoformat()]
+    return f"{'_'.join(parts)}.{ARCHIVES[archive][1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export logged reviews as a ZIP or tar archive.")
+    parser.add_argument('-o', '--output', required=True, help="Archive path, or - for stdout")
+    parser.add_argument('--log-dir', default=LOG_DIR)
+    parser.add_argument('--role')
+    parser.add_argument('--level')
+    parser.add_argument('--since', help="ISO date or timestamp, e.g. 2026-04-01")
+    parser.add_argument('--until', help="ISO date or timestamp (inclusive)")
+    parser.add_argument('--format', dest='formats', action='append', choices=sorted(FORMATS),
+                        help="File format per review; repeat for several (default markdown)")
+    parser.add_argument('--archive', choices=sorted(ARCHIVES), help="Default: from the output file name, else zip")
+    parser.add_argument('--workers', type=int, help="Rendering workers (default: CPU count, up to 8)")
+    parser.add_argument('--processes', action='store_true', help="Render on processes instead of threads")
+    args = parser.parse_args(argv)
+    archive = args.archive or next((a for a in ('tar.gz', 'tar', 'zip') if args.output.endswith('.' + a)), 'zip')
+    entries = select_entries(args.log_dir, args.role, args.level, args.since, args.until)
+    stats = {}
+    start = time.perf_counter()
+    chunks = iter_archive(entries, args.formats or DEFAULT_FORMATS, archive, args.workers, args.processes, stats=stats)
+    if args.output == '-':
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        tmp = args.output + '.tmp'
+        with open(tmp, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, args.output)
+    print(f"Exported {stats['reviews']} reviews ({stats['files']} files) in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Calibration analytics over the review log.
+
+Logged reviews are loaded into columnar form: for each (role, level, role
+definition version) the ratings become a reviews x behaviors uint8 array whose
+columns are the behavior IDs (the behavior_items() index), decoded straight
+from the compact ratings string without touching behavior text.
+
+Every aggregate kept is a sum (rating counts per behavior, per-reviewer totals,
+sums of per-review means), so new reviews are folded into the running totals
+and the log is only read from where the last refresh stopped. Reports are
+derived from the totals and cached until the group changes.
+
+Requires NumPy.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from review_log import LOG_DIR, list_segments, read_legacy, read_segment, segment_name
+from review_model import level_definition
+from role_registry import registry
+
+# Rating values, in column order of the count arrays
+RATING_KEYS = ('does_not_meet', 'meets', 'exceeds')
+
+# A reviewer is an outlier when their mean rating is this many standard errors from the norm
+OUTLIER_Z = 3.0
+# ... and they have at least this many reviews in the group
+MIN_REVIEWS_FOR_OUTLIER = 3
+
+# Seconds between re-reads of the log when serving reports
+REFRESH_INTERVAL = 5.0
+
+
+class GroupStats:
+    """
+    Running rating totals for one (role, level, version).
+    """
+    __slots__ = ("role", "level", "version", "width", "reviews", "counts", "mean_sum", "mean_sumsq",
+                 "reviewer_reviews", "reviewer_sum")
+
+    def __init__(self, role: str, level: str, version: str, width: int) -> None:
+        self.role = role
+        self.level = level
+        self.version = version
+        self.width = width
+        self.reviews = 0
+        # behaviors x (does_not_meet, meets, exceeds)
+        self.counts = np.zeros((width, 3), dtype=np.int64)
+        # Sums of each review's mean rating (0..2), for the spread between reviews
+        self.mean_sum = 0.0
+        self.mean_sumsq = 0.0
+        # Indexed by reviewer code
+        self.reviewer_reviews = np.zeros(0, dtype=np.int64)
+        self.reviewer_sum = np.zeros(0, dtype=np.float64)
+
+    def add(self, block: np.ndarray, reviewers: np.ndarray) -> None:
+        """Folds in a reviews x behaviors block of 0/1/2 ratings and each row's reviewer code."""
+        self.reviews += len(block)
+        for rating in range(3):
+            self.counts[:, rating] += np.count_nonzero(block == rating, axis=0)
+        means = block.sum(axis=1, dtype=np.int64) / self.width
+        self.mean_sum += float(means.sum())
+        self.mean_sumsq += float(np.dot(means, means))
+        size = int(reviewers.max()) + 1
+        if size > len(self.reviewer_reviews):
+            grow = size - len(self.reviewer_reviews)
+            self.reviewer_reviews = np.concatenate([self.reviewer_reviews, np.zeros(grow, dtype=np.int64)])
+            self.reviewer_sum = np.concatenate([self.reviewer_sum, np.zeros(grow)])
+        self.reviewer_reviews[:size] += np.bincount(reviewers, minlength=size)
+        self.reviewer_sum[:size] += np.bincount(reviewers, weights=means, minlength=size)
+
+
+def behavior_layout(role: str, level: str) -> Tuple[List[str], List[str], List[str]]:
+    """Returns (sections, subsection and text per behavior ID) for the current definition, in form order."""
+    definition = level_definition(role, level)
+    return ([b.section for b in definition.behaviors], [b.subsection for b in definition.behaviors],
+            list(definition.texts('[name]', ('they', 'their'))))
+
+
+def _legacy_review(entry: dict) -> Optional[dict]:
+    # Old log entries hold full text; map it back to ratings where the definition still matches
+    from review_state import migrate_legacy
+    user_info = entry.get('user_info') or {}
+    return migrate_legacy(user_info) if user_info.get('role') else None
+
+
+class CalibrationStore:
+    """
+    Columnar calibration aggregates over a review log directory, refreshed incrementally.
+    """
+    def __init__(self, log_dir: str = LOG_DIR) -> None:
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._finished = set()
+        self._reviewer_codes: Dict[str, int] = {}
+        self._reviewer_ids: List[str] = []
+        self._groups: Dict[tuple, GroupStats] = {}
+        self._reports: Dict[tuple, tuple] = {}
+        self._refreshed_at = 0.0
+        self.skipped = 0
+
+    def _reviewer_code(self, reviewer: Optional[str]) -> int:
+        reviewer = reviewer or 'unknown'
+        code = self._reviewer_codes.get(reviewer)
+        if code is None:
+            code = self._reviewer_codes[reviewer] = len(self._reviewer_ids)
+            self._reviewer_ids.append(reviewer)
+        return code
+
+    def _collect(self, entry: dict, pending: dict) -> None:
+        review = entry.get('review') or _legacy_review(entry)
+        if not review or not review.get('ratings'):
+            self.skipped += 1
+            return
+        key = (review['role'], review['level'], review.get('version'))
+        rows, reviewers = pending.setdefault(key, ([], []))
+        if rows and len(review['ratings']) != len(rows[0]):
+            self.skipped += 1
+            return
+        rows.append(review['ratings'])
+        reviewers.append(self._reviewer_code(entry.get('reviewer')))
+
+    def refresh(self, force: bool = False) -> int:
+        """Reads reviews logged since the last refresh; returns how many were added."""
+        with self._lock:
+            if not force and time.time() - self._refreshed_at < REFRESH_INTERVAL:
+                return 0
+            pending = {}
+            for path in list_segments(self.log_dir):
+                name = segment_name(path)
+                if name in self._finished:
+                    continue
+                offset = self._offsets.get(name, 0)
+                for offset, entry in read_segment(path, offset):
+                    self._collect(entry, pending)
+                self._offsets[name] = offset
+                if path.endswith('.gz'):
+                    # Compressed segments are closed; nothing more will be appended
+                    self._finished.add(name)
+            for path, entry in read_legacy(self.log_dir, skip=self._finished):
+                self._finished.add(path)
+                self._collect(entry, pending)
+            added = 0
+            for (role, level, version), (rows, reviewers) in pending.items():
+                width = len(rows[0])
+                group = self._groups.get((role, level, version))
+                if group is None:
+                    group = self._groups[(role, level, version)] = GroupStats(role, level, version, width)
+                elif group.width != width:
+                    self.skipped += len(rows)
+                    continue
+                # One decode for the whole batch: '0'/'1'/'2' bytes minus 48
+                block = np.frombuffer(''.join(rows).encode('ascii'), dtype=np.uint8).reshape(len(rows), width) - 48
+                group.add(block, np.asarray(reviewers, dtype=np.int64))
+                added += len(rows)
+            self._refreshed_at = time.time()
+            return added
+
+    def groups(self) -> List[dict]:
+        """Returns one {role, level, version, reviews} per group, largest first."""
+        return sorted(({'role': g.role, 'level': g.level, 'version': g.version, 'reviews': g.reviews}
+                       for g in self._groups.values()), key=lambda g: -g['reviews'])
+
+    def report(self, role: str, level: str) -> Optional[dict]:
+        """
+        Returns rating distributions for a role and level (overall, per section and per behavior)
+        plus outlier reviewers, for the current definition version if it has reviews.
+        """
+        self.refresh()
+        candidates = [g for g in self._groups.values() if g.role == role and g.level == level]
+        if not candidates:
+            return None
+        try:
+            current = registry.get(role).version
+        except FileNotFoundError:
+            current = None
+        group = next((g for g in candidates if g.version == current), max(candidates, key=lambda g: g.reviews))
+        key = (role, level, group.version)
+        cached = self._reports.get(key)
+        if cached is not None and cached[0] == group.reviews:
+            return cached[1]
+        report = self._build_report(group, current, candidates)
+        self._reports[key] = (group.reviews, report)
+        return report
+
+    def _build_report(self, group: GroupStats, current: Optional[str], candidates: List[GroupStats]) -> dict:
+        n = group.reviews
+        shares = group.counts / n
+        means = (group.counts[:, 1] + 2 * group.counts[:, 2]) / n
+        sections, subsections, texts = [None] * group.width, [None] * group.width, [None] * group.width
+        if group.version == current:
+            layout = behavior_layout(group.role, group.level)
+            if len(layout[0]) == group.width:
+                sections, subsections, texts = layout
+        behaviors = [
+            {'id': i, 'section': sections[i], 'subsection': subsections[i], 'text': texts[i] or f'Behavior #{i}',
+             'mean': float(means[i]), **{k: float(shares[i, j]) for j, k in enumerate(RATING_KEYS)}}
+            for i in range(group.width)
+        ]
+        section_rows = []
+        if sections[0] is not None:
+            # Behavior IDs are grouped by section, so each section is a contiguous run of columns
+            starts = [i for i in range(group.width) if i == 0 or sections[i] != sections[i - 1]]
+            totals = np.add.reduceat(group.counts, starts, axis=0)
+            for start, row in zip(starts, totals):
+                section_rows.append(dict({'section': sections[start]},
+                                         **{k: float(row[j] / row.sum()) for j, k in enumerate(RATING_KEYS)}))
+        overall = group.counts.sum(axis=0) / group.counts.sum()
+
+        norm = group.mean_sum / n
+        spread = max(group.mean_sumsq / n - norm * norm, 0.0) ** 0.5
+        outliers = []
+        reviewed = np.flatnonzero(group.reviewer_reviews >= MIN_REVIEWS_FOR_OUTLIER)
+        if spread > 0 and len(reviewed):
+            counts = group.reviewer_reviews[reviewed]
+            reviewer_means = group.reviewer_sum[reviewed] / counts
+            z = (reviewer_means - norm) / (spread / np.sqrt(counts))
+            flagged = np.flatnonzero(np.abs(z) >= OUTLIER_Z)
+            for i in flagged[np.argsort(-np.abs(z[flagged]))]:
+                outliers.append({'reviewer': self._reviewer_ids[reviewed[i]], 'reviews': int(counts[i]),
+                                 'mean': float(reviewer_means[i]), 'z': float(z[i])})
+        return {
+            'role': group.role,
+            'level': group.level,
+            'version': group.version,
+            'current': group.version == current,
+            'reviews': n,
+            'mean': norm,
+            'overall': {k: float(overall[j]) for j, k in enumerate(RATING_KEYS)},
+            'sections': section_rows,
+            'behaviors': behaviors,
+            'outliers': outliers,
+            'other_versions': [{'version': g.version, 'reviews': g.reviews} for g in candidates if g is not group],
+        }
+
+
+# Process-wide store for the web app
+calibration_store = CalibrationStore()
@@ -0,0 +1,197 @@
+"""
+Local OpenAI-compatible stub server for tests, benchmarks and load tests.
+
+Implements ``POST /v1/chat/completions`` with configurable latency and error
+rate, so the narrative code paths can be exercised without an API key.
+Requests with ``"stream": true`` are answered word by word as server-sent
+events, ``stream_delay`` seconds apart.
+
+Usage:
+    python fake_openai_server.py --port 8001 --latency 0.5 --error-rate 0.05
+
+Then point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:8001/v1``
+and any ``OPENAI_API_KEY``.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def default_reply(messages):
+    """Returns a short deterministic narrative echoing the size of the prompt."""
+    chars = sum(len(m.get('content') or '') for m in messages)
+    return (
+        "What are some things they do well?\nThey deliver consistently.\n\n"
+        "How could they improve?\nThey could share context earlier.\n\n"
+        f"What are their biggest challenges?\nPrioritisation. ({chars} prompt characters)"
+    )
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server answering chat completion requests like the OpenAI API.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0,
+                 fail_first=0, error_status=500, reply=default_reply, seed=None, stream_delay=0.0,
+                 slow_first=0, slow_latency=0.0):
+        self.latency = latency
+        # The first ``slow_first`` requests wait ``slow_latency`` instead, e.g. to exercise hedging
+        self.slow_first = slow_first
+        self.slow_latency = slow_latency
+        self.stream_delay = stream_delay
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.error_status = error_status
+        self.reply = reply
+        self.requests = 0
+        self.errors = 0
+        self.bodies = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self.requests <= self.fail_first or self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+                    return
+                with fake._lock:
+                    fake.bodies.append(body)
+                    latency = fake.slow_latency if len(fake.bodies) <= fake.slow_first else fake.latency
+                if latency:
+                    time.sleep(latency)
+                if fake._should_fail():
+                    self._send_json(fake.error_status, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+                    return
+                messages = body.get('messages', [])
+                content = fake.reply(messages)
+                prompt_tokens = sum(len((m.get('content') or '').split()) for m in messages)
+                completion_tokens = len(content.split())
+                usage = {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                }
+                if body.get('stream'):
+                    include_usage = (body.get('stream_options') or {}).get('include_usage')
+                    self._send_stream(body.get('model', 'fake-model'), content, usage if include_usage else None)
+                    return
+                self._send_json(200, {
+                    'id': f'chatcmpl-{uuid.uuid4().hex}',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake-model'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': content},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': usage,
+                })
+
+            def _write_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_stream(self, model, content, usage):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                chunk_id = f'chatcmpl-{uuid.uuid4().hex}'
+
+                def event(choices, **extra):
+                    payload = dict(id=chunk_id, object='chat.completion.chunk', created=int(time.time()),
+                                   model=model, choices=choices, **extra)
+                    self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+
+                event([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+                for piece in re.findall(r'\s*\S+', content):
+                    if fake.stream_delay:
+                        time.sleep(fake.stream_delay)
+                    event([{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+                event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+                if usage is not None:
+                    event([], usage=usage)
+                self._write_chunk(b"data: [DONE]\n\n")
+                self._write_chunk(b"")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible chat completions stub.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds to wait before answering")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--stream-delay', type=float, default=0.05, help="Seconds between streamed words")
+    args = parser.parse_args(argv)
+    server = FakeOpenAIServer(args.host, args.port, latency=args.latency, error_rate=args.error_rate,
+                              error_status=args.error_status, stream_delay=args.stream_delay)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Deterministic narrative built locally from the ratings.
+
+Shown when the ChatGPT narrative misses its deadline or fails, so the
+reviewer always gets something usable straight away. It answers the same
+three questions the prompt asks and is clearly labelled as a local draft; the
+web app replaces it with the real narrative if that arrives later.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+FALLBACK_LABEL = "[Draft generated locally from your ratings - the ChatGPT narrative was not available in time.]"
+
+# Most behaviors quoted per section of the narrative
+MAX_EXAMPLES = 5
+
+
+def _examples(sections: Dict[str, Sequence[str]]) -> List[str]:
+    # Round-robin across sections so one large section does not crowd out the rest
+    queues = [(section, list(behaviors)) for section, behaviors in sections.items() if behaviors]
+    lines = []
+    while queues and len(lines) < MAX_EXAMPLES:
+        for section, behaviors in queues:
+            if behaviors and len(lines) < MAX_EXAMPLES:
+                lines.append(f"- {behaviors.pop(0)} ({section})")
+        queues = [(section, behaviors) for section, behaviors in queues if behaviors]
+    return lines
+
+
+def _join(words: Sequence[str]) -> str:
+    return words[0] if len(words) == 1 else f"{', '.join(words[:-1])} and {words[-1]}"
+
+
+def build_fallback_narrative(name: str, exceeds: Dict[str, Sequence[str]], meets: Dict[str, Sequence[str]],
+                             does_not_meet: Dict[str, Sequence[str]],
+                             comments: Optional[Dict[str, str]] = None) -> str:
+    """Returns the labelled local narrative for a review's rating lists and section comments."""
+    exceeds = {s: b for s, b in (exceeds or {}).items() if b}
+    meets = {s: b for s, b in (meets or {}).items() if b}
+    does_not_meet = {s: b for s, b in (does_not_meet or {}).items() if b}
+    comments = {s: text for s, text in (comments or {}).items() if text}
+    count = lambda lists: sum(len(b) for b in lists.values())
+    total = count(exceeds) + count(meets) + count(does_not_meet)
+    lines = [FALLBACK_LABEL, '', "What are some things they do well?"]
+
+    if exceeds:
+        lines.append(f"{name} exceeds expectations in {_join(sorted(exceeds))} "
+                     f"({count(exceeds)} of {total} rated skills). In particular:")
+        lines.extend(_examples(exceeds))
+    if meets:
+        strongest = sorted(meets, key=lambda s: (-len(meets[s]), s))[:3]
+        lines.append(f"{name} meets expectations on {count(meets)} of {total} rated skills, "
+                     f"most consistently in {_join(strongest)}.")
+    if not exceeds and not meets:
+        lines.append("No skills were rated as meeting or exceeding expectations.")
+    lines.extend(f"Reviewer comment on {s}: {text}" for s, text in comments.items() if s not in does_not_meet)
+
+    lines += ['', "How could they improve?"]
+    if does_not_meet:
+        lines.append(f"{count(does_not_meet)} skills are not yet at the expected level:")
+        lines.extend(_examples(does_not_meet))
+        lines.extend(f"Reviewer comment on {s}: {text}" for s, text in comments.items() if s in does_not_meet)
+    else:
+        lines.append("No skills were rated below expectations. The next step is to build on the strengths "
+                     "above and take on more of the expectations of the next level.")
+
+    lines += ['', "What are their biggest challenges?"]
+    if does_not_meet:
+        def rated(section):
+            return sum(len(lists.get(section, ())) for lists in (exceeds, meets, does_not_meet))
+        for section in sorted(does_not_meet, key=lambda s: (-len(does_not_meet[s]) / rated(s), s))[:2]:
+            lines.append(f"{section.capitalize()}: {len(does_not_meet[section])} of {rated(section)} "
+                         f"skills do not yet meet expectations.")
+    else:
+        lines.append(f"There are no clear gaps at this level; the main challenge for {name} is sustaining "
+                     f"this performance while growing in scope.")
+    return '\n'.join(lines)
@@ -0,0 +1,106 @@
+"""
+Single-pass, multi-format feedback renderer.
+
+Rating lists and section comments are first collected into one intermediate
+document, which is then rendered as plain text (the original give_feedback
+format), Markdown or JSON. Every renderer is a generator of string chunks, so
+large exports can be streamed instead of built up in memory.
+"""
+
+import json
+from typing import Dict, Iterator, List, Optional
+
+# (key, plain-text heading, Markdown heading) in report order
+RATING_GROUPS = (
+    ('exceeds', 'OVER PERFORMING', 'Over performing'),
+    ('meets', 'MEETS EXPECTATIONS', 'Meets expectations'),
+    ('does_not_meet', 'GIVE FEEDBACK', 'Give feedback'),
+)
+
+
+def build_document(exceeds: Dict[str, List[str]], meets: Dict[str, List[str]],
+                   does_not_meet: Dict[str, List[str]], comments: Optional[Dict[str, str]] = None,
+                   name: str = '', role: str = '', level: str = '',
+                   narrative: Optional[str] = None) -> dict:
+    """
+    Builds the intermediate document shared by all renderers.
+    Empty section comments are dropped.
+    """
+    lists = {'exceeds': exceeds or {}, 'meets': meets or {}, 'does_not_meet': does_not_meet or {}}
+    return {
+        'name': name,
+        'role': role,
+        'level': level,
+        'groups': [(key, list(lists[key].items())) for key, _, _ in RATING_GROUPS],
+        'comments': [(section, text) for section, text in (comments or {}).items() if text],
+        'narrative': narrative,
+    }
+
+
+def iter_text(doc: dict) -> Iterator[str]:
+    """Plain text, matching the original give_feedback output, plus section comments."""
+    headings = {key: heading for key, heading, _ in RATING_GROUPS}
+    for key, sections in doc['groups']:
+        yield f"\n{headings[key]}:"
+        for section, behaviors in sections:
+            yield f"\n{section}\n"
+            for behavior in behaviors:
+                yield f"- {behavior}"
+    if doc['comments']:
+        yield "\nSECTION COMMENTS:"
+        for section, text in doc['comments']:
+            yield f"\n{section}: {text}"
+    if doc.get('narrative'):
+        yield f"\nNARRATIVE:\n{doc['narrative']}"
+
+
+def iter_markdown(doc: dict) -> Iterator[str]:
+    headings = {key: heading for key, _, heading in RATING_GROUPS}
+    yield f"# Performance feedback{' for ' + doc['name'] if doc['name'] else ''}\n"
+    subtitle = ' '.join(part for part in (doc['level'].capitalize(), doc['role']) if part)
+    if subtitle:
+        yield f"\n_{subtitle}_\n"
+    for key, sections in doc['groups']:
+        yield f"\n## {headings[key]}\n"
+        if not sections:
+            yield "\n_None_\n"
+        for section, behaviors in sections:
+            yield f"\n### {section.capitalize()}\n\n"
+            for behavior in behaviors:
+                yield f"- {behavior}\n"
+    if doc['comments']:
+        yield "\n## Section comments\n\n"
+        for section, text in doc['comments']:
+            yield f"- **{section.capitalize()}**: {text}\n"
+    if doc.get('narrative'):
+        yield f"\n## Narrative\n\n{doc['narrative']}\n"
+
+
+def iter_json(doc: dict) -> Iterator[str]:
+    """JSON object emitted one section at a time."""
+    dumps = lambda value: json.dumps(value, ensure_ascii=False)
+    yield f'{{"name": {dumps(doc["name"])}, "role": {dumps(doc["role"])}, "level": {dumps(doc["level"])}, "ratings": {{'
+    for i, (key, sections) in enumerate(doc['groups']):
+        yield f'{", " if i else ""}{dumps(key)}: {{'
+        for j, (section, behaviors) in enumerate(sections):
+            yield f'{", " if j else ""}{dumps(section)}: {dumps(list(behaviors))}'
+        yield '}'
+    yield f'}}, "comments": {dumps(dict(doc["comments"]))}, "narrative": {dumps(doc.get("narrative"))}}}'
+
+
+# format -> (mimetype, file extension, chunk generator)
+FORMATS = {
+    'text': ('text/plain', 'txt', iter_text),
+    'markdown': ('text/markdown', 'md', iter_markdown),
+    'json': ('application/json', 'json', iter_json),
+}
+
+
+def iter_render(doc: dict, fmt: str = 'text') -> Iterator[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'. Must be one of {', '.join(FORMATS)}.")
+    return FORMATS[fmt][2](doc)
+
+
+def render(doc: dict, fmt: str = 'text') -> str:
+    return ''.join(iter_render(doc, fmt))
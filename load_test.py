@@ -0,0 +1,333 @@
+"""
+Load test for the web app: N simulated reviewers driven through the whole review flow.
+
+Starts the app (in its own process) against a local OpenAI-compatible stub with
+configurable latency and error rate, then has each reviewer repeatedly:
+
+  GET /  ->  POST /  ->  GET /feedback  ->  POST /feedback (every rating_{i} and comment)
+  ->  GET /chatgpt_results  ->  the narrative, either streamed (GET /chatgpt_stream, POST
+  /chatgpt_finish) or, with --no-stream, via loading.html (poll /chatgpt_status, then
+  GET /chatgpt_results again)
+
+Reports throughput and p50/p95/p99 latency per route and for whole reviews. Each
+reviewer keeps its own cookies, so it has its own session and reviewer id.
+
+Usage:
+    python load_test.py --reviewers 20 --reviews 5 --latency 1.0 --error-rate 0.02
+    python load_test.py --duration 60 --app-command "gunicorn -w 4 -b {host}:{port} webapp:app"
+    python load_test.py --url http://127.0.0.1:5000 --reviewers 10   # an app that is already running
+"""
+
+import argparse
+import html
+import http.cookiejar
+import json
+import logging
+import math
+import os
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, List, Optional
+
+from fake_openai_server import FakeOpenAIServer
+
+_OPTION = re.compile(r'<option value="([^"]*)"')
+_RATING = re.compile(r'name="rating_(\d+)"')
+_COMMENT = re.compile(r'name="comment_([^"]*)"')
+_JOB_URL = re.compile(r'"(/chatgpt_(?:stream|status|finish)/[0-9a-f]+)"')
+
+COMMENTS = (
+    "Consistently raises the bar for the team.",
+    "Would benefit from sharing context earlier.",
+    "",
+)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples), max(1, math.ceil(q / 100 * len(samples)))) - 1]
+
+
+def select_options(page: str, name: str) -> List[str]:
+    match = re.search(rf'<select[^>]*name="{name}"[^>]*>(.*?)</select>', page, re.S)
+    return [html.unescape(v) for v in _OPTION.findall(match.group(1))] if match else []
+
+
+class Recorder:
+    """
+    Thread-safe latency samples per route, plus whole-review timings.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.routes: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.reviews: List[float] = []
+        self.failed_reviews = 0
+        self.fallbacks = 0
+
+    def add(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.routes.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def review(self, seconds: Optional[float], fallback: bool = False) -> None:
+        with self._lock:
+            if seconds is None:
+                self.failed_reviews += 1
+            else:
+                self.reviews.append(seconds)
+                self.fallbacks += fallback
+
+    def report(self, elapsed: float) -> dict:
+        def stats(samples):
+            samples = sorted(samples)
+            return {
+                'count': len(samples),
+                'per_second': round(len(samples) / elapsed, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                'max_ms': round(samples[-1] * 1000, 1) if samples else 0.0,
+            }
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'reviews': dict(stats(self.reviews), failed=self.failed_reviews, fallbacks=self.fallbacks),
+            'routes': {route: dict(stats(samples), errors=self.errors.get(route, 0))
+                       for route, samples in sorted(self.routes.items())},
+        }
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Each hop is timed as its own route, so redirects are followed by the reviewer
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Reviewer:
+    """
+    One simulated reviewer with its own cookie jar.
+    """
+    def __init__(self, base_url: str, recorder: Recorder, rng: random.Random, timeout: float = 120.0,
+                 poll_interval: float = 1.0) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.rng = rng
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, route: str, path: str, data: Optional[dict] = None, ok=(200, 204, 302)):
+        """Returns (status, body text); the time includes reading the whole body, e.g. a finished stream."""
+        body = urllib.parse.urlencode(data).encode('ascii') if data is not None else None
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, body, timeout=self.timeout) as response:
+                status, text = response.status, response.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            status, text = e.code, e.read().decode('utf-8', 'replace')
+        except OSError as e:
+            self.recorder.add(route, time.perf_counter() - start, False)
+            raise RuntimeError(f'{route}: {e}')
+        self.recorder.add(route, time.perf_counter() - start, status in ok)
+        if status not in ok:
+            raise RuntimeError(f'{route}: HTTP {status}')
+        return status, text
+
+    def review(self, role: Optional[str] = None, level: Optional[str] = None) -> bool:
+        """Runs one review from the index page to a stored narrative. Returns whether a fallback was shown."""
+        _, page = self.request('GET /', '/')
+        role = role or self.rng.choice(select_options(page, 'role'))
+        if level is None:
+            _, page = self.request('GET /?role', '/?' + urllib.parse.urlencode({'role': role}))
+            level = self.rng.choice(select_options(page, 'level'))
+        name = f'Reviewee {self.rng.randrange(10 ** 9)}'
+        self.request('POST /', '/', {'name': name, 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                                     'role': role, 'level': level})
+        _, page = self.request('GET /feedback', '/feedback')
+        form = {f'rating_{i}': self.rng.choice('0112') for i in sorted(set(_RATING.findall(page)), key=int)}
+        for section in set(_COMMENT.findall(page)):
+            form[f'comment_{html.unescape(section)}'] = self.rng.choice(COMMENTS)
+        if not form:
+            raise RuntimeError('GET /feedback: no rating fields on the page')
+        self.request('POST /feedback', '/feedback', form)
+        _, page = self.request('GET /chatgpt_results', '/chatgpt_results', ok=(200,))
+        urls = {url.split('/')[1]: url for url in _JOB_URL.findall(page)}
+        if 'chatgpt_stream' in urls:
+            _, events = self.request('GET /chatgpt_stream', urls['chatgpt_stream'])
+            done = events.rsplit('event: done\ndata: ', 1)[-1].split('\n', 1)[0]
+            self.request('POST /chatgpt_finish', urls['chatgpt_finish'], {})
+            return bool(json.loads(done).get('fallback')) if done.startswith('{') else False
+        if 'chatgpt_status' in urls:
+            # loading.html: poll until the job is done, then reload the results page
+            while True:
+                time.sleep(self.poll_interval)
+                _, status = self.request('GET /chatgpt_status', urls['chatgpt_status'])
+                if json.loads(status)['status'] != 'pending':
+                    break
+            _, page = self.request('GET /chatgpt_results (waited)', '/chatgpt_results', ok=(200,))
+            return 'chatgpt_status/' in page
+        # Served from the narrative cache
+        return False
+
+
+def run_load(base_url: str, reviewers: int, reviews: Optional[int] = None, duration: Optional[float] = None,
+             think_time: float = 0.0, role: Optional[str] = None, level: Optional[str] = None,
+             seed: Optional[int] = None, poll_interval: float = 1.0) -> dict:
+    """
+    Drives ``reviewers`` concurrent reviewers, each doing ``reviews`` reviews or running until
+    ``duration`` seconds have passed, and returns the report.
+    """
+    recorder = Recorder()
+    deadline = time.time() + duration if duration else None
+    master = random.Random(seed)
+
+    def work(rng):
+        reviewer = Reviewer(base_url, recorder, rng, poll_interval=poll_interval)
+        done = 0
+        while (reviews is None or done < reviews) and (deadline is None or time.time() < deadline):
+            start = time.perf_counter()
+            try:
+                fallback = reviewer.review(role, level)
+                recorder.review(time.perf_counter() - start, fallback)
+            except Exception as e:
+                print(f'Review failed: {e}')
+                recorder.review(None)
+            done += 1
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+
+    if reviews is None and deadline is None:
+        reviews = 1
+    threads = [threading.Thread(target=work, args=(random.Random(master.random()),), daemon=True)
+               for _ in range(reviewers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - start)
+
+
+def free_port(host: str = '127.0.0.1') -> int:
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def start_app(host: str, port: int, env: dict, app_command: Optional[str] = None) -> subprocess.Popen:
+    """Starts the app in a separate process and waits until it answers."""
+    if app_command:
+        command = shlex.split(app_command.format(host=host, port=port))
+    else:
+        command = [sys.executable, os.path.abspath(__file__), '--serve', '--host', host, '--port', str(port)]
+    # The app's own progress output would drown the report; errors still reach stderr
+    process = subprocess.Popen(command, env=dict(os.environ, **env), cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL)
+    for _ in range(300):
+        if process.poll() is not None:
+            raise RuntimeError(f'App exited with status {process.returncode}')
+        try:
+            with socket.create_connection((host, port), timeout=0.1):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('App did not start within 30 seconds')
+
+
+def serve(host: str, port: int) -> None:
+    # Threaded like the Flask development server, but without the reloader or debugger
+    from werkzeug.serving import make_server
+    from webapp import create_app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    make_server(host, port, create_app(), threaded=True).serve_forever()
+
+
+def print_report(report: dict) -> None:
+    reviews = report['reviews']
+    print(f"\n{reviews['count']} reviews in {report['elapsed_s']}s ({reviews['per_second']}/s), "
+          f"{reviews['failed']} failed, {reviews['fallbacks']} showed the fallback narrative")
+    print(f"Review latency: p50 {reviews['p50_ms']}ms  p95 {reviews['p95_ms']}ms  p99 {reviews['p99_ms']}ms\n")
+    print(f"{'route':<30}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, s in report['routes'].items():
+        print(f"{route:<30}{s['count']:>8}{s['errors']:>8}{s['per_second']:>9}{s['p50_ms']:>10}"
+              f"{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the web app with simulated reviewers and a stub LLM.")
+    parser.add_argument('--reviewers', type=int, default=10, help="Concurrent simulated reviewers")
+    parser.add_argument('--reviews', type=int, help="Reviews per reviewer (default 1, or unlimited with --duration)")
+    parser.add_argument('--duration', type=float, help="Seconds to keep starting new reviews")
+    parser.add_argument('--think-time', type=float, default=0.0, help="Mean seconds between a reviewer's reviews")
+    parser.add_argument('--role', help="Review this role only (default: a random role per review)")
+    parser.add_argument('--level', help="Review this level only (default: a random level of the role)")
+    parser.add_argument('--latency', type=float, default=0.5, help="Seconds the stub LLM takes per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of LLM requests that fail")
+    parser.add_argument('--stream-delay', type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument('--no-stream', action='store_true', help="Use the polling loading page instead of streaming")
+    parser.add_argument('--url', help="Test an already running app instead of starting one (no stub LLM is started)")
+    parser.add_argument('--app-command', help="Command starting the app, with {host} and {port}, e.g. for gunicorn")
+    parser.add_argument('--session-store', default='filesystem',
+                        help="Session store for the started app: filesystem, sqlite, shm or a redis:// URL")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('-o', '--output', help="Write the report as JSON")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--host', default='127.0.0.1', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        serve(args.host, args.port)
+        return 0
+
+    kwargs = dict(reviewers=args.reviewers, reviews=args.reviews, duration=args.duration, think_time=args.think_time,
+                  role=args.role, level=args.level, seed=args.seed)
+    if args.url:
+        report = run_load(args.url, **kwargs)
+    else:
+        with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate, stream_delay=args.stream_delay,
+                              seed=args.seed) as llm, tempfile.TemporaryDirectory() as tmp:
+            # Keep the run's logs, narrative cache and draft index out of the working tree
+            env = {
+                'OPENAI_BASE_URL': llm.base_url,
+                'OPENAI_API_KEY': 'load-test',
+                'REVIEW_LOG_DIR': os.path.join(tmp, 'logs'),
+                'NARRATIVE_CACHE_DIR': os.path.join(tmp, 'narrative_cache'),
+                'SESSION_INDEX_PATH': os.path.join(tmp, 'session_index.sqlite3'),
+                'SESSION_STORE': args.session_store if '://' in args.session_store or args.session_store == 'shm'
+                else f'{args.session_store}://{tmp}',
+                'SECRET_KEY_PATH': os.path.join(tmp, 'secret_key'),
+                'STREAM_NARRATIVES': '0' if args.no_stream else '1',
+            }
+            port = free_port(args.host)
+            app = start_app(args.host, port, env, args.app_command)
+            try:
+                report = run_load(f'http://{args.host}:{port}', **kwargs)
+            finally:
+                app.terminate()
+                app.wait()
+            report['llm'] = {'requests': llm.requests, 'errors': llm.errors, 'latency_s': args.latency,
+                             'error_rate': args.error_rate}
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['reviews']['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
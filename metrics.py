@@ -0,0 +1,199 @@
+"""
+In-process request metrics exposed in Prometheus text format.
+
+Code paths wrap their expensive phases (YAML parsing, behavior and page
+template rendering, session load/save, LLM calls, log writes) in
+``metrics.phase(name)``; the durations go into fixed-bucket histograms.
+``init_app`` adds route-level latency and a ``/metrics`` endpoint to a Flask app.
+
+Set METRICS_ENABLED=0 to disable collection. When disabled, ``phase`` returns
+a shared no-op context manager and no request hooks are installed.
+"""
+
+import bisect
+import contextlib
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; covers sub-millisecond cache hits up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name -> (type, help text, label names)
+FAMILIES = {
+    'review_phase_seconds': ('histogram', 'Time spent in each phase of request handling.', ('phase',)),
+    'review_request_seconds': ('histogram', 'Request latency by route.', ('route', 'method', 'status')),
+    'review_llm_retries_total': ('counter', 'LLM call retries.', ('source',)),
+    'review_prompt_tokens_total': ('counter', 'Prompt tokens sent to the LLM, as estimated locally or reported by the API.', ('kind',)),
+    'review_narrative_sections_total': ('counter', 'Sections of sectioned narratives, reused from the cache or generated.', ('outcome',)),
+}
+
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class _Phase:
+    __slots__ = ('metrics', 'labels', 'start')
+
+    def __init__(self, metrics: "Metrics", labels: Tuple[str, ...]) -> None:
+        self.metrics = metrics
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe('review_phase_seconds', self.labels, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Thread-safe histograms and counters keyed by (family, label values).
+    """
+    def __init__(self, enabled: bool = True, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms: Dict[tuple, Histogram] = {}
+        self._counters: Dict[tuple, float] = {}
+
+    def phase(self, name: str):
+        """Context manager timing one phase; a no-op when metrics are disabled."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, (name,))
+
+    def observe(self, family: str, labels: Tuple[str, ...], seconds: float) -> None:
+        if not self.enabled:
+            return
+        # Values past the last bucket only count towards +Inf
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get((family, labels))
+            if histogram is None:
+                histogram = self._histograms[(family, labels)] = Histogram(len(self.buckets))
+            if index < len(self.buckets):
+                histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def inc(self, family: str, labels: Tuple[str, ...], amount: float = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(family, labels)] = self._counters.get((family, labels), 0) + amount
+
+    def snapshot(self, family: str) -> dict:
+        """Returns {labels: count} for a histogram family or {labels: value} for a counter."""
+        with self._lock:
+            if FAMILIES[family][0] == 'histogram':
+                return {labels: h.count for (f, labels), h in self._histograms.items() if f == family}
+            return {labels: v for (f, labels), v in self._counters.items() if f == family}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        lines = []
+        for family, (kind, help_text, label_names) in FAMILIES.items():
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                for (f, labels), (counts, total, count) in sorted(histograms.items()):
+                    if f != family:
+                        continue
+                    base = _labels(label_names, labels)
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, counts):
+                        cumulative += n
+                        lines.append(f'{family}_bucket{{{base},le="{bound}"}} {cumulative}')
+                    lines.append(f'{family}_bucket{{{base},le="+Inf"}} {count}')
+                    lines.append(f'{family}_sum{{{base}}} {total:.6f}')
+                    lines.append(f'{family}_count{{{base}}} {count}')
+            else:
+                for (f, labels), value in sorted(counters.items()):
+                    if f == family:
+                        lines.append(f'{family}{{{_labels(label_names, labels)}}} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+class TimedSessionInterface:
+    """
+    Wraps a Flask session interface to time session load and save (unpickle/pickle plus I/O).
+    """
+    def __init__(self, inner, metrics: Metrics) -> None:
+        self.inner = inner
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def open_session(self, app, request):
+        with self.metrics.phase('session_load'):
+            return self.inner.open_session(app, request)
+
+    def save_session(self, app, session, response):
+        with self.metrics.phase('session_save'):
+            return self.inner.save_session(app, session, response)
+
+
+def init_app(app, collector: Optional[Metrics] = None) -> None:
+    """Adds the /metrics endpoint and, if enabled, route latency and session timing to a Flask app."""
+    from flask import Response, abort, g, request
+    collector = collector or metrics
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        if not collector.enabled:
+            abort(404)
+        return Response(collector.render(), mimetype='text/plain; version=0.0.4')
+
+    if not collector.enabled:
+        return
+
+    app.session_interface = TimedSessionInterface(app.session_interface, collector)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        # Runs after the session has been saved, so route latency includes it
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = str(g.pop('metrics_status', 500))
+        collector.observe('review_request_seconds', (route, request.method, status), time.perf_counter() - start)
+
+
+# Process-wide metrics shared by the web app, generator and narrative engine
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
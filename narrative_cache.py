@@ -0,0 +1,175 @@
+"""
+Content-addressed on-disk cache for ChatGPT narratives.
+
+Entries are keyed by a hash of (model, prompt, feedback text), so an identical
+request is answered from disk instead of the OpenAI API. Files are written
+atomically (temp file + rename), which lets several worker processes share one
+cache directory. The cache is bounded by total size and entry age.
+
+Set CACHE_STORE (sqlite, shm or a redis:// URL; see shared_store) to keep the
+entries in a shared store instead, for instance to share one cache between
+hosts. Entries then expire after the maximum age; the store bounds their size.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from shared_store import open_store
+
+CACHE_DIR = os.environ.get(
+    'NARRATIVE_CACHE_DIR',
+    os.path.join(os.path.dirname(__file__), 'narrative_cache'),
+)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+# Re-scan the directory every N writes to account for entries written by other processes
+RESCAN_EVERY = 100
+
+
+def cache_key(model: str, prompt: str, feedback: str) -> str:
+    payload = json.dumps([model, prompt, feedback], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class NarrativeCache:
+    """
+    Size- and age-bounded narrative cache stored as one JSON file per entry.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, store=None) -> None:
+        self.cache_dir = cache_dir
+        self.store = store
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._approx_bytes: Optional[int] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, model: str, prompt: str, feedback: str) -> Optional[str]:
+        """Returns the cached narrative, or None on a miss or an expired entry."""
+        if self.store is not None:
+            return self._get_stored(cache_key(model, prompt, feedback))
+        path = self._path(cache_key(model, prompt, feedback))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if time.time() - entry.get('created', 0) > self.max_age:
+            self._remove(path)
+            self.misses += 1
+            return None
+        try:
+            # Touch so eviction drops the least recently used entries first
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get('text')
+
+    def put(self, model: str, prompt: str, feedback: str, text: str) -> None:
+        key = cache_key(model, prompt, feedback)
+        path = self._path(key)
+        data = json.dumps({'model': model, 'created': time.time(), 'text': text}, ensure_ascii=False).encode('utf-8')
+        if self.store is not None:
+            try:
+                self.store.set(key, data, self.max_age)
+            except Exception as e:
+                print(f'Could not write narrative cache entry: {e}')
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Could not write narrative cache entry: {e}')
+            return
+        with self._lock:
+            self._writes += 1
+            if self._approx_bytes is None or self._writes % RESCAN_EVERY == 0:
+                self._approx_bytes = self._scan_size()
+            else:
+                self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _get_stored(self, key: str) -> Optional[str]:
+        try:
+            data = self.store.get(key)
+            entry = json.loads(data) if data is not None else None
+        except Exception as e:
+            print(f'Could not read narrative cache entry: {e}')
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.get('text')
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for fname in files:
+                if not fname.endswith('.json'):
+                    continue
+                path = os.path.join(root, fname)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st
+
+    def _scan_size(self) -> int:
+        return sum(st.st_size for _, st in self._entries())
+
+    def _evict(self) -> None:
+        # Drop expired entries, then least recently used until under 90% of the budget
+        now = time.time()
+        entries = sorted(self._entries(), key=lambda e: e[1].st_mtime)
+        total = sum(st.st_size for _, st in entries)
+        target = self.max_bytes * 0.9
+        for path, st in entries:
+            if total <= target and now - st.st_mtime <= self.max_age:
+                continue
+            self._remove(path)
+            total -= st.st_size
+        self._approx_bytes = total
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'approx_bytes': self._approx_bytes}
+
+
+def configured_store():
+    """Opens the CACHE_STORE store, or returns None for the cache directory."""
+    spec = os.environ.get('CACHE_STORE')
+    if not spec:
+        return None
+    try:
+        return open_store(spec, 'narratives')
+    except (ImportError, ValueError) as e:
+        print(f'Could not open narrative cache store {spec}: {e}; using {CACHE_DIR}')
+        return None
+
+
+# Process-wide cache; the directory (or store) is shared by all workers
+narrative_cache = NarrativeCache(store=configured_store())
@@ -0,0 +1,372 @@
+"""
+Asyncio-based engine for generating many ChatGPT narratives concurrently.
+
+One ``AsyncOpenAI`` client (and therefore one HTTP connection pool) is shared
+by all requests. A semaphore caps the number of requests in flight, and two
+token buckets keep us inside the requests-per-minute and tokens-per-minute
+budgets. Each request retries with its own jittered exponential backoff, so a
+rate-limited request sleeps without stalling the others.
+
+Each request can have an overall deadline covering all of its attempts, and
+slow requests can be hedged: a duplicate is sent after ``hedge_after`` seconds
+and whichever answers first wins.
+
+The engine runs its event loop on a background thread, so synchronous callers
+(the web job queue, batch runs) can use ``submit`` and ``run_many`` without
+touching asyncio themselves. Requests with an ``on_text`` callback are made as
+streamed completions and the callback receives each text delta as it arrives.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from os.path import expanduser
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from metrics import metrics
+
+API_KEY_FILE = "~/.open-ai/open-ai-key"
+DEFAULT_MODEL = "chatgpt-4o-latest"
+
+# Rough completion size used to reserve tokens-per-minute budget up front
+COMPLETION_TOKEN_ESTIMATE = 800
+
+
+def load_api_key() -> str:
+    """
+    Returns the OpenAI API key from $OPENAI_API_KEY or ~/.open-ai/open-ai-key.
+    Raises FileNotFoundError if neither is available.
+    """
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if api_key:
+        return api_key
+    with open(expanduser(API_KEY_FILE), "r") as f:
+        return f.read().strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (roughly four characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at ``rate_per_minute``.
+    """
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # Requests larger than the bucket are allowed through once it is full
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class NarrativeRequest:
+    """
+    A single chat completion to run. ``key`` identifies the result for the caller.
+    If ``on_text`` is set the completion is streamed and it is called with each text delta.
+    """
+    __slots__ = ("key", "messages", "model", "on_text")
+
+    def __init__(self, key, messages: List[dict], model: Optional[str] = None,
+                 on_text: Optional[Callable[[str], None]] = None) -> None:
+        self.key = key
+        self.messages = messages
+        self.model = model
+        self.on_text = on_text
+
+
+class NarrativeResult:
+    """
+    Outcome of a NarrativeRequest: ``text`` on success, ``error`` on failure.
+    """
+    __slots__ = ("key", "text", "error", "attempts", "latency", "usage")
+
+    def __init__(self, key, text=None, error=None, attempts=0, latency=0.0, usage=None) -> None:
+        self.key = key
+        self.text = text
+        self.error = error
+        self.attempts = attempts
+        self.latency = latency
+        self.usage = usage
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409, 429)
+    return False
+
+
+class NarrativeEngine:
+    """
+    Runs chat completions concurrently on a pooled async client with rate limiting and retries.
+    """
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        model: str = DEFAULT_MODEL,
+        max_concurrency: int = 8,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 200_000,
+        max_attempts: int = 3,
+        backoff_min: float = 1.0,
+        backoff_max: float = 10.0,
+        timeout: float = 60.0,
+        deadline: Optional[float] = None,
+        hedge_after: Optional[float] = None,
+    ) -> None:
+        self.api_key = api_key
+        self.base_url = base_url or os.environ.get('OPENAI_BASE_URL')
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_attempts = max_attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        # Overall seconds per request across attempts, and when to send a hedged duplicate
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._start_lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.hedges = 0
+
+    # -- event loop management -------------------------------------------------
+
+    def start(self) -> "NarrativeEngine":
+        """Starts the background event loop (idempotent)."""
+        with self._start_lock:
+            if self._loop is not None:
+                return self
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            errors = []
+
+            def run():
+                asyncio.set_event_loop(loop)
+                try:
+                    loop.run_until_complete(self._setup())
+                except BaseException as e:
+                    errors.append(e)
+                    loop.close()
+                    return
+                finally:
+                    ready.set()
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name='narrative-engine', daemon=True)
+            self._thread.start()
+            ready.wait()
+            if errors:
+                self._thread.join()
+                raise errors[0]
+            self._loop = loop
+        return self
+
+    async def _setup(self) -> None:
+        from openai import AsyncOpenAI
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._request_bucket = TokenBucket(self.requests_per_minute)
+        self._token_bucket = TokenBucket(self.tokens_per_minute)
+        # One client, and so one pooled HTTP connection pool, for every request;
+        # the semaphore above bounds concurrency and retries are handled here, not by the SDK
+        self._client = AsyncOpenAI(
+            api_key=self.api_key or load_api_key(),
+            base_url=self.base_url,
+            max_retries=0,
+            timeout=self.timeout,
+        )
+
+    def close(self) -> None:
+        """Closes the HTTP pool and stops the background loop."""
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+    # -- async API -----------------------------------------------------------
+
+    async def complete(self, request: NarrativeRequest, deadline: Optional[float] = None) -> NarrativeResult:
+        """
+        Runs one request with rate limiting and per-request retry/backoff. Never raises.
+        ``deadline`` (default: the engine's) caps the total seconds spent across attempts,
+        rate-limit waits and backoff; the request fails with TimeoutError once it passes.
+        """
+        model = request.model or self.model
+        prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in request.messages)
+        loop = asyncio.get_running_loop()
+        deadline = deadline if deadline is not None else self.deadline
+        give_up_at = loop.time() + deadline if deadline else None
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            streamed = []
+            try:
+                attempt_coro = self._attempt(model, request, prompt_tokens, streamed, start)
+                if give_up_at is None:
+                    text, usage = await attempt_coro
+                else:
+                    remaining = give_up_at - loop.time()
+                    try:
+                        text, usage = await asyncio.wait_for(attempt_coro, max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        raise TimeoutError(f"narrative deadline of {deadline:g}s exceeded") from None
+                self.completed += 1
+                return NarrativeResult(
+                    request.key, text=text, attempts=attempt,
+                    latency=time.perf_counter() - start, usage=usage)
+            except Exception as e:
+                delay = min(self.backoff_max, self.backoff_min * 2 ** (attempt - 1))
+                delay = random.uniform(self.backoff_min, max(self.backoff_min, delay))
+                # A stream that already delivered text cannot be retried without repeating it
+                if (attempt >= self.max_attempts or streamed or not _is_retryable(e)
+                        or (give_up_at is not None and loop.time() + delay >= give_up_at)):
+                    self.failed += 1
+                    return NarrativeResult(request.key, error=e, attempts=attempt,
+                                           latency=time.perf_counter() - start)
+                self.retries += 1
+                metrics.inc('review_llm_retries_total', ('engine',))
+                logging.info("Narrative request %s failed (%s); retrying in %.1fs", request.key, e, delay)
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, model: str, request: NarrativeRequest, prompt_tokens: int, streamed: list,
+                       start: float):
+        """One rate-limited attempt. Returns (text, usage)."""
+        await self._request_bucket.acquire(1)
+        await self._token_bucket.acquire(prompt_tokens + COMPLETION_TOKEN_ESTIMATE)
+        if request.on_text is not None:
+            return await self._stream(model, request, streamed, start)
+        if self.hedge_after is None:
+            return await self._create(model, request.messages)
+        return await self._hedged(model, request.messages, prompt_tokens)
+
+    async def _create(self, model: str, messages: List[dict]):
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                response = await self._client.chat.completions.create(model=model, messages=messages)
+            finally:
+                self.in_flight -= 1
+        return response.choices[0].message.content, getattr(response, 'usage', None)
+
+    async def _hedged(self, model: str, messages: List[dict], prompt_tokens: int):
+        """
+        Sends a second identical request if the first has not answered within hedge_after
+        seconds, and returns whichever succeeds first. The loser is cancelled.
+        """
+        tasks = {asyncio.ensure_future(self._create(model, messages))}
+        try:
+            done, tasks = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.hedges += 1
+                metrics.inc('review_llm_retries_total', ('hedge',))
+                await self._request_bucket.acquire(1)
+                await self._token_bucket.acquire(prompt_tokens + COMPLETION_TOKEN_ESTIMATE)
+                tasks.add(asyncio.ensure_future(self._create(model, messages)))
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not tasks:
+                    raise error
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _stream(self, model: str, request: NarrativeRequest, streamed: list, start: float):
+        """Runs a streamed completion, passing each delta to request.on_text. Returns (text, usage)."""
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                stream = await self._client.chat.completions.create(
+                    model=model, messages=request.messages, stream=True, stream_options={'include_usage': True})
+                usage = None
+                async for chunk in stream:
+                    usage = getattr(chunk, 'usage', None) or usage
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        if not streamed:
+                            metrics.observe('review_phase_seconds', ('llm_first_token',), time.perf_counter() - start)
+                        streamed.append(delta)
+                        request.on_text(delta)
+            finally:
+                self.in_flight -= 1
+        return ''.join(streamed), usage
+
+    async def iter_completed(self, requests: Iterable[NarrativeRequest]):
+        """Async iterator yielding NarrativeResults in completion order."""
+        tasks = [asyncio.ensure_future(self.complete(r)) for r in requests]
+        for task in asyncio.as_completed(tasks):
+            yield await task
+
+    # -- thread-safe sync API ---------------------------------------------------
+
+    def submit(self, messages: List[dict], model: Optional[str] = None, key=None,
+               on_text: Optional[Callable[[str], None]] = None, deadline: Optional[float] = None) -> Future:
+        """
+        Schedules one request from any thread; returns a concurrent Future of NarrativeResult.
+        ``on_text`` is called on the engine thread with each streamed text delta.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(
+            self.complete(NarrativeRequest(key, messages, model, on_text), deadline), self._loop)
+
+    def run_many(self, requests: Iterable[NarrativeRequest]) -> Iterator[NarrativeResult]:
+        """Runs many requests concurrently, yielding results as they complete."""
+        from concurrent.futures import as_completed
+        futures = [self.submit(r.messages, r.model, r.key) for r in requests]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'max_concurrency': self.max_concurrency,
+        }
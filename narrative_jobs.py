@@ -0,0 +1,339 @@
+"""
+Bounded background worker pool for ChatGPT narrative generation.
+
+Requests submit a job and get an ID back immediately; the slow LLM call runs
+on a worker thread and the browser polls a lightweight status endpoint.
+Streaming jobs also collect the narrative text as it arrives, so it can be
+relayed to the browser before the job finishes (see ``NarrativeJob.follow``).
+
+With several worker processes, the queue publishes each job's status, streamed
+text and result to a shared store (see shared_store), so a request that lands
+on another worker finds the job there instead of starting a duplicate: it gets
+a StoredJob, a read-only copy refreshed from the store while it is followed.
+The job itself still runs on the worker that accepted it.
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds between writes of a streaming job's text to the shared store, and between reads of it
+PUBLISH_EVERY = 0.5
+# Seconds a job's record is kept in the shared store
+STORE_TTL = 24 * 3600
+
+
+class QueueFullError(RuntimeError):
+    """Raised when too many narrative jobs are already waiting for a worker."""
+
+
+class NarrativeJob:
+    """
+    State of a single narrative generation job.
+    """
+    __slots__ = ("id", "payload", "status", "result", "error", "stream", "chunks",
+                 "submitted_at", "started_at", "finished_at", "_event", "_cond")
+
+    def __init__(self, job_id: str, payload, stream: bool = False) -> None:
+        self.id = job_id
+        self.payload = payload
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.stream = stream
+        self.chunks = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._event = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def emit(self, text: str) -> None:
+        """Appends streamed narrative text. Safe to call from any thread."""
+        if not text:
+            return
+        with self._cond:
+            self.chunks.append(text)
+            self._cond.notify_all()
+
+    def _finish(self) -> None:
+        self._event.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        self._event.wait(timeout)
+
+    def follow(self, heartbeat: float = 15.0) -> Iterator[Optional[str]]:
+        """
+        Yields streamed text chunks from the start until the job finishes.
+        Yields None if nothing arrives for ``heartbeat`` seconds, so callers can keep a connection alive.
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                if sent == len(self.chunks) and not self.finished:
+                    self._cond.wait(heartbeat)
+                new = self.chunks[sent:]
+                finished = self.finished
+            sent += len(new)
+            if new:
+                yield ''.join(new)
+            elif finished:
+                return
+            else:
+                yield None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at,
+        }
+
+    def to_record(self) -> dict:
+        """Everything another worker needs to report on, follow or finish this job."""
+        with self._cond:
+            text = ''.join(self.chunks)
+        return dict(self.to_dict(), stream=self.stream, started_at=self.started_at, result=self.result, text=text)
+
+
+class StoredJob(NarrativeJob):
+    """
+    A job running on another worker, as last published to the shared store.
+    """
+    __slots__ = ("_store",)
+
+    def __init__(self, store, record: dict) -> None:
+        super().__init__(record['id'], None, record.get('stream', False))
+        self._store = store
+        self._load(record)
+
+    def _load(self, record: dict) -> None:
+        self.status = record['status']
+        self.error = record.get('error')
+        self.result = record.get('result')
+        self.chunks = [record['text']] if record.get('text') else []
+        self.submitted_at = record['submitted_at']
+        self.started_at = record.get('started_at')
+        self.finished_at = record.get('finished_at')
+
+    def refresh(self) -> None:
+        """Reloads the job from the store; a job whose record has expired is reported as failed."""
+        data = self._store.get(self.id)
+        if data is None:
+            self.status, self.error = FAILED, 'narrative job expired'
+        else:
+            self._load(json.loads(data))
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        end = None if timeout is None else time.time() + timeout
+        while not self.finished and (end is None or time.time() < end):
+            time.sleep(PUBLISH_EVERY)
+            self.refresh()
+
+    def follow(self, heartbeat: float = 15.0) -> Iterator[Optional[str]]:
+        sent, last = 0, time.time()
+        while True:
+            text, finished = ''.join(self.chunks), self.finished
+            if len(text) > sent:
+                yield text[sent:]
+                sent, last = len(text), time.time()
+            elif finished:
+                return
+            elif time.time() - last >= heartbeat:
+                yield None
+                last = time.time()
+            time.sleep(PUBLISH_EVERY)
+            self.refresh()
+
+
+class NarrativeJobQueue:
+    """
+    Runs ``runner(payload)`` on a bounded thread pool and tracks job state by ID.
+    ``on_done(job)`` is called on the worker after each successful job, before it is reported finished.
+    With a shared ``store``, jobs are also published there for the other worker processes.
+    Stats cover this process's jobs only.
+    """
+    def __init__(
+        self,
+        runner: Callable,
+        max_workers: int = 4,
+        max_pending: int = 64,
+        max_retained: int = 1024,
+        on_done: Optional[Callable] = None,
+        store=None,
+    ) -> None:
+        self.runner = runner
+        self.on_done = on_done
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, NarrativeJob]" = OrderedDict()
+        self._pending = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._latencies = deque(maxlen=512)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily so importing the web app does not start threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='narrative')
+        return self._executor
+
+    def _publish(self, job: NarrativeJob) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.set(job.id, json.dumps(job.to_record()).encode('utf-8'), STORE_TTL)
+        except Exception as e:
+            print(f'Could not publish narrative job {job.id}: {e}')
+
+    def _streamer(self, job: NarrativeJob) -> Callable:
+        # Collects streamed text on the job and publishes it at most every PUBLISH_EVERY seconds
+        published = [0.0]
+
+        def on_text(text: str) -> None:
+            job.emit(text)
+            if self.store is not None and time.time() - published[0] >= PUBLISH_EVERY:
+                published[0] = time.time()
+                self._publish(job)
+        return on_text
+
+    def submit(self, payload, stream: bool = False) -> str:
+        """
+        Queues a job and returns its ID. Raises QueueFullError when the backlog is full.
+        Streaming jobs call ``runner(payload, on_text=job.emit)``.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise QueueFullError(f"{self._pending} narrative jobs already queued")
+            job = NarrativeJob(uuid.uuid4().hex, payload, stream)
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._evict()
+            executor = self._get_executor()
+        self._publish(job)
+        executor.submit(self._run, job)
+        return job.id
+
+    def _evict(self) -> None:
+        # Drop the oldest finished jobs once we are retaining too many
+        if len(self._jobs) <= self.max_retained:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished]:
+            if len(self._jobs) <= self.max_retained:
+                break
+            del self._jobs[job_id]
+
+    def _run(self, job: NarrativeJob) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._in_flight += 1
+        job.started_at = time.time()
+        job.status = RUNNING
+        self._publish(job)
+        try:
+            if job.stream:
+                job.result = self.runner(job.payload, on_text=self._streamer(job))
+            else:
+                job.result = self.runner(job.payload)
+            status = DONE
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            status = FAILED
+        # The job stays running until on_done has kept its result, so nobody sees it finished before that
+        if status == DONE and self.on_done is not None:
+            try:
+                self.on_done(job)
+            except Exception as e:
+                print(f'Could not finish narrative job {job.id}: {e}')
+        job.status = status
+        job.finished_at = time.time()
+        with self._lock:
+            self._in_flight -= 1
+            if job.status == DONE:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._latencies.append(job.finished_at - job.submitted_at)
+        self._publish(job)
+        job._finish()
+
+    def get(self, job_id: Optional[str]) -> Optional[NarrativeJob]:
+        """The job with this ID, from this process or else from the shared store; None if there is none."""
+        if not job_id:
+            return None
+        job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            try:
+                data = self.store.get(job_id)
+            except Exception as e:
+                print(f'Could not load narrative job {job_id}: {e}')
+                data = None
+            if data is not None:
+                job = StoredJob(self.store, json.loads(data))
+        return job
+
+    def discard(self, job_id: Optional[str]) -> None:
+        job = self.get(job_id)
+        if job is None or not job.finished:
+            return
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        if self.store is not None:
+            try:
+                self.store.delete(job_id)
+            except Exception as e:
+                print(f'Could not discard narrative job {job_id}: {e}')
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[NarrativeJob]:
+        """Blocks until the job finishes or ``timeout`` expires. Intended for tests and CLI use."""
+        job = self.get(job_id)
+        if job is not None:
+            job.wait(timeout)
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                'queue_depth': self._pending,
+                'in_flight': self._in_flight,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'max_workers': self.max_workers,
+            }
+        if latencies:
+            stats['latency_avg'] = sum(latencies) / len(latencies)
+            stats['latency_p50'] = latencies[len(latencies) // 2]
+            stats['latency_p95'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            stats['latency_max'] = latencies[-1]
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
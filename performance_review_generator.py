@@ -10,25 +10,29 @@ DESCRIPTION = """
 Performance review generator for Dropbox career framework roles.
 """
 
-import os
 import logging
+import time
 from typing import List
-import yaml
 
-# Default LEVEL_MAP for backward compatibility
-DEFAULT_LEVEL_MAP = {
-    "junior": "IC1",
-    "intermediate": "IC2",
-    "senior": "IC3",
-    "tech lead": "IC4",
-    "principal": "IC5",
-    "distinguished": "IC6",
-}
+from role_registry import DEFAULT_LEVEL_MAP, registry
+from review_model import level_definition
+from narrative_cache import narrative_cache
+from feedback_renderer import build_document, render
+from narrative_engine import DEFAULT_MODEL, load_api_key
+from metrics import metrics
+from prompt_builder import SectionStream, build_prompt, build_section_prompts, join_sections
+from fallback_narrative import build_fallback_narrative
+
+# Seconds a retry of a failed ChatGPT call waits at least
+MIN_RETRY_WAIT = 1
 
 
 class PerformanceReviewGenerator:
     """
     Generates performance reviews for a given role and level using Dropbox career framework YAML definitions.
+
+    The web app keeps per-request state in review_model.Review; this class wraps the same shared
+    LevelDefinition with the feedback lists, prompts and ChatGPT calls used by the CLI and batch tools.
     """
     def __init__(
         self,
@@ -44,37 +48,30 @@ class PerformanceReviewGenerator:
         self.name = name
         self.pronouns = pronouns
         self.role = role
-        self.level = level.lower()
-        # Load role YAML to check for a level_map
-        self.role_data = self.load_role_definition(role)
-        self.level_map = self.role_data.get('level_map', DEFAULT_LEVEL_MAP)
-        self.valid_levels = list(self.level_map.keys())
-        if self.level not in self.valid_levels:
-            raise ValueError(f"Invalid level '{self.level}'. Must be one of {', '.join(self.valid_levels)}.")
-        self.ic_level = self.level_map[self.level]
+        # Built once per role definition version and shared; see review_model
+        self.definition = level_definition(role, level)
+        self.level = self.definition.level
+        self.ic_level = self.definition.ic_level
         print(f"Level selected: {self.level} (Dropbox {self.ic_level})")
 
-        # Load YAML for the role
-        self.role_data = self.load_role_definition(self.role)
-        if self.level not in self.role_data['levels']:
-            raise ValueError(f"Level '{self.level}' not found in YAML for role '{self.role}'")
-        self.level_data = self.role_data['levels'][self.level]
-
-        # Dynamically populate responsibilities from YAML
-        self.responsibilities = {}
-        for section, section_dict in self.level_data.items():
-            self.responsibilities[section] = {}
-            for subsection, behaviors in section_dict.items():
-                self.responsibilities[section][subsection] = [
-                    s.format(name=self.name, pronouns=self.pronouns)
-                    for s in behaviors
-                ]
-        
+        # Rendered once per (role, level, name, pronouns) and shared; see role_registry
+        self.responsibilities = registry.render_level(self.role, self.level, self.name, self.pronouns)
+
         self.exceeds_list = dict()
         self.meets_list = dict()
         self.does_not_meet_list = dict()
         # Store section comments
         self.section_comments = dict()
+        # Set when chatgpt_feedback was served from the narrative cache
+        self.chatgpt_cached = False
+        # Set when chatgpt_feedback is the local fallback rather than a ChatGPT answer
+        self.chatgpt_fallback = False
+        # Prompt size of the last narrative request: local estimate and API-reported count
+        self.prompt_tokens = None
+        self.prompt_tokens_reported = None
+        # Sectioned narratives: sections answered from the cache vs sent to the model
+        self.sections_reused = 0
+        self.sections_generated = 0
 
         # Only collect feedback interactively if running as main
         import sys
@@ -86,6 +83,23 @@ class PerformanceReviewGenerator:
                 self.get_chatgpt_feedback()
                 print(self.chatgpt_feedback)
 
+    @property
+    def role_data(self):
+        """The role's (read-only) YAML definition, from the shared registry."""
+        return self.load_role_definition(self.role)
+
+    @property
+    def level_map(self):
+        return self.role_data.get('level_map', DEFAULT_LEVEL_MAP)
+
+    @property
+    def valid_levels(self):
+        return list(self.level_map.keys())
+
+    @property
+    def level_data(self):
+        return self.role_data['levels'][self.level]
+
     def collect_feedback_from_user(self):
         """Collects user feedback for each behavior and section comments."""
         print(
@@ -128,147 +142,241 @@ class PerformanceReviewGenerator:
             if comments:
                 self.section_comments[responsibility] = comments
 
-    def give_feedback(self):
-        feedback = ""
-
-        feedback += "\nOVER PERFORMING:"
-        for key_responsibility in self.exceeds_list:
-            feedback += f"\n{key_responsibility}\n"
-            for comment in self.exceeds_list[key_responsibility]:
-                feedback += f"- {comment}"
+    def ordered_sections(self):
+        """Returns section names in form order: 'overview' first, then the rest sorted."""
+        return list(self.definition.sections)
 
-        feedback += "\nMEETS EXPECTATIONS:"
-        for key_responsibility in self.meets_list:
-            feedback += f"\n{key_responsibility}\n"
-            for comment in self.meets_list[key_responsibility]:
-                feedback += f"- {comment}"
+    def behavior_items(self):
+        """
+        Returns (section, subsection, behavior) tuples in form order.
+        The index of each item is the index used for rating_{i} fields and ratings files.
+        """
+        return self.definition.items(self.name, self.pronouns)
 
-        feedback += "\nGIVE FEEDBACK:"
-        for key_responsibility in self.does_not_meet_list:
-            feedback += f"\n{key_responsibility}\n"
-            for comment in self.does_not_meet_list[key_responsibility]:
-                feedback += f"- {comment}"
+    def apply_ratings(self, ratings, comments=None):
+        """
+        Fills the feedback lists from a sequence of 0/1/2 ratings in behavior_items() order.
+        """
+        self.does_not_meet_list, self.meets_list, self.exceeds_list = self.definition.buckets(
+            ratings, self.definition.texts(self.name, self.pronouns))
+        if comments is not None:
+            self.section_comments = comments
+
+    def feedback_document(self, narrative=None):
+        """Returns the intermediate document used by feedback_renderer for this review."""
+        return build_document(
+            self.exceeds_list, self.meets_list, self.does_not_meet_list, self.section_comments,
+            name=self.name, role=self.role, level=self.level, narrative=narrative,
+        )
 
-        self.feedback = feedback
+    def give_feedback(self, fmt='text'):
+        """Renders the feedback lists and section comments into self.feedback."""
+        with metrics.phase('feedback_render'):
+            self.feedback = render(self.feedback_document(), fmt)
 
     def load_role_definition(self, role):
         """
-        Loads the YAML definition for the given role from the role_definitions directory.
+        Returns the (read-only) YAML definition for the given role from the shared role registry.
         """
-        yaml_path = os.path.join(os.path.dirname(__file__), "role_definitions", f"{role.lower().replace(' ', '_')}.yaml")
-        if not os.path.exists(yaml_path):
-            raise FileNotFoundError(f"Role definition YAML not found: {yaml_path}")
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-        return data
+        return registry.get(role).data
 
     def make_overview(self):
         """Legacy: Returns overview section for the current role/level. Now handled by YAML."""
-        overview_data = self.role_data['overview']
-        overview = {}
-        for section, section_dict in overview_data.items():
-            overview[section] = []
-            for item in section_dict:
-                overview[section].append(item.format(name=self.name, pronouns=self.pronouns))
-        return overview
+        return dict(self.responsibilities.get('overview', {}))
 
     def make_results(self):
         """Legacy: Returns results section for the current role/level. Now handled by YAML."""
-        results_data = self.role_data['results']
-        results = {}
-        for section, section_dict in results_data.items():
-            results[section] = []
-            for item in section_dict:
-                results[section].append(item.format(name=self.name, pronouns=self.pronouns))
-        return results
+        return dict(self.responsibilities.get('results', {}))
 
     def make_direction(self):
         """Returns direction section for the current role/level, loaded from YAML."""
-        direction_data = self.level_data.get('direction', {})
-        direction = {}
-        for section, behaviors in direction_data.items():
-            direction[section] = [
-                s.format(name=self.name, pronouns=self.pronouns)
-                for s in behaviors
-            ]
-        return direction
+        return dict(self.responsibilities.get('direction', {}))
 
     def make_talent(self):
         """Returns talent section for the current role/level, loaded from YAML."""
-        talent_data = self.level_data.get('talent', {})
-        talent = {}
-        for section, behaviors in talent_data.items():
-            talent[section] = [
-                s.format(name=self.name, pronouns=self.pronouns)
-                for s in behaviors
-            ]
-        return talent
+        return dict(self.responsibilities.get('talent', {}))
 
     def make_culture(self):
         """Returns culture section for the current role/level, loaded from YAML."""
-        culture_data = self.level_data.get('culture', {})
-        culture = {}
-        for section, behaviors in culture_data.items():
-            culture[section] = [
-                s.format(name=self.name, pronouns=self.pronouns)
-                for s in behaviors
-            ]
-        return culture
+        return dict(self.responsibilities.get('culture', {}))
 
     def make_craft(self):
         """Returns craft section for the current role/level, loaded from YAML."""
-        craft_data = self.level_data.get('craft', {})
-        craft = {}
-        for section, behaviors in craft_data.items():
-            craft[section] = [
-                s.format(name=self.name, pronouns=self.pronouns)
-                for s in behaviors
-            ]
-        return craft
-
-
-    def get_chatgpt_feedback(self, model="chatgpt-4o-latest"):
-        from openai import OpenAI
+        return dict(self.responsibilities.get('craft', {}))
+
+    def build_primer_prompt(self):
+        """Returns the ChatGPT prompt for the current feedback. Call give_feedback() first."""
+        return f"""I want you to be an engineering manager coach. Someone like Claire Hughes Johnson, author of "Scaling People: Tactics for Management and Company Building", or  Patrick Lencioni author of "five dysfunctions of a team". Reply with UK english spelling. Avoid hyperbole.
+I am giving writing a performance review for a {self.level} {self.role}. Build me a narrative for {self.name}'s performance review, based on my ratings of {self.pronouns[1]} skills.
+break it into these sections:
+- What are some things they do well?
+- How could they improve?
+- What are their biggest challenges? 
+
+I have rated their skills on the basis of: exceeds expectations; meets expectations; and does not meet expectations.
+Here is the specific rated skills. Pay note to any additional comments made also. The tone should not be too casual.
+
+{self.feedback}"""
+
+    def get_cached_chatgpt_feedback(self, model=DEFAULT_MODEL, budget=None, sectioned=False):
+        """
+        Returns the cached narrative for the current feedback, or None on a miss.
+        On a hit, chatgpt_feedback is set and chatgpt_cached is True.
+        A sectioned narrative is a hit only if every section is cached.
+        """
+        if sectioned:
+            texts = []
+            for section, prompt in self.build_section_prompts(budget):
+                text = narrative_cache.get(model, *(m['content'] for m in prompt.messages))
+                if text is None:
+                    return None
+                texts.append((section, text))
+            cached = join_sections(texts) if texts else None
+        else:
+            system, user = (m['content'] for m in self.build_messages(budget))
+            cached = narrative_cache.get(model, system, user)
+        if cached is not None:
+            self.chatgpt_feedback = cached
+            self.chatgpt_cached = True
+        return cached
+
+    def build_prompt(self, budget=None):
+        """Returns the token-budgeted narrative Prompt for the current ratings; see prompt_builder."""
+        return build_prompt(
+            self.name, self.pronouns, self.role, self.level,
+            self.exceeds_list, self.meets_list, self.does_not_meet_list, self.section_comments,
+            budget=budget,
+        )
+
+    def build_section_prompts(self, budget=None):
+        """Returns [(section, Prompt)] for each rated section in form order; see prompt_builder."""
+        return build_section_prompts(
+            self.name, self.pronouns, self.role, self.level, self.ordered_sections(),
+            self.exceeds_list, self.meets_list, self.does_not_meet_list, self.section_comments,
+            budget=budget,
+        )
+
+    def build_messages(self, budget=None):
+        """Returns the chat messages sent to the model for the current feedback."""
+        return self.build_prompt(budget).messages
+
+    def fallback_narrative(self):
+        """Returns the labelled local narrative for the current ratings; see fallback_narrative."""
+        return build_fallback_narrative(self.name, self.exceeds_list, self.meets_list, self.does_not_meet_list,
+                                        self.section_comments)
+
+    def get_chatgpt_feedback(self, model=DEFAULT_MODEL, use_cache=True, refresh=False, engine=None, budget=None,
+                             on_text=None, deadline=None, sectioned=False):
+        """
+        Generates the ChatGPT narrative into chatgpt_feedback.
+
+        Identical requests are answered from the narrative cache unless ``refresh``
+        is set, in which case the API is called and the cache entry replaced.
+        If a NarrativeEngine is given, the request goes through its shared
+        client, rate limiter and retry policy instead of a one-off client.
+        The prompt is compacted to fit ``budget`` estimated tokens; the estimate is
+        kept in prompt_tokens and the API-reported count in prompt_tokens_reported.
+        With an engine, ``on_text`` receives the narrative as it streams in; otherwise
+        (and for cache hits) it is called once with the whole text.
+        ``deadline`` caps the total seconds spent on the API call including retries.
+        With ``sectioned``, each section's narrative is a separate (cached) request,
+        so only sections whose ratings or comments changed are sent again; the
+        engine runs them concurrently and ``on_text`` receives them as they are written,
+        in section order (see prompt_builder.SectionStream).
+        If no narrative can be had, chatgpt_feedback is the local fallback narrative
+        plus the prompt, and chatgpt_fallback is True.
+        """
         from tenacity import retry, stop_after_attempt, wait_random_exponential
-        from os.path import expanduser
 
         def create_error_message(error_type, error_detail=""):
-            """Create a standardized error message with the prompt included."""
+            """Create a standardized error message with the local narrative and the prompt included."""
+            self.chatgpt_fallback = True
             return f"""ChatGPT feedback is not available - {error_type}{error_detail}.
 
+{self.fallback_narrative()}
+
 In the meantime, you can paste this prompt into your favourite LLM in order to get your feedback:
 
 {primer_prompt}"""
 
-        @retry(wait=wait_random_exponential(min=1, max=10), stop=stop_after_attempt(3))
-        def submit_prompt(client, model, prompt: str, transaction: str):
+        backoff = wait_random_exponential(min=MIN_RETRY_WAIT, max=10)
+        stop = stop_after_attempt(3)
+        wait = backoff
+        if deadline:
+            # Each attempt gets what is left of the deadline, and a retry only starts if there is
+            # at least the minimum wait left, so retries cannot run past the deadline
+            remaining = lambda retry_state: deadline - retry_state.seconds_since_start
+            stop = stop | (lambda retry_state: remaining(retry_state) < MIN_RETRY_WAIT)
+            wait = lambda retry_state: min(backoff(retry_state), max(0.0, remaining(retry_state) - MIN_RETRY_WAIT))
+
+        @retry(wait=wait, stop=stop,
+               before_sleep=lambda retry_state: metrics.inc('review_llm_retries_total', ('generator',)))
+        def submit_prompt(client, model, messages, started):
             logging.info("Submitting prompt...")
+            options = {}
+            if deadline:
+                options['timeout'] = max(0.001, deadline - (time.monotonic() - started))
             response = client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": prompt + transaction},
-                    {"role": "user", "content": transaction},
-                ]
+                messages=messages,
+                **options,
             )
             return response
 
-        # Define the prompt template
-        primer_prompt = f"""I want you to be an engineering manager coach. Someone like Claire Hughes Johnson, author of "Scaling People: Tactics for Management and Company Building", or  Patrick Lencioni author of "five dysfunctions of a team". Reply with UK english spelling. Avoid hyperbole.
-I am giving writing a performance review for a {self.level} {self.role}. Build me a narrative for {self.name}'s performance review, based on my ratings of {self.pronouns[1]} skills.
-break it into these sections:
-- What are some things they do well?
-- How could they improve?
-- What are their biggest challenges? 
-
-I have rated their skills on the basis of: exceeds expectations; meets expectations; and does not meet expectations.
-Here is the specific rated skills. Pay note to any additional comments made also. The tone should not be too casual.
+        def start(messages, stream_to=None):
+            """Starts one request; returns a function that waits for its (text, usage)."""
+            if engine is not None:
+                future = engine.submit(messages, model, on_text=stream_to, deadline=deadline)
+
+                def wait():
+                    result = future.result()
+                    if not result.ok:
+                        raise result.error
+                    return result.text, result.usage
+                return wait
+
+            def call():
+                from openai import OpenAI
+                # With a deadline, retries are left to submit_prompt so they stay within it
+                client = OpenAI(api_key=api_key, **({'timeout': deadline, 'max_retries': 0} if deadline else {}))
+                self.chatgpt_response = submit_prompt(client, model, messages, time.monotonic())
+                text = self.chatgpt_response.choices[0].message.content
+                if stream_to is not None:
+                    stream_to(text)
+                return text, getattr(self.chatgpt_response, 'usage', None)
+            return call
+
+        self.chatgpt_cached = self.chatgpt_fallback = False
+        self.prompt_tokens = self.prompt_tokens_reported = None
+        self.sections_reused = self.sections_generated = 0
+        if use_cache and not refresh and self.get_cached_chatgpt_feedback(model, budget, sectioned) is not None:
+            if on_text is not None:
+                on_text(self.chatgpt_feedback)
+            return
 
-{self.feedback}"""
+        # The standalone prompt is only shown to the user if the API call fails
+        primer_prompt = self.build_primer_prompt()
+        if sectioned:
+            prompts = self.build_section_prompts(budget)
+        else:
+            prompts = [(None, self.build_prompt(budget))]
+        cached = {}
+        if sectioned and use_cache and not refresh:
+            for section, prompt in prompts:
+                text = narrative_cache.get(model, *(m['content'] for m in prompt.messages))
+                if text is not None:
+                    cached[section] = text
+        self.sections_reused = len(cached)
+        to_send = [(section, prompt) for section, prompt in prompts if section not in cached]
+        self.prompt_tokens = sum(prompt.prompt_tokens for _, prompt in to_send)
+        for section, prompt in to_send:
+            logging.info("Narrative prompt%s: ~%d tokens (budget %d, %s)", f" ({section})" if section else "",
+                         prompt.prompt_tokens, prompt.budget, prompt.stage)
+        metrics.inc('review_prompt_tokens_total', ('estimated',), self.prompt_tokens)
 
         # Try to read the API key
         try:
-            with open(expanduser("~/.open-ai/open-ai-key"), "r") as f:
-                api_key = f.read().strip()
+            api_key = load_api_key()
         except FileNotFoundError:
             print("Please create a file at ~/.open-ai/open-ai-key with your OpenAI API key.")
             self.chatgpt_feedback = create_error_message("missing API key", " Please add your OpenAI API key to ~/.open-ai/open-ai-key to enable this feature")
@@ -278,14 +386,41 @@ Here is the specific rated skills. Pay note to any additional comments made also
             self.chatgpt_feedback = create_error_message("error reading key file", f": {e}")
             return
 
-        # Create client and submit prompt
-        client = OpenAI(api_key=api_key)
+        texts, usages = dict(cached), []
+        relay = SectionStream([section for section, _ in prompts], on_text) if sectioned and on_text else None
         try:
-            self.chatgpt_response = submit_prompt(client, model, primer_prompt, self.feedback)
-            self.chatgpt_feedback = self.chatgpt_response.choices[0].message.content
+            with metrics.phase('llm_call'):
+                # With an engine every changed section is in flight at once, each streamed through the relay
+                waits = {section: start(prompt.messages, relay.feeder(section) if relay else on_text)
+                         for section, prompt in to_send}
+                for section, text in cached.items():
+                    if relay:
+                        relay.finish(section, text)
+                for section, _ in prompts:
+                    if section not in texts:
+                        texts[section], usage = waits[section]()
+                        usages.append(usage)
+                        if relay:
+                            relay.finish(section, texts[section])
         except Exception as e:
             print(f"An error occurred while getting ChatGPT feedback: {e}")
             self.chatgpt_feedback = create_error_message("error getting ChatGPT feedback", f": {e}")
+            return
+        if sectioned:
+            self.chatgpt_feedback = join_sections([(section, texts[section]) for section, _ in prompts])
+            self.sections_generated = len(to_send)
+            metrics.inc('review_narrative_sections_total', ('reused',), self.sections_reused)
+            metrics.inc('review_narrative_sections_total', ('generated',), self.sections_generated)
+        else:
+            self.chatgpt_feedback = texts[None]
+        reported = [getattr(usage, 'prompt_tokens', None) for usage in usages]
+        if reported and None not in reported:
+            self.prompt_tokens_reported = sum(reported)
+            metrics.inc('review_prompt_tokens_total', ('reported',), self.prompt_tokens_reported)
+        if use_cache:
+            for section, prompt in to_send:
+                system, user = (m['content'] for m in prompt.messages)
+                narrative_cache.put(model, system, user, texts[section])
 
 
 def make_feedback():
@@ -0,0 +1,222 @@
+"""
+Token-budgeted chat prompt for the ChatGPT narrative.
+
+The instructions go in the system message and the rated behaviors go in the
+user message, each exactly once. Behaviors are grouped by rating and section,
+and the reviewee's name is dropped from the start of each line since the
+header already says who they describe.
+
+If the estimated prompt size exceeds the budget, the prompt is compacted in
+stages, bulkiest and least informative first: "meets" behaviors are replaced by
+per-section counts, then by a single count, then "exceeds" behaviors by
+per-section counts. "Does not meet" behaviors and section comments are always
+sent in full.
+
+Section prompts ask for the narrative of one section (overview, results, ...)
+at a time. Each is content-addressed in the narrative cache, so revising a
+review only sends the sections whose ratings or comments changed.
+Their answers can stream in concurrently; SectionStream relays them in
+section order, formatted as join_sections() joins them.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from narrative_engine import estimate_tokens
+
+DEFAULT_PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 6000))
+
+# (key, heading) in prompt order
+RATING_HEADINGS = (
+    ('exceeds', 'EXCEEDS EXPECTATIONS'),
+    ('meets', 'MEETS EXPECTATIONS'),
+    ('does_not_meet', 'DOES NOT MEET EXPECTATIONS'),
+)
+
+# Compaction stages, applied in order until the prompt fits
+STAGES = ('full', 'meets_by_section', 'meets_total', 'exceeds_by_section')
+
+INSTRUCTIONS = """I want you to be an engineering manager coach. Someone like Claire Hughes Johnson, author of "Scaling People: Tactics for Management and Company Building", or  Patrick Lencioni author of "five dysfunctions of a team". Reply with UK english spelling. Avoid hyperbole.
+I am giving writing a performance review for a {level} {role}. Build me a narrative for {name}'s performance review, based on my ratings of {possessive} skills.
+break it into these sections:
+- What are some things they do well?
+- How could they improve?
+- What are their biggest challenges?
+
+I have rated their skills on the basis of: exceeds expectations; meets expectations; and does not meet expectations.
+The user message lists the specific rated skills, grouped by rating and section; each line describes {name}. Where only a count is given, those skills were rated but not listed individually. Pay note to any additional comments made also. The tone should not be too casual."""
+
+
+SECTION_INSTRUCTIONS = """I want you to be an engineering manager coach. Someone like Claire Hughes Johnson, author of "Scaling People: Tactics for Management and Company Building", or  Patrick Lencioni author of "five dysfunctions of a team". Reply with UK english spelling. Avoid hyperbole.
+I am giving writing a performance review for a {level} {role}. Build me the narrative for the "{section}" section of {name}'s performance review, based on my ratings of {possessive} skills in that section.
+break it into these parts, a short paragraph each:
+- What are some things they do well?
+- How could they improve?
+- What are their biggest challenges?
+Do not add a heading for the section itself; the other sections are written separately.
+
+I have rated their skills on the basis of: exceeds expectations; meets expectations; and does not meet expectations.
+The user message lists the specific rated skills, grouped by rating; each line describes {name}. Where only a count is given, those skills were rated but not listed individually. Pay note to any additional comments made also. The tone should not be too casual."""
+
+
+class Prompt:
+    """
+    Chat messages for one narrative request plus the estimate used to budget them.
+    """
+    __slots__ = ("messages", "prompt_tokens", "budget", "stage")
+
+    def __init__(self, messages: List[dict], prompt_tokens: int, budget: int, stage: str) -> None:
+        self.messages = messages
+        self.prompt_tokens = prompt_tokens
+        self.budget = budget
+        self.stage = stage
+
+    @property
+    def over_budget(self) -> bool:
+        return self.prompt_tokens > self.budget
+
+
+def abbreviate(behavior: str, name: str) -> str:
+    """Drops the reviewee's name from the start of a behavior line, keeping any "Label - " prefix."""
+    if not name:
+        return behavior
+    return re.sub(rf'^((?:[^-–]{{1,40}} [-–] )?){re.escape(name)}\s+', r'\1', behavior, count=1)
+
+
+def _rating_block(heading: str, sections: Dict[str, Sequence[str]], name: str, mode: str) -> List[str]:
+    lines = [heading]
+    if mode == 'total':
+        count = sum(len(behaviors) for behaviors in sections.values())
+        if count:
+            lines.append(f"{count} skills across {len(sections)} sections (not listed).")
+        return lines
+    for section, behaviors in sections.items():
+        if not behaviors:
+            continue
+        if mode == 'count':
+            lines.append(f"{section}: {len(behaviors)} skills (not listed)")
+            continue
+        lines.append(f"{section}:")
+        lines.extend(f"- {abbreviate(b, name)}" for b in behaviors)
+    return lines
+
+
+def _user_message(ratings: Dict[str, Dict[str, Sequence[str]]], comments: Dict[str, str],
+                  name: str, stage: str) -> str:
+    modes = {
+        'full': {},
+        'meets_by_section': {'meets': 'count'},
+        'meets_total': {'meets': 'total'},
+        'exceeds_by_section': {'meets': 'total', 'exceeds': 'count'},
+    }[stage]
+    lines = [f"Rated skills for {name}:"]
+    for key, heading in RATING_HEADINGS:
+        lines.append('')
+        lines.extend(_rating_block(heading, ratings.get(key) or {}, name, modes.get(key, 'list')))
+    comments = {section: text for section, text in (comments or {}).items() if text}
+    if comments:
+        lines.append('')
+        lines.append('SECTION COMMENTS')
+        lines.extend(f"{section}: {text}" for section, text in comments.items())
+    return '\n'.join(lines)
+
+
+def _fit(system: str, ratings: Dict[str, Dict[str, Sequence[str]]], comments: Optional[Dict[str, str]],
+         name: str, budget: int) -> Prompt:
+    system_tokens = estimate_tokens(system)
+    for stage in STAGES:
+        user = _user_message(ratings, comments, name, stage)
+        tokens = system_tokens + estimate_tokens(user)
+        if tokens <= budget:
+            break
+    messages = [{"role": "system", "content": system}, {"role": "user", "content": user}]
+    return Prompt(messages, tokens, budget, stage)
+
+
+def build_prompt(name: str, pronouns: Sequence[str], role: str, level: str,
+                 exceeds: Dict[str, Sequence[str]], meets: Dict[str, Sequence[str]],
+                 does_not_meet: Dict[str, Sequence[str]], comments: Optional[Dict[str, str]] = None,
+                 budget: Optional[int] = None) -> Prompt:
+    """
+    Returns the narrative Prompt for a review, compacted until its estimated size fits ``budget``.
+    If even the most compact form is over budget it is returned anyway; check ``over_budget``.
+    """
+    system = INSTRUCTIONS.format(level=level, role=role, name=name, possessive=pronouns[1])
+    ratings = {'exceeds': exceeds, 'meets': meets, 'does_not_meet': does_not_meet}
+    return _fit(system, ratings, comments, name, budget or DEFAULT_PROMPT_TOKEN_BUDGET)
+
+
+def build_section_prompts(name: str, pronouns: Sequence[str], role: str, level: str, sections: Sequence[str],
+                          exceeds: Dict[str, Sequence[str]], meets: Dict[str, Sequence[str]],
+                          does_not_meet: Dict[str, Sequence[str]], comments: Optional[Dict[str, str]] = None,
+                          budget: Optional[int] = None) -> List[tuple]:
+    """
+    Returns [(section, Prompt)] in ``sections`` order for every section with ratings or a comment.
+    Each prompt carries only its own section, so it is unchanged unless that section changes.
+    """
+    budget = budget or DEFAULT_PROMPT_TOKEN_BUDGET
+    comments = comments or {}
+    prompts = []
+    for section in sections:
+        ratings = {key: {section: lists[section]} for key, lists in
+                   (('exceeds', exceeds), ('meets', meets), ('does_not_meet', does_not_meet)) if lists.get(section)}
+        if not ratings and not comments.get(section):
+            continue
+        system = SECTION_INSTRUCTIONS.format(level=level, role=role, name=name, possessive=pronouns[1],
+                                             section=section)
+        prompts.append((section, _fit(system, ratings, {section: comments.get(section)}, name, budget)))
+    return prompts
+
+
+def join_sections(texts: Sequence[tuple]) -> str:
+    """Joins [(section, narrative)] into one narrative with a heading per section."""
+    return '\n\n'.join(f"{section.capitalize()}\n{text.strip()}" for section, text in texts)
+
+
+class SectionStream:
+    """
+    Relays concurrently streamed section narratives to ``on_text`` in section order: the
+    first unfinished section as it is written, later ones as soon as it finishes. The
+    relayed text adds up to join_sections() of the final texts.
+    """
+    def __init__(self, sections: Sequence[str], on_text) -> None:
+        self.sections = list(sections)
+        self.on_text = on_text
+        self._texts = {section: '' for section in self.sections}
+        self._finished = set()
+        self._current = 0
+        self._sent = 0
+        self._lock = threading.Lock()
+
+    def feeder(self, section: str):
+        """Callback taking the streamed text of one section."""
+        def feed(text: str) -> None:
+            with self._lock:
+                if section not in self._finished:
+                    self._texts[section] += text
+                    self._relay()
+        return feed
+
+    def finish(self, section: str, text: str) -> None:
+        """Marks a section done with its final text (streamed, cached or sent whole)."""
+        with self._lock:
+            self._texts[section] = text
+            self._finished.add(section)
+            self._relay()
+
+    def _relay(self) -> None:
+        while self._current < len(self.sections):
+            section = self.sections[self._current]
+            # Surrounding whitespace is held back, as join_sections() strips it
+            text = self._texts[section].strip()
+            if text and self._sent == 0:
+                self.on_text(('\n\n' if self._current else '') + f"{section.capitalize()}\n")
+            if len(text) > self._sent:
+                self.on_text(text[self._sent:])
+                self._sent = len(text)
+            if section not in self._finished:
+                return
+            self._current += 1
+            self._sent = 0
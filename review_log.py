@@ -0,0 +1,332 @@
+"""
+Append-only JSONL log of completed reviews.
+
+Entries are queued by the request and written in batches by a background
+thread, so logging never touches the disk on the request path. Each process
+appends to its own segment file, which is closed once it reaches ``max_bytes``
+or ``max_age`` seconds. A closed segment is optionally gzip-compressed and gets
+a small ``.idx`` manifest listing the roles, levels and timestamp range it
+holds, so the reader can skip whole segments when filtering.
+
+Fsync policy: 'always' syncs after every batch, 'rotate' (default) when a
+segment is closed, 'never' leaves it to the OS.
+
+Usage:
+    python review_log.py --role "Software Engineer" --since 2026-01-01 --count
+"""
+
+import argparse
+import atexit
+import datetime
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from metrics import metrics
+
+LOG_DIR = os.environ.get('REVIEW_LOG_DIR', os.path.join(os.path.dirname(__file__), 'logs'))
+DEFAULT_MAX_BYTES = int(os.environ.get('REVIEW_LOG_MAX_BYTES', 64 * 1024 * 1024))
+DEFAULT_MAX_AGE = float(os.environ.get('REVIEW_LOG_MAX_AGE', 24 * 3600))
+DEFAULT_COMPRESS = os.environ.get('REVIEW_LOG_COMPRESS', '1') != '0'
+DEFAULT_FSYNC = os.environ.get('REVIEW_LOG_FSYNC', 'rotate')
+FSYNC_POLICIES = ('always', 'rotate', 'never')
+
+SEGMENT_PREFIX = 'reviews-'
+# Segment timestamps sort lexically, e.g. reviews-20261018T153500-1234-0.jsonl
+SEGMENT_TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+_STOP = object()
+
+
+def entry_role_level(entry: dict):
+    user_info = entry.get('user_info') or {}
+    return user_info.get('role'), user_info.get('level')
+
+
+class ReviewLog:
+    """
+    Batched, rotated JSONL writer. ``append`` only enqueues; a daemon thread does the writing.
+    """
+    def __init__(self, log_dir: str = LOG_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, compress: bool = DEFAULT_COMPRESS,
+                 fsync: str = DEFAULT_FSYNC, flush_interval: float = 1.0, max_queue: int = 10000) -> None:
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}'. Must be one of {', '.join(FSYNC_POLICIES)}.")
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._path = None
+        self._opened_at = 0.0
+        self._seq = 0
+        self._manifest = None
+        self.written = 0
+        self.dropped = 0
+        self.segments = 0
+
+    def append(self, entry: dict) -> bool:
+        """Queues an entry for writing. Returns False (and counts a drop) if the queue is full."""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print('Could not write log: review log queue is full')
+            return False
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Blocks until every entry queued so far has been written."""
+        done = threading.Event()
+        self._ensure_thread()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        """Writes everything queued and closes the current segment."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='review-log', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                items = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                items = []
+            # Drain whatever else is waiting into the same batch
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            entries = [item for item in items if isinstance(item, dict)]
+            try:
+                if entries:
+                    self._write(entries)
+                if self._file is not None and time.time() - self._opened_at >= self.max_age:
+                    self._rotate()
+            except Exception as e:
+                print(f'Could not write log: {e}')
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in items):
+                if self._file is not None:
+                    self._rotate()
+                return
+
+    def _open(self) -> None:
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._opened_at = time.time()
+        stamp = datetime.datetime.fromtimestamp(self._opened_at).strftime(SEGMENT_TIME_FORMAT)
+        while True:
+            self._path = os.path.join(self.log_dir, f'{SEGMENT_PREFIX}{stamp}-{os.getpid()}-{self._seq}.jsonl')
+            self._seq += 1
+            if not os.path.exists(self._path):
+                break
+        self._file = open(self._path, 'ab')
+        self._manifest = {'count': 0, 'first': None, 'last': None, 'role_levels': set()}
+        self.segments += 1
+
+    def _write(self, entries) -> None:
+        # One write per batch, split only where a segment fills up
+        lines, pending = [], 0
+        for entry in entries:
+            if self._file is None:
+                self._open()
+            line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+            lines.append(line)
+            pending += len(line)
+            self._note(entry)
+            if self._file.tell() + pending >= self.max_bytes:
+                self._write_lines(lines)
+                lines, pending = [], 0
+                self._rotate()
+        if lines:
+            self._write_lines(lines)
+        self.written += len(entries)
+
+    def _write_lines(self, lines) -> None:
+        with metrics.phase('log_write'):
+            self._file.write(b''.join(lines))
+            self._file.flush()
+            if self.fsync == 'always':
+                os.fsync(self._file.fileno())
+
+    def _note(self, entry: dict) -> None:
+        manifest = self._manifest
+        manifest['count'] += 1
+        manifest['role_levels'].add(entry_role_level(entry))
+        timestamp = entry.get('timestamp')
+        if timestamp:
+            manifest['first'] = min(manifest['first'] or timestamp, timestamp)
+            manifest['last'] = max(manifest['last'] or timestamp, timestamp)
+
+    def _rotate(self) -> None:
+        f, path, manifest = self._file, self._path, self._manifest
+        self._file = self._path = self._manifest = None
+        if self.fsync != 'never':
+            os.fsync(f.fileno())
+        f.close()
+        if self.compress:
+            # Readers ignore a .jsonl once its complete .gz exists
+            with open(path, 'rb') as src, gzip.open(path + '.gz.tmp', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(path + '.gz.tmp', path + '.gz')
+            os.remove(path)
+            path += '.gz'
+        manifest['role_levels'] = sorted(list(pair) for pair in manifest['role_levels'])
+        with open(path + '.idx', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+
+    def stats(self) -> dict:
+        return {'written': self.written, 'dropped': self.dropped, 'queued': self._queue.qsize(),
+                'segments': self.segments}
+
+
+def _as_timestamp(value) -> Optional[str]:
+    # Entries carry local ISO timestamps, which compare correctly as strings
+    if value is None or isinstance(value, str):
+        return value
+    return value.isoformat()
+
+
+def _segment_may_match(path: str, role, level, since, until) -> bool:
+    try:
+        with open(path + '.idx', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        # Open (or unindexed) segment: read it to find out
+        return True
+    if since and manifest['last'] and manifest['last'] < since:
+        return False
+    if until and manifest['first'] and manifest['first'] > until:
+        return False
+    return any((role is None or r == role) and (level is None or lv == level) for r, lv in manifest['role_levels'])
+
+
+def list_segments(log_dir: str = LOG_DIR) -> List[str]:
+    """Returns segment paths oldest first, each segment once whether or not it has been compressed yet."""
+    segments = glob.glob(os.path.join(log_dir, f'{SEGMENT_PREFIX}*.jsonl'))
+    compressed = glob.glob(os.path.join(log_dir, f'{SEGMENT_PREFIX}*.jsonl.gz'))
+    # Readers ignore a .jsonl once its complete .gz exists
+    done = {path[:-len('.gz')] for path in compressed}
+    return sorted([path for path in segments if path not in done] + compressed)
+
+
+def segment_name(path: str) -> str:
+    """Stable name of a segment across compression, e.g. 'reviews-...-0.jsonl'."""
+    name = os.path.basename(path)
+    return name[:-len('.gz')] if name.endswith('.gz') else name
+
+
+def read_segment(path: str, offset: int = 0) -> Iterator[tuple]:
+    """
+    Yields (offset after the line, entry) for each line from byte ``offset`` of the
+    uncompressed data. Stops at a partly written last line, so the last offset seen
+    can be passed back later to read only what has been appended since.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as f:
+            if offset:
+                f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    return
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                yield offset, entry
+    except OSError:
+        return
+
+
+def read_legacy(log_dir: str = LOG_DIR, skip=()) -> Iterator[tuple]:
+    """Yields (path, entry) for the older one-file-per-review ``*.json`` logs, except paths in ``skip``."""
+    for path in sorted(glob.glob(os.path.join(log_dir, '*.json'))):
+        if path in skip:
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield path, json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def iter_entries(log_dir: str = LOG_DIR, role: Optional[str] = None, level: Optional[str] = None,
+                 since=None, until=None) -> Iterator[dict]:
+    """
+    Yields logged entries oldest segment first, optionally filtered by role, level and
+    timestamp range (datetimes or ISO strings, inclusive). Closed segments whose manifest
+    rules them out are skipped without being opened. Also reads the legacy one-file-per-review
+    ``*.json`` logs.
+    """
+    since, until = _as_timestamp(since), _as_timestamp(until)
+
+    def matches(entry):
+        entry_role, entry_level = entry_role_level(entry)
+        timestamp = entry.get('timestamp') or ''
+        return ((role is None or entry_role == role) and (level is None or entry_level == level)
+                and (since is None or timestamp >= since) and (until is None or timestamp <= until))
+
+    for _, entry in read_legacy(log_dir):
+        if matches(entry):
+            yield entry
+    for path in list_segments(log_dir):
+        if _segment_may_match(path, role, level, since, until):
+            yield from (entry for _, entry in read_segment(path) if matches(entry))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the review log as JSON lines.")
+    parser.add_argument('--log-dir', default=LOG_DIR)
+    parser.add_argument('--role')
+    parser.add_argument('--level')
+    parser.add_argument('--since', help="ISO date or timestamp, e.g. 2026-01-01")
+    parser.add_argument('--until', help="ISO date or timestamp (inclusive)")
+    parser.add_argument('--count', action='store_true', help="Print the number of matching entries only")
+    args = parser.parse_args(argv)
+    # A bare date as --until should include that whole day
+    until = args.until + 'T23:59:59.999999' if args.until and 'T' not in args.until else args.until
+    entries = iter_entries(args.log_dir, args.role, args.level, args.since, until)
+    if args.count:
+        print(sum(1 for _ in entries))
+        return 0
+    for entry in entries:
+        sys.stdout.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    return 0
+
+
+# Process-wide writer; closed at exit so queued entries are not lost
+review_log = ReviewLog()
+atexit.register(review_log.close)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,351 @@
+"""
+Shared level definitions and lightweight per-review objects.
+
+A LevelDefinition is one role level's behaviors in form order, each with a
+stable ID, built once per role definition version and shared read-only by
+every request. A Review holds only the reviewee fields, a reference to its
+LevelDefinition, one byte per behavior rating and the section comments;
+behavior text is rendered through the registry's view cache only when a page,
+export or prompt needs it.
+
+Ratings are indexed by behavior position (the rating_{i} form fields, the
+compact session state and the review log all use it). Behavior IDs are
+content hashes of section, subsection and behavior text, so they stay the same
+when other behaviors are added, removed or reordered.
+"""
+
+import hashlib
+import re
+import threading
+from collections import Counter
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import metrics
+from role_registry import RoleDefinition, RoleRegistry, registry
+
+# Rating values, also the bucket order of LevelDefinition.buckets()
+DOES_NOT_MEET, MEETS, EXCEEDS = 0, 1, 2
+RATING_KEYS = ('does_not_meet', 'meets', 'exceeds')
+# Placeholder for a behavior that has not been rated yet
+UNRATED = 255
+
+# A next-level behavior at least this similar to one of the current level counts as changed, not added
+CHANGED_RATIO = 0.6
+
+_WORD = re.compile(r"[\w{}\[\]’']+")
+
+_TO_DIGITS = bytes.maketrans(b'\x00\x01\x02', b'012')
+_FROM_DIGITS = bytes.maketrans(b'012', b'\x00\x01\x02')
+
+
+def ordered_sections(sections):
+    """Returns section names in form order: 'overview' first, then the rest sorted."""
+    sections = list(sections)
+    if 'overview' in sections:
+        return ['overview'] + sorted(s for s in sections if s != 'overview')
+    return sorted(sections)
+
+
+class Behavior:
+    """
+    One behavior of a level: its position, stable ID, section, subsection and template.
+    """
+    __slots__ = ("index", "id", "section", "subsection", "template")
+
+    def __init__(self, index: int, behavior_id: str, section: str, subsection: str, template) -> None:
+        self.index = index
+        self.id = behavior_id
+        self.section = section
+        self.subsection = subsection
+        self.template = template
+
+    def __repr__(self) -> str:
+        return f"Behavior({self.index}, {self.id!r}, {self.section!r}, {self.subsection!r})"
+
+
+def behavior_id(section: str, subsection: str, source: str) -> str:
+    return hashlib.sha1(f"{section}\0{subsection}\0{source}".encode('utf-8')).hexdigest()[:12]
+
+
+class LevelDefinition:
+    """
+    Immutable behaviors of one role level for one role definition version.
+    """
+    __slots__ = ("role", "level", "ic_level", "version", "sections", "behaviors", "section_ranges", "roles", "_ids",
+                 "_section_column", "_subsection_column")
+
+    def __init__(self, role: str, level: str, definition: RoleDefinition, roles: RoleRegistry = registry) -> None:
+        self.role = role
+        self.level = level
+        self.ic_level = definition.level_map[level]
+        self.version = definition.version
+        templates = definition.templates[level]
+        self.sections = tuple(ordered_sections(templates))
+        behaviors, ranges, ids = [], {}, {}
+        for section in self.sections:
+            start = len(behaviors)
+            for subsection, section_templates in templates[section].items():
+                for template in section_templates:
+                    key = behavior_id(section, subsection, template.source)
+                    # A behavior repeated within a subsection gets a numbered ID
+                    n = 1
+                    while key in ids:
+                        n += 1
+                        key = f"{behavior_id(section, subsection, template.source)}-{n}"
+                    ids[key] = len(behaviors)
+                    behaviors.append(Behavior(len(behaviors), key, section, subsection, template))
+            ranges[section] = (start, len(behaviors))
+        self.behaviors = tuple(behaviors)
+        # Behaviors are grouped by section, so each section is a contiguous range of positions
+        self.section_ranges = MappingProxyType(ranges)
+        self._ids = MappingProxyType(ids)
+        # Rendered text comes from this registry's view cache
+        self.roles = roles
+        self._section_column = tuple(b.section for b in behaviors)
+        self._subsection_column = tuple(b.subsection for b in behaviors)
+
+    def __len__(self) -> int:
+        return len(self.behaviors)
+
+    def index_of(self, behavior_id: str) -> int:
+        """Position of the behavior with the given stable ID; raises KeyError if there is none."""
+        return self._ids[behavior_id]
+
+    def texts(self, name: str, pronouns: Sequence[str]) -> Tuple[str, ...]:
+        """Behavior text for a reviewee, in position order, from the registry's rendered view cache."""
+        view = self.roles.render_level(self.role, self.level, name, pronouns)
+        texts = tuple(chain.from_iterable(chain.from_iterable(view.get(s, {}).values() for s in self.sections)))
+        if len(texts) != len(self.behaviors):
+            # The YAML changed shape since this definition was built; the cached views are for the new one
+            return tuple(b.template.render(name, pronouns) for b in self.behaviors)
+        return texts
+
+    def items(self, name: str, pronouns: Sequence[str]) -> List[tuple]:
+        """(section, subsection, text) per behavior, in position order."""
+        return list(zip(self._section_column, self._subsection_column, self.texts(name, pronouns)))
+
+    def buckets(self, ratings: Sequence[int], texts: Sequence[str]) -> Tuple[dict, dict, dict]:
+        """
+        Groups behavior texts by rating and section, returning (does_not_meet, meets, exceeds)
+        dicts of section -> [text]. Raises ValueError for a wrong count or an invalid rating.
+        """
+        if len(ratings) != len(self.behaviors):
+            raise ValueError(f"Expected {len(self.behaviors)} ratings for {self.role} ({self.level}), got {len(ratings)}")
+        buckets = ({}, {}, {})
+        for behavior, rating, text in zip(self.behaviors, ratings, texts):
+            if rating not in (DOES_NOT_MEET, MEETS, EXCEEDS):
+                raise ValueError(f"Invalid rating {rating!r}; must be 0, 1 or 2")
+            buckets[rating].setdefault(behavior.section, []).append(text)
+        return buckets
+
+
+_levels: Dict[tuple, LevelDefinition] = {}
+_levels_lock = threading.Lock()
+
+
+def level_definition(role: str, level: str, roles: RoleRegistry = registry) -> LevelDefinition:
+    """
+    Returns the shared LevelDefinition for a role and level, rebuilt only when the role's YAML changes.
+    Raises FileNotFoundError for an unknown role and ValueError for an unknown level.
+    """
+    definition = roles.get(role)
+    level = level.lower()
+    key = (definition.path, level)
+    cached = _levels.get(key)
+    if cached is not None and cached.version == definition.version:
+        return cached
+    if level not in definition.level_map:
+        raise ValueError(f"Invalid level '{level}'. Must be one of {', '.join(definition.level_map)}.")
+    if level not in definition.templates:
+        raise ValueError(f"Level '{level}' not found in YAML for role '{role}'")
+    with _levels_lock:
+        cached = _levels.get(key)
+        if cached is None or cached.version != definition.version:
+            cached = _levels[key] = LevelDefinition(role, level, definition, roles)
+        return cached
+
+
+class LevelDiff:
+    """
+    What the next level of a role adds or changes relative to a level, per section and subsection.
+
+    ``changes`` holds (kind, next-level Behavior, current-level Behavior or None) in the next
+    level's form order, kind being 'added' or 'changed'. Behaviors carried over word for word
+    are not listed; ``unchanged`` counts them.
+    """
+    __slots__ = ("role", "level", "next_level", "next_ic_level", "version", "changes", "unchanged", "dropped")
+
+    def __init__(self, current: LevelDefinition, following: LevelDefinition) -> None:
+        self.role = current.role
+        self.level = current.level
+        self.next_level = following.level
+        self.next_ic_level = following.ic_level
+        self.version = current.version
+        remaining = {}
+        for behavior in current.behaviors:
+            remaining.setdefault(behavior.template.source, []).append(behavior)
+        matched, unmatched = {}, []
+        for behavior in following.behaviors:
+            same = remaining.get(behavior.template.source)
+            if same:
+                matched[behavior.index] = same.pop(0)
+            else:
+                unmatched.append(behavior)
+        leftover = [b for behaviors in remaining.values() for b in behaviors]
+        # Pair the most similar rewordings first, within the same section
+        words = {id(b): Counter(_WORD.findall(b.template.source.lower())) for b in unmatched + leftover}
+        pairs = []
+        for new in unmatched:
+            for old in leftover:
+                if old.section != new.section:
+                    continue
+                a, b = words[id(new)], words[id(old)]
+                # Dice coefficient over words: 2|A & B| / (|A| + |B|)
+                ratio = 2 * sum((a & b).values()) / ((sum(a.values()) + sum(b.values())) or 1)
+                ratio += 0.05 if old.subsection == new.subsection else 0.0
+                if ratio >= CHANGED_RATIO:
+                    pairs.append((-ratio, new.index, old.index, new, old))
+        previous, used = {}, set()
+        for _, _, _, new, old in sorted(pairs):
+            if new.index not in previous and old.index not in used:
+                previous[new.index] = old
+                used.add(old.index)
+        self.changes = tuple(
+            ('changed', b, previous[b.index]) if b.index in previous else ('added', b, None)
+            for b in following.behaviors if b.index not in matched
+        )
+        self.unchanged = len(matched)
+        # Current-level behaviors with no counterpart at the next level
+        self.dropped = len(leftover) - len(used)
+
+    def render(self, name: str, pronouns: Sequence[str]) -> Dict[str, List[dict]]:
+        """
+        Section -> [{subsection, kind, text, previous}] for a reviewee. Only the changed
+        behaviors are rendered, so this costs less than rendering either level.
+        """
+        sections: Dict[str, List[dict]] = {}
+        for kind, behavior, old in self.changes:
+            sections.setdefault(behavior.section, []).append({
+                'subsection': behavior.subsection,
+                'kind': kind,
+                'text': behavior.template.render(name, pronouns),
+                'previous': old.template.render(name, pronouns) if old is not None else None,
+            })
+        return sections
+
+
+_diffs: Dict[str, tuple] = {}
+
+
+def next_level(role: str, level: str, roles: RoleRegistry = registry) -> Optional[str]:
+    """The level after ``level`` in the role's level_map that has behaviors defined, or None."""
+    available = list(roles.get(role).available_level_map)
+    position = available.index(level.lower()) if level.lower() in available else -1
+    return available[position + 1] if 0 <= position < len(available) - 1 else None
+
+
+def promotion_diff(role: str, level: str, roles: RoleRegistry = registry) -> Optional[LevelDiff]:
+    """
+    Returns the LevelDiff from ``level`` to the next level of the role, or None at the top level.
+    Diffs for every consecutive pair of levels are computed together, once per role definition version.
+    """
+    definition = roles.get(role)
+    cached = _diffs.get(definition.path)
+    if cached is None or cached[0] != definition.version:
+        levels = list(definition.available_level_map)
+        with metrics.phase('level_diff'):
+            diffs = {
+                current: LevelDiff(level_definition(role, current, roles), level_definition(role, following, roles))
+                for current, following in zip(levels, levels[1:])
+            }
+        cached = _diffs[definition.path] = (definition.version, diffs)
+    return cached[1].get(level.lower())
+
+
+def encode_ratings(ratings) -> str:
+    """'0'/'1'/'2' per behavior, as stored in the session and the review log."""
+    return bytes(ratings).translate(_TO_DIGITS).decode('ascii')
+
+
+def decode_ratings(encoded: str) -> bytearray:
+    if encoded.strip('012'):
+        raise ValueError(f"Invalid ratings {encoded!r}; expected only 0, 1 and 2")
+    return bytearray(encoded.encode('ascii').translate(_FROM_DIGITS))
+
+
+class Review:
+    """
+    One review: reviewee fields, ratings (one byte per behavior) and section comments.
+    """
+    __slots__ = ("name", "pronouns", "definition", "ratings", "comments")
+
+    def __init__(self, name: str, pronouns: Sequence[str], role: str, level: str,
+                 ratings: Optional[Sequence[int]] = None, comments: Optional[dict] = None) -> None:
+        self.name = name
+        self.pronouns = tuple(pronouns)
+        self.definition = level_definition(role, level)
+        self.ratings = bytearray([UNRATED]) * len(self.definition)
+        self.comments = {}
+        if ratings is not None:
+            self.set_ratings(ratings)
+        if comments:
+            self.comments = {k: v for k, v in comments.items() if v}
+
+    @property
+    def role(self) -> str:
+        return self.definition.role
+
+    @property
+    def level(self) -> str:
+        return self.definition.level
+
+    @property
+    def complete(self) -> bool:
+        return UNRATED not in self.ratings
+
+    def set_ratings(self, ratings: Sequence[int]) -> None:
+        """Replaces all ratings; raises ValueError for a wrong count or an invalid rating."""
+        if len(ratings) != len(self.definition):
+            raise ValueError(f"Expected {len(self.definition)} ratings for {self.role} ({self.level}), got {len(ratings)}")
+        if not isinstance(ratings, (bytes, bytearray)) or max(ratings, default=0) > EXCEEDS:
+            for rating in ratings:
+                if rating not in (DOES_NOT_MEET, MEETS, EXCEEDS):
+                    raise ValueError(f"Invalid rating {rating!r}; must be 0, 1 or 2")
+        self.ratings = bytearray(ratings)
+
+    def texts(self) -> Tuple[str, ...]:
+        return self.definition.texts(self.name, self.pronouns)
+
+    def items(self) -> List[tuple]:
+        return self.definition.items(self.name, self.pronouns)
+
+    def buckets(self) -> Tuple[dict, dict, dict]:
+        """(does_not_meet, meets, exceeds) dicts of section -> [behavior text]."""
+        return self.definition.buckets(self.ratings, self.texts())
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'Review':
+        """
+        Builds a Review from the compact session/log state. Raises ValueError if the state was
+        rated against another version of the role definition, as ratings are stored by position
+        and any edit to the role can move them onto other behaviors.
+        """
+        definition = level_definition(state['role'], state['level'])
+        if state.get('version') != definition.version:
+            raise ValueError(f"The {state['role']} ({state['level']}) definition changed since this review was rated")
+        return cls(state['name'], state['pronouns'], state['role'], state['level'],
+                   decode_ratings(state['ratings']), state.get('comments'))
+
+    def to_state(self) -> dict:
+        """The compact session/log state: reviewee fields, definition version, ratings and comments."""
+        return {
+            'name': self.name,
+            'pronouns': list(self.pronouns),
+            'role': self.role,
+            'level': self.level,
+            'version': self.definition.version,
+            'ratings': encode_ratings(self.ratings),
+            'comments': dict(self.comments),
+        }
@@ -0,0 +1,143 @@
+"""
+Compact review state stored in the session.
+
+A finished review is stored as its reviewee fields, the role definition
+version, and one character per behavior rating ("0", "1" or "2" in
+behavior_items() order) plus section comments; see review_model.Review.
+The behavior text is re-materialized from the shared level definition only
+when a page needs it, instead of being pickled into the session three times over.
+
+Sessions written before this format (full text in 'summary' and
+'chatgpt_input') are migrated on first access where the text can be mapped
+back onto the current role definition, and otherwise used as they are.
+"""
+
+from typing import Optional
+
+from performance_review_generator import PerformanceReviewGenerator
+from review_model import RATING_KEYS, Review, decode_ratings, encode_ratings, level_definition
+
+# Legacy session keys replaced by 'review'
+LEGACY_KEYS = ('summary', 'chatgpt_input', 'feedback')
+
+
+class StaleReviewError(ValueError):
+    """Raised when stored ratings no longer line up with the role definition."""
+
+
+def make_review_state(user_info: dict, ratings, comments: dict) -> dict:
+    """
+    Builds the compact session representation of a finished review.
+    Raises ValueError if the ratings do not fit the role definition.
+    """
+    return Review(user_info['name'], user_info['pronouns'], user_info['role'], user_info['level'],
+                  ratings, comments).to_state()
+
+
+def load_review_model(state: dict) -> Review:
+    """Returns the Review for a compact state; raises StaleReviewError if it no longer fits the definition."""
+    try:
+        return Review.from_state(state)
+    except (ValueError, FileNotFoundError) as e:
+        raise StaleReviewError(str(e)) from e
+
+
+def build_generator(state: dict) -> PerformanceReviewGenerator:
+    """
+    Returns a generator with its feedback lists filled from a review state.
+    Also accepts the legacy chatgpt_input dict of full behavior lists.
+    """
+    generator = PerformanceReviewGenerator(
+        name=state['name'],
+        pronouns=state['pronouns'],
+        role=state['role'],
+        level=state['level'],
+    )
+    if 'ratings' in state:
+        review = load_review_model(state)
+        generator.apply_ratings(review.ratings, dict(state.get('comments') or {}))
+    else:
+        generator.exceeds_list = state.get('exceeds', {})
+        generator.meets_list = state.get('meets', {})
+        generator.does_not_meet_list = state.get('does_not_meet', {})
+        generator.section_comments = state.get('comments', {})
+    generator.give_feedback()
+    return generator
+
+
+def materialize(state: dict) -> dict:
+    """
+    Expands a review state into the full-text form used by templates, exports and logs:
+    name/pronouns/role/level plus exceeds/meets/does_not_meet lists and comments.
+    Legacy full-text dicts are returned unchanged.
+    """
+    if 'ratings' not in state:
+        return state
+    does_not_meet, meets, exceeds = load_review_model(state).buckets()
+    return dict(
+        name=state['name'],
+        pronouns=state['pronouns'],
+        role=state['role'],
+        level=state['level'],
+        exceeds=exceeds,
+        meets=meets,
+        does_not_meet=does_not_meet,
+        comments=dict(state.get('comments') or {}),
+    )
+
+
+def summary_for(review: dict, user_info: Optional[dict] = None) -> dict:
+    """Builds the results-page summary from a materialized review."""
+    return {
+        'exceeds': review.get('exceeds', {}),
+        'meets': review.get('meets', {}),
+        'does_not_meet': review.get('does_not_meet', {}),
+        'comments': review.get('comments', {}),
+        'user': user_info or {},
+    }
+
+
+def migrate_legacy(legacy_input: dict) -> Optional[dict]:
+    """
+    Converts a legacy chatgpt_input dict to a review state by mapping each behavior's
+    text back to its index. Returns None if any behavior cannot be mapped.
+    """
+    try:
+        items = level_definition(legacy_input['role'], legacy_input['level']).items(
+            legacy_input['name'], legacy_input['pronouns'])
+    except (KeyError, ValueError, FileNotFoundError):
+        return None
+    index_of = {}
+    for i, (section, _, behavior) in enumerate(items):
+        index_of.setdefault((section, behavior), []).append(i)
+    ratings = [None] * len(items)
+    for rating, bucket in enumerate(RATING_KEYS):
+        for section, behaviors in (legacy_input.get(bucket) or {}).items():
+            for behavior in behaviors:
+                slots = index_of.get((section, behavior))
+                if not slots:
+                    return None
+                ratings[slots.pop(0)] = rating
+    if not ratings or None in ratings:
+        return None
+    return make_review_state(legacy_input, ratings, legacy_input.get('comments') or {})
+
+
+def load_review(session) -> Optional[dict]:
+    """
+    Returns the session's review state, migrating a legacy session in place if possible.
+    Legacy sessions that cannot be migrated return their chatgpt_input dict unchanged.
+    """
+    state = session.get('review')
+    if state is not None:
+        return state
+    legacy_input = session.get('chatgpt_input')
+    if not legacy_input:
+        return None
+    state = migrate_legacy(legacy_input)
+    if state is None:
+        return legacy_input
+    session['review'] = state
+    for k in LEGACY_KEYS:
+        session.pop(k, None)
+    return state
@@ -0,0 +1,236 @@
+"""
+Offline compiler for role definitions.
+
+Validates every YAML file in ``role_definitions/`` and writes a single bundle
+holding the parsed data (with all strings interned) and the precompiled
+behavior templates. The role registry loads roles from the bundle instead of
+parsing YAML, and falls back to the YAML file for any role whose file no
+longer matches the bundle.
+
+The bundle is written with ``marshal``, so it is tied to the Python version
+that built it; a bundle from another version is ignored.
+
+Usage:
+    python role_bundle.py            # validate and write role_definitions/roles.bundle
+    python role_bundle.py --check    # validate only
+    python role_bundle.py --strict   # also fail on warnings (levels with no behaviors yet)
+"""
+
+import argparse
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+import yaml
+
+from behavior_templates import BehaviorTemplate, TemplateError, compile_template
+
+BUNDLE_NAME = 'roles.bundle'
+BUNDLE_FORMAT = 1
+
+
+class RoleValidationError(ValueError):
+    """Raised when one or more role definition files do not match the schema."""
+
+    def __init__(self, errors: List[str], warnings: Optional[List[str]] = None) -> None:
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+        self.warnings = warnings or []
+
+
+def file_digest(raw: bytes) -> str:
+    """Version string for a role file's contents (same as RoleDefinition.version)."""
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def validate_role(data, where: str, default_level_map) -> Tuple[List[str], List[str]]:
+    """
+    Checks a parsed role file against the schema and returns (errors, warnings).
+
+    Errors: anything other than levels -> section -> subsection -> list of behavior
+    strings, bad placeholders, or a level with no level_map entry. Warnings: levels
+    listed in the level map (or the default map) that have no behaviors yet; the web
+    form does not offer those.
+    """
+    if not isinstance(data, dict):
+        return [f"{where}: expected a mapping at the top level"], []
+    errors, warnings = [], []
+    levels = data.get('levels')
+    if not isinstance(levels, dict) or not levels:
+        return [f"{where}: 'levels' must be a non-empty mapping"], []
+    level_map = data.get('level_map', default_level_map)
+    if not isinstance(level_map, (dict, MappingProxyType)):
+        errors.append(f"{where}: 'level_map' must be a mapping")
+    else:
+        for level in level_map:
+            if level not in levels:
+                warnings.append(f"{where}: level '{level}' is in level_map but has no entry under levels")
+        for level in levels:
+            if level not in level_map:
+                errors.append(f"{where}: level '{level}' has no entry in level_map")
+    for level, sections in levels.items():
+        if not isinstance(sections, dict) or not sections:
+            errors.append(f"{where}: {level}: expected a non-empty mapping of sections")
+            continue
+        for section, subsections in sections.items():
+            if not isinstance(subsections, dict):
+                errors.append(f"{where}: {level}/{section}: expected a mapping of subsections")
+                continue
+            for subsection, behaviors in subsections.items():
+                if not isinstance(behaviors, list):
+                    errors.append(f"{where}: {level}/{section}/{subsection}: expected a list of behaviors")
+                    continue
+                for behavior in behaviors:
+                    try:
+                        compile_template(behavior, f"{where}: {level}/{section}/{subsection}")
+                    except TemplateError as e:
+                        errors.append(str(e))
+    return errors, warnings
+
+
+def _intern(value):
+    # Lists become tuples so the registry can freeze the loaded data without copying them
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, dict):
+        return {_intern(k): _intern(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return tuple(_intern(v) for v in value)
+    return value
+
+
+def _parts(behavior: str) -> tuple:
+    # Plain text needs no parts of its own; the loader reuses the behavior string
+    parts = compile_template(behavior).parts
+    return () if parts == (behavior,) else _intern(parts)
+
+
+def _template_parts(levels: dict) -> dict:
+    # level -> section -> subsection -> tuple of template parts, mirroring the data
+    return {
+        level: {
+            section: {
+                subsection: tuple(_parts(b) for b in behaviors)
+                for subsection, behaviors in subsections.items()
+            }
+            for section, subsections in sections.items()
+        }
+        for level, sections in levels.items()
+    }
+
+
+def compile_bundle(role_dir: str, default_level_map, bundle_path: Optional[str] = None,
+                   write: bool = True, strict: bool = False) -> Tuple[Dict[str, dict], List[str]]:
+    """
+    Validates every role file in ``role_dir`` and writes the bundle atomically.
+    Returns (role entries, warnings); raises RoleValidationError listing every problem
+    found, counting warnings as errors when ``strict``.
+    """
+    entries, errors, warnings = {}, [], []
+    for fname in sorted(os.listdir(role_dir)):
+        if not fname.endswith('.yaml'):
+            continue
+        path = os.path.join(role_dir, fname)
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            raw = f.read()
+        try:
+            data = yaml.safe_load(raw.decode('utf-8'))
+        except yaml.YAMLError as e:
+            errors.append(f"{path}: invalid YAML: {e}")
+            continue
+        problems, notes = validate_role(data, path, default_level_map)
+        warnings.extend(notes)
+        if problems:
+            errors.extend(problems)
+            continue
+        # Each role is marshalled separately so a lookup only decodes the role it needs
+        entries[fname] = {
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'version': file_digest(raw),
+            'payload': marshal.dumps({'data': _intern(data), 'templates': _template_parts(data['levels'])}),
+        }
+    if strict:
+        errors, warnings = errors + warnings, []
+    if errors:
+        raise RoleValidationError(errors, warnings)
+    if write:
+        bundle_path = bundle_path or os.path.join(role_dir, BUNDLE_NAME)
+        payload = marshal.dumps({'format': BUNDLE_FORMAT, 'python': tuple(sys.version_info[:2]), 'roles': entries})
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(bundle_path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, bundle_path)
+    return entries, warnings
+
+
+def read_bundle(bundle_path: str) -> Optional[Dict[str, dict]]:
+    """Returns the bundle's role entries keyed by file name, or None if it is missing or unusable."""
+    try:
+        with open(bundle_path, 'rb') as f:
+            bundle = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(bundle, dict) or bundle.get('format') != BUNDLE_FORMAT
+            or bundle.get('python') != tuple(sys.version_info[:2])):
+        return None
+    return bundle['roles']
+
+
+def load_entry(entry: dict) -> Tuple[dict, MappingProxyType]:
+    """
+    Decodes one role from the bundle, returning (data, templates) where ``templates``
+    is the compiled level -> section -> subsection -> BehaviorTemplate view.
+    """
+    payload = marshal.loads(entry['payload'])
+    data = payload['data']
+    levels = data['levels']
+    return data, MappingProxyType({
+        level: MappingProxyType({
+            section: MappingProxyType({
+                subsection: tuple(
+                    BehaviorTemplate(source, parts or (source,))
+                    for source, parts in zip(levels[level][section][subsection], subsection_parts)
+                )
+                for subsection, subsection_parts in section_parts.items()
+            })
+            for section, section_parts in level_parts.items()
+        })
+        for level, level_parts in payload['templates'].items()
+    })
+
+
+def main(argv=None):
+    from role_registry import DEFAULT_LEVEL_MAP, ROLE_DIR
+
+    parser = argparse.ArgumentParser(description="Validate role definitions and compile them into a bundle.")
+    parser.add_argument('--role-dir', default=ROLE_DIR, help="Directory of role YAML files")
+    parser.add_argument('-o', '--output', default=None, help=f"Bundle path (default: <role-dir>/{BUNDLE_NAME})")
+    parser.add_argument('--check', action='store_true', help="Validate only; do not write the bundle")
+    parser.add_argument('--strict', action='store_true', help="Treat warnings as errors")
+    args = parser.parse_args(argv)
+    try:
+        entries, warnings = compile_bundle(args.role_dir, DEFAULT_LEVEL_MAP, args.output,
+                                           write=not args.check, strict=args.strict)
+    except RoleValidationError as e:
+        print(f"{len(e.errors)} problem(s) found:")
+        for error in e.errors:
+            print(f"  - {error}")
+        return 1
+    for warning in warnings:
+        print(f"warning: {warning}")
+    if args.check:
+        print(f"{len(entries)} role file(s) OK")
+    else:
+        print(f"Compiled {len(entries)} role file(s) into {args.output or os.path.join(args.role_dir, BUNDLE_NAME)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+Shared, in-process registry of parsed role definition YAML files.
+
+Each role file is parsed once into an immutable structure and reused by every
+request. A cheap ``os.stat`` check on each lookup picks up edits to the YAML
+without restarting the app.
+
+If ``role_bundle.py`` has compiled the role files into a bundle, roles are
+loaded from it instead of parsing YAML. A role whose file no longer matches
+the bundle is parsed from YAML as before.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Dict, List, Optional, Sequence
+
+import yaml
+
+from behavior_templates import compile_level, render_level
+from metrics import metrics
+from role_bundle import BUNDLE_NAME, file_digest, load_entry, read_bundle
+
+ROLE_DIR = os.path.join(os.path.dirname(__file__), "role_definitions")
+
+# Maximum number of rendered (role, level, name, pronouns) views kept in memory
+RENDERED_VIEW_CACHE_SIZE = 256
+
+# Default LEVEL_MAP for backward compatibility
+DEFAULT_LEVEL_MAP = MappingProxyType({
+    "junior": "IC1",
+    "intermediate": "IC2",
+    "senior": "IC3",
+    "tech lead": "IC4",
+    "principal": "IC5",
+    "distinguished": "IC6",
+})
+
+
+def role_file_name(role: str) -> str:
+    """Returns the YAML file name for a role, e.g. 'Software Engineer' -> 'software_engineer.yaml'."""
+    return f"{role.lower().replace(' ', '_')}.yaml"
+
+
+def freeze(value):
+    """Recursively converts dicts to read-only mappings and lists to tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class RoleDefinition:
+    """
+    Immutable, parsed view of a single role definition YAML file.
+    """
+    __slots__ = ("role", "path", "data", "level_map", "levels", "templates", "version", "mtime_ns", "size")
+
+    def __init__(self, role: str, path: str, data: dict, version: str, mtime_ns: int, size: int,
+                 templates=None) -> None:
+        self.role = role
+        self.path = path
+        self.data = freeze(data or {})
+        self.level_map = self.data.get('level_map', DEFAULT_LEVEL_MAP)
+        self.levels = self.data.get('levels', MappingProxyType({}))
+        # Compiling up front surfaces malformed placeholders at load time; bundled roles arrive compiled
+        self.templates = templates if templates is not None else MappingProxyType({
+            level: compile_level(level_data, f"{path}: {level}")
+            for level, level_data in self.levels.items()
+        })
+        self.version = version
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    def is_current(self, st: os.stat_result) -> bool:
+        return st.st_mtime_ns == self.mtime_ns and st.st_size == self.size
+
+    @property
+    def available_level_map(self):
+        """The level map restricted to levels that have behaviors defined."""
+        return MappingProxyType({k: v for k, v in self.level_map.items() if k in self.levels})
+
+
+class RoleRegistry:
+    """
+    Caches parsed role definitions, reloading a file only when its mtime or size changes.
+    """
+    def __init__(self, role_dir: str = ROLE_DIR, view_cache_size: int = RENDERED_VIEW_CACHE_SIZE) -> None:
+        self.role_dir = role_dir
+        self._lock = threading.Lock()
+        self._definitions: Dict[str, RoleDefinition] = {}
+        self._views: OrderedDict = OrderedDict()
+        self._view_cache_size = view_cache_size
+        self._roles: Optional[List[str]] = None
+        self._roles_mtime_ns: Optional[int] = None
+        self._bundle: Optional[dict] = None
+        self._bundle_key = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.view_hits = 0
+        self.view_misses = 0
+        self.bundle_loads = 0
+
+    @property
+    def bundle_path(self) -> str:
+        return os.path.join(self.role_dir, BUNDLE_NAME)
+
+    def path_for(self, role: str) -> str:
+        return os.path.join(self.role_dir, role_file_name(role))
+
+    def get(self, role: str) -> RoleDefinition:
+        """
+        Returns the parsed definition for a role, re-parsing the YAML only if it changed on disk.
+        """
+        path = self.path_for(role)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._definitions.pop(path, None)
+            raise FileNotFoundError(f"Role definition YAML not found: {path}")
+
+        definition = self._definitions.get(path)
+        if definition is not None and definition.is_current(st):
+            self.hits += 1
+            return definition
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            definition = self._definitions.get(path)
+            if definition is not None and definition.is_current(st):
+                self.hits += 1
+                return definition
+            if definition is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            definition = self._load(role, path)
+            self._definitions[path] = definition
+            return definition
+
+    def _bundle_entry(self, path: str) -> Optional[dict]:
+        # Called with the lock held; re-reads the bundle only when it changes on disk
+        try:
+            st = os.stat(self.bundle_path)
+        except FileNotFoundError:
+            self._bundle, self._bundle_key = None, None
+            return None
+        key = (self.bundle_path, st.st_mtime_ns, st.st_size)
+        if key != self._bundle_key:
+            self._bundle, self._bundle_key = read_bundle(self.bundle_path), key
+        return (self._bundle or {}).get(os.path.basename(path))
+
+    def _load(self, role: str, path: str) -> RoleDefinition:
+        entry = self._bundle_entry(path)
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if entry is not None and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                raw = None
+            else:
+                raw = f.read()
+        # A touched but unchanged file (e.g. a fresh checkout) can still use the bundle
+        if entry is not None and (raw is None or (entry['size'] == len(raw) and entry['version'] == file_digest(raw))):
+            with metrics.phase('bundle_load'):
+                data, templates = load_entry(entry)
+            self.bundle_loads += 1
+            return RoleDefinition(role, path, data, entry['version'], st.st_mtime_ns, st.st_size, templates)
+        with metrics.phase('yaml_parse'):
+            data = yaml.safe_load(raw.decode('utf-8'))
+        return RoleDefinition(role, path, data, file_digest(raw), st.st_mtime_ns, st.st_size)
+
+    def render_level(self, role: str, level: str, name: str, pronouns: Sequence[str]):
+        """
+        Returns the rendered section -> subsection -> behaviors view for a reviewee.
+
+        Views are kept in a bounded LRU keyed by (role, level, name, pronouns) and
+        the definition version, so a YAML reload never serves stale text.
+        """
+        definition = self.get(role)
+        if level not in definition.templates:
+            raise ValueError(f"Level '{level}' not found in YAML for role '{role}'")
+        key = (definition.path, definition.version, level, name, tuple(pronouns))
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                self.view_hits += 1
+                return view
+        with metrics.phase('behavior_render'):
+            view = render_level(definition.templates[level], name, pronouns)
+        with self._lock:
+            self.view_misses += 1
+            self._views[key] = view
+            while len(self._views) > self._view_cache_size:
+                self._views.popitem(last=False)
+        return view
+
+    def level_map(self, role: str, default=DEFAULT_LEVEL_MAP):
+        """
+        Returns the level map for a role, limited to levels with behaviors defined,
+        or ``default`` if the role file is missing or invalid.
+        """
+        try:
+            return self.get(role).available_level_map
+        except Exception:
+            return default
+
+    def list_roles(self) -> List[str]:
+        """Returns sorted display names of all roles, re-listing the directory only when it changes."""
+        mtime_ns = os.stat(self.role_dir).st_mtime_ns
+        roles = self._roles
+        if roles is not None and mtime_ns == self._roles_mtime_ns:
+            return roles
+        roles = sorted(
+            fname[:-len('.yaml')].replace('_', ' ').title()
+            for fname in os.listdir(self.role_dir)
+            if fname.endswith('.yaml')
+        )
+        self._roles, self._roles_mtime_ns = roles, mtime_ns
+        return roles
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+            'cached_roles': len(self._definitions),
+            'view_hits': self.view_hits,
+            'view_misses': self.view_misses,
+            'cached_views': len(self._views),
+            'bundle_loads': self.bundle_loads,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._definitions.clear()
+            self._views.clear()
+            self._roles = None
+            self._roles_mtime_ns = None
+            self._bundle = None
+            self._bundle_key = None
+
+
+# Process-wide registry shared by the web app and the CLI
+registry = RoleRegistry()
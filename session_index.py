@@ -0,0 +1,142 @@
+"""
+Indexed store of review drafts for /resume.
+
+Each reviewer's session state is written to a SQLite database (WAL mode, so
+readers never block the writer) whenever the session changes. Drafts are keyed
+by (reviewer, draft_id) with an index on (reviewer, updated_at), so "latest
+draft for this reviewer" and "list my drafts" are indexed lookups rather than a
+scan of the Flask-Session directory. Payloads are stored as JSON and decoded
+directly.
+
+Drafts not updated for SESSION_INDEX_MAX_AGE seconds (default 90 days) are
+pruned a batch at a time as other drafts are saved, so the index does not grow
+with every review ever started.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+DB_PATH = os.environ.get(
+    'SESSION_INDEX_PATH',
+    os.path.join(os.path.dirname(__file__), 'flask_session', 'session_index.sqlite3'),
+)
+
+# Drafts older than this many seconds are pruned
+MAX_AGE = float(os.environ.get('SESSION_INDEX_MAX_AGE', 90 * 24 * 3600))
+
+# Prune up to PRUNE_BATCH expired drafts every PRUNE_EVERY saves
+PRUNE_EVERY = 64
+PRUNE_BATCH = 256
+
+# Session keys that only make sense inside the process that created them
+TRANSIENT_KEYS = ('chatgpt_job_id', '_permanent')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    reviewer TEXT NOT NULL,
+    draft_id TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    name TEXT,
+    role TEXT,
+    level TEXT,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (reviewer, draft_id)
+);
+CREATE INDEX IF NOT EXISTS drafts_by_reviewer ON drafts (reviewer, updated_at DESC);
+CREATE INDEX IF NOT EXISTS drafts_by_age ON drafts (updated_at);
+"""
+
+
+class SessionIndex:
+    """
+    SQLite-backed index of review drafts keyed by reviewer.
+    """
+    def __init__(self, path: str = DB_PATH, max_age: float = MAX_AGE) -> None:
+        self.path = path
+        self.max_age = max_age
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+        self._saves = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not cross a fork (gunicorn --preload); each process opens its own
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def save(self, reviewer: str, draft_id: str, data: dict) -> None:
+        """Inserts or replaces a reviewer's draft with the given session data."""
+        data = {k: v for k, v in data.items() if k not in TRANSIENT_KEYS}
+        user_info = data.get('user_info') or {}
+        self._conn().execute(
+            'INSERT OR REPLACE INTO drafts (reviewer, draft_id, updated_at, name, role, level, payload) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (reviewer, draft_id, time.time(), user_info.get('name'), user_info.get('role'),
+             user_info.get('level'), json.dumps(data, ensure_ascii=False)),
+        )
+        with self._init_lock:
+            self._saves += 1
+            prune = self._saves % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self, limit: int = PRUNE_BATCH) -> int:
+        """Deletes up to ``limit`` drafts older than max_age, oldest first; returns how many."""
+        return self._conn().execute(
+            'DELETE FROM drafts WHERE rowid IN (SELECT rowid FROM drafts WHERE updated_at < ? '
+            'ORDER BY updated_at LIMIT ?)',
+            (time.time() - self.max_age, limit),
+        ).rowcount
+
+    def latest(self, reviewer: str) -> Optional[dict]:
+        """Returns the most recently updated draft's session data for a reviewer, or None."""
+        row = self._conn().execute(
+            'SELECT payload FROM drafts WHERE reviewer = ? ORDER BY updated_at DESC LIMIT 1',
+            (reviewer,),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self, reviewer: str, draft_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            'SELECT payload FROM drafts WHERE reviewer = ? AND draft_id = ?',
+            (reviewer, draft_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def has_drafts(self, reviewer: str) -> bool:
+        return self._conn().execute(
+            'SELECT 1 FROM drafts WHERE reviewer = ? LIMIT 1', (reviewer,)
+        ).fetchone() is not None
+
+    def list_drafts(self, reviewer: str, limit: int = 20) -> List[dict]:
+        """Returns draft metadata for a reviewer, newest first, without decoding payloads."""
+        rows = self._conn().execute(
+            'SELECT draft_id, updated_at, name, role, level FROM drafts '
+            'WHERE reviewer = ? ORDER BY updated_at DESC LIMIT ?',
+            (reviewer, limit),
+        ).fetchall()
+        return [
+            dict(draft_id=draft_id, updated_at=updated_at, name=name, role=role, level=level)
+            for draft_id, updated_at, name, role, level in rows
+        ]
+
+    def delete(self, reviewer: str, draft_id: str) -> None:
+        self._conn().execute('DELETE FROM drafts WHERE reviewer = ? AND draft_id = ?', (reviewer, draft_id))
+
+
+# Process-wide index; SQLite handles sharing between worker processes
+session_index = SessionIndex()
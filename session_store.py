@@ -0,0 +1,137 @@
+"""
+Server-side Flask sessions on a shared store, and a stable secret key.
+
+The browser keeps only a signed random session id; the session itself is stored
+in the configured shared_store backend (SESSION_STORE: filesystem, sqlite, shm
+or a redis:// URL) as tagged JSON, the same serializer Flask uses for cookie
+sessions. A session is written only when it has changed, and an empty new
+session is never written, so browsing without starting a review costs nothing.
+
+The secret key signs the session id and must be the same in every worker and
+across restarts: it is taken from SECRET_KEY, or else generated once and kept in
+a file that every worker reads.
+"""
+
+import os
+import secrets
+import tempfile
+from typing import Optional
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from shared_store import DEFAULT_DIR, open_store
+
+SECRET_KEY_PATH = os.environ.get('SECRET_KEY_PATH', os.path.join(DEFAULT_DIR, 'secret_key'))
+
+
+def load_secret_key(path: str = SECRET_KEY_PATH) -> str:
+    """
+    Returns SECRET_KEY from the environment, or the key stored at ``path``, creating it on
+    first use. A new key is written to a temporary file and linked into place, which fails if
+    the key exists, so concurrently starting workers never see a partial key and all use one.
+    """
+    key = os.environ.get('SECRET_KEY')
+    if key:
+        return key
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.secret_key-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            # Another worker won the race; its key is complete on disk
+            pass
+    finally:
+        os.remove(tmp_path)
+    with open(path, 'r', encoding='utf-8') as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"The secret key file {path} is empty; remove it or set SECRET_KEY")
+    return key
+
+
+class StoredSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid: Optional[str] = None, new: bool = False) -> None:
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.new = new
+        self.modified = False
+
+
+class StoreSessionInterface(SessionInterface):
+    """
+    Flask session interface keeping sessions in a shared store under a signed session id cookie.
+    """
+    session_class = StoredSession
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store) -> None:
+        self.store = store
+
+    def _signer(self, app) -> Signer:
+        return Signer(app.secret_key, salt='session-id')
+
+    def open_session(self, app, request) -> StoredSession:
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                try:
+                    data = self.store.get(sid)
+                except Exception as e:
+                    print(f'Could not load session: {e}')
+                    data = None
+                if data is not None:
+                    try:
+                        return self.session_class(self.serializer.loads(data.decode('utf-8')), sid)
+                    except ValueError:
+                        pass
+        return self.session_class(new=True)
+
+    def save_session(self, app, session: StoredSession, response) -> None:
+        name = self.get_cookie_name(app)
+        domain, path = self.get_cookie_domain(app), self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if session.modified:
+            data = self.serializer.dumps(dict(session)).encode('utf-8')
+            self.store.set(session.sid, data, app.permanent_session_lifetime.total_seconds())
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name, self._signer(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session), domain=domain, path=path,
+                httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def init_app(app, spec: Optional[str] = None) -> None:
+    """
+    Gives the app a stable secret key and server-side sessions on the store named by
+    ``spec`` (default: SESSION_STORE, else filesystem).
+    """
+    app.secret_key = app.secret_key or load_secret_key()
+    spec = spec or app.config.get('SESSION_STORE') or os.environ.get('SESSION_STORE', 'filesystem')
+    app.config['SESSION_STORE'] = spec
+    app.session_interface = StoreSessionInterface(open_store(spec, 'sessions'))
@@ -0,0 +1,199 @@
+"""
+Key-value stores shared by all worker processes, for sessions and caches.
+
+A store maps string keys to bytes with a time-to-live. Which backend is used is
+chosen by a short spec (see open_store):
+
+  filesystem[:///dir]  one file per key in hashed subdirectories (default ./flask_session)
+  sqlite[:///dir]      one SQLite database per store in WAL mode, so readers never block the writer
+  shm                  SQLite database in /dev/shm: shared memory for the workers of one host
+  redis://host:6379/0  Redis or any server speaking its protocol (needs the redis package)
+
+Every backend reads and writes one key at a time by direct lookup, and expired
+entries are swept a small slice at a time, so the cost of a read or write does
+not grow with the number of keys stored.
+"""
+
+import hashlib
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from typing import Optional
+
+DEFAULT_DIR = os.path.join(os.path.dirname(__file__), 'flask_session')
+SHM_DIR = '/dev/shm'
+
+# Sweep expired entries (one slice of the store at a time) every N writes
+SWEEP_EVERY = 64
+SWEEP_BATCH = 256
+
+_EXPIRY = struct.Struct('<d')
+
+
+class FileStore:
+    """
+    One file per key, named by a hash of the key under 256 subdirectories. Each file
+    holds its expiry time followed by the value and is replaced atomically.
+    """
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._next_shard = 0
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _EXPIRY.size or _EXPIRY.unpack_from(data)[0] < time.time():
+            self._remove(path)
+            return None
+        return data[_EXPIRY.size:]
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_EXPIRY.pack(time.time() + ttl) + value)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            raise
+        self._maybe_sweep()
+
+    def delete(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def _maybe_sweep(self) -> None:
+        with self._lock:
+            self._writes += 1
+            if self._writes % SWEEP_EVERY:
+                return
+            shard = f'{self._next_shard:02x}'
+            self._next_shard = (self._next_shard + 1) % 256
+        # One subdirectory per sweep: about 1/256 of the entries
+        shard_dir = os.path.join(self.directory, shard)
+        try:
+            names = os.listdir(shard_dir)
+        except OSError:
+            return
+        now = time.time()
+        for name in names:
+            path = os.path.join(shard_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    head = f.read(_EXPIRY.size)
+            except OSError:
+                continue
+            # Leftover temp files are cleaned up once they are clearly abandoned
+            if name.startswith('.tmp-'):
+                try:
+                    if now - os.stat(path).st_mtime > 3600:
+                        self._remove(path)
+                except OSError:
+                    pass
+            elif len(head) < _EXPIRY.size or _EXPIRY.unpack(head)[0] < now:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SQLiteStore:
+    """
+    Single-table SQLite store in WAL mode, keyed by primary key with an index on expiry.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not cross a fork (gunicorn --preload); each process opens its own
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(
+                'CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL) '
+                'WITHOUT ROWID;'
+                'CREATE INDEX IF NOT EXISTS kv_by_expiry ON kv (expires);'
+            )
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute('SELECT value FROM kv WHERE key = ? AND expires >= ?', (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO kv (key, expires, value) VALUES (?, ?, ?)',
+                     (key, time.time() + ttl, value))
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % SWEEP_EVERY == 0
+        if sweep:
+            conn.execute('DELETE FROM kv WHERE key IN (SELECT key FROM kv WHERE expires < ? LIMIT ?)',
+                         (time.time(), SWEEP_BATCH))
+
+    def delete(self, key: str) -> None:
+        self._conn().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+
+class RedisStore:
+    """
+    Store on a Redis-compatible server; keys are prefixed with the store name and expire server-side.
+    """
+    def __init__(self, url: str, prefix: str) -> None:
+        import redis
+        self.url = url
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+def open_store(spec: str, name: str):
+    """
+    Opens the store ``name`` ('sessions', 'narratives', ...) on the backend described by ``spec``.
+    Raises ValueError for an unknown backend and ImportError if redis is needed but not installed.
+    """
+    backend, _, location = (spec or 'filesystem').partition('://')
+    if backend.startswith('redis'):
+        return RedisStore(spec, f'{name}:')
+    directory = location or DEFAULT_DIR
+    if backend == 'filesystem':
+        return FileStore(os.path.join(directory, name))
+    if backend == 'sqlite':
+        return SQLiteStore(os.path.join(directory, f'{name}.sqlite3'))
+    if backend == 'shm':
+        shm_dir = location or (SHM_DIR if os.path.isdir(SHM_DIR) else tempfile.gettempdir())
+        return SQLiteStore(os.path.join(shm_dir, f'profession-feedback-{name}.sqlite3'))
+    raise ValueError(f"Unknown store '{spec}'. Use filesystem, sqlite, shm or a redis:// URL.")
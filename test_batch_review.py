@@ -0,0 +1,21 @@
+import csv
+import json
+from batch_review import run_batch
+from performance_review_generator import PerformanceReviewGenerator
+
+def test_batch_generates_reviews_from_csv(tmp_path):
+    gen = PerformanceReviewGenerator(name='Alice', pronouns=['she', 'her'], role='Software Engineer', level='junior')
+    count = len(gen.behavior_items())
+    input_path = tmp_path / 'ratings.csv'
+    with open(input_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'pronoun_subject', 'pronoun_possessive', 'role', 'level', 'ratings', 'comment_craft'])
+        writer.writerow(['Alice', 'she', 'her', 'Software Engineer', 'junior', '2' + '1' * (count - 1), 'Great code'])
+        writer.writerow(['Bob', 'he', 'his', 'Software Engineer', 'junior', '1' * (count - 1), ''])
+    output_path = tmp_path / 'reviews.jsonl'
+    total, errors, _ = run_batch(str(input_path), str(output_path), workers=2)
+    assert (total, errors) == (2, 1)
+    results = {r['name']: r for r in map(json.loads, output_path.read_text(encoding='utf-8').splitlines())}
+    assert 'OVER PERFORMING:\noverview' in results['Alice']['feedback']
+    assert results['Alice']['comments'] == {'craft': 'Great code'}
+    assert 'Expected' in results['Bob']['error']
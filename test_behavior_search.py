@@ -0,0 +1,39 @@
+import os
+from behavior_search import BehaviorIndex, tokenize
+from role_registry import RoleRegistry
+
+ROLE_YAML = """
+level_map:
+  junior: IC1
+  senior: IC3
+levels:
+  junior:
+    results:
+      ownership:
+        - "{name} takes part in the on-call rotation."
+        - "{name} documents {pronouns[1]} work."
+  senior:
+    talent:
+      mentorship:
+        - "{name} mentors new hires."
+"""
+
+def test_tokenize_drops_placeholders_and_stopwords():
+    assert tokenize("{name} eases the burden for on-call and {pronouns[1]} team.") == ['eases', 'burden', 'call', 'team']
+
+def test_search_ranks_prefixes_and_rebuilds_changed_roles(tmp_path):
+    path = tmp_path / 'test_role.yaml'
+    path.write_text(ROLE_YAML, encoding='utf-8')
+    index = BehaviorIndex(RoleRegistry(str(tmp_path)))
+    hits = index.search('on-call')
+    assert [(h['role'], h['level'], h['section'], h['subsection']) for h in hits] == [('Test Role', 'junior', 'results', 'ownership')]
+    assert hits[0]['text'] == '[name] takes part in the on-call rotation.'
+    assert [h['text'] for h in index.search('mentor')] == ['[name] mentors new hires.']
+    assert index.search('mentor', level='junior') == []
+    assert index.search('call rotat docs') == []
+    index.search('x')
+    assert index.builds == 1
+    path.write_text(ROLE_YAML.replace('new hires', 'interns'), encoding='utf-8')
+    os.utime(path, ns=(0, 10**18))
+    assert [h['text'] for h in index.search('intern')] == ['[name] mentors interns.']
+    assert index.builds == 2
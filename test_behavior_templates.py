@@ -0,0 +1,35 @@
+import pytest
+from behavior_templates import TemplateError, compile_template
+from role_registry import RoleRegistry
+
+def test_template_renders_like_str_format():
+    source = "{name} works with {pronouns[1]} team; {pronouns[0]} leads."
+    template = compile_template(source)
+    pronouns = ['she', 'her']
+    assert template.render('Alice', pronouns) == source.format(name='Alice', pronouns=pronouns)
+
+@pytest.mark.parametrize('source', [
+    "{nam} does things.",
+    "{name} leads {pronouns[2]} team.",
+    "{name} leads {pronouns} team.",
+    "{name} leads {pronouns[1] team.",
+    "{name:>10} does things.",
+])
+def test_malformed_placeholder_rejected(source):
+    with pytest.raises(TemplateError):
+        compile_template(source)
+
+def test_malformed_placeholder_reported_at_load(tmp_path):
+    (tmp_path / 'bad_role.yaml').write_text(
+        'levels:\n  junior:\n    craft:\n      code:\n        - "{name} fixes {pronoun[1]} bugs."\n',
+        encoding='utf-8')
+    with pytest.raises(TemplateError, match='junior/craft/code'):
+        RoleRegistry(str(tmp_path)).get('Bad Role')
+
+def test_rendered_views_are_shared():
+    reg = RoleRegistry()
+    first = reg.render_level('Software Engineer', 'junior', 'Test User', ['they', 'their'])
+    second = reg.render_level('Software Engineer', 'junior', 'Test User', ('they', 'their'))
+    assert first is second
+    assert reg.stats()['view_hits'] == 1
+    assert reg.render_level('Software Engineer', 'junior', 'Other User', ['they', 'their']) is not first
@@ -0,0 +1,49 @@
+import io
+import json
+import tarfile
+import zipfile
+import bulk_export
+from bulk_export import iter_archive, select_entries
+from review_log import ReviewLog
+
+def entry(i, role='Software Engineer', level='senior', day=1):
+    return {'timestamp': f'2026-03-{day:02d}T10:00:{i % 60:02d}',
+            'user_info': {'name': f'R{i}', 'role': role, 'level': level, 'exceeds': {'Results': ['Ships things']},
+                          'meets': {}, 'does_not_meet': {}, 'comments': {'Results': 'Solid'}},
+            'chatgpt_result': f'Narrative {i}'}
+
+def write_log(path, entries):
+    log = ReviewLog(str(path), compress=True, flush_interval=0.01)
+    for e in entries:
+        log.append(e)
+    log.close()
+
+def test_zip_export_filters_and_streams(tmp_path, monkeypatch):
+    write_log(tmp_path, [entry(i, day=1 + i % 3) for i in range(30)] + [entry(99, role='Engineering Manager', level='m3')])
+    # Small chunks so the archive arrives in many pieces
+    monkeypatch.setattr(bulk_export, 'CHUNK_SIZE', 512)
+    stats = {}
+    chunks = list(iter_archive(select_entries(str(tmp_path), role='Software Engineer', since='2026-03-02',
+                                              until='2026-03-03'),
+                               ['markdown', 'json'], 'zip', workers=4, max_in_flight=3, stats=stats))
+    assert len(chunks) > 2 and stats == {'reviews': 20, 'files': 40}
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as z:
+        assert z.testzip() is None
+        names = z.namelist()
+        assert len(names) == 40 and all(n.startswith('software_engineer/senior/202603') for n in names)
+        doc = json.loads(z.read(names[1]))
+        assert doc['name'] == 'R1' and doc['narrative'] == 'Narrative 1'
+        assert b'Ships things' in z.read(names[0])
+
+def test_tar_export_and_zip64(tmp_path, monkeypatch):
+    write_log(tmp_path, [entry(i) for i in range(5)])
+    data = b''.join(iter_archive(select_entries(str(tmp_path)), ['text'], 'tar.gz', workers=2))
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as t:
+        members = t.getmembers()
+        assert [m.name.rsplit('_', 1)[1] for m in members] == [f'{i}.txt' for i in range(1, 6)]
+        assert b'Narrative 0' in t.extractfile(members[0]).read()
+    # Past 65535 members the archive needs zip64 end records
+    many = (entry(i) for i in range(70000))
+    monkeypatch.setattr(bulk_export, 'render_entry', lambda e, formats, deflate: [(b'\x03\x00', 0, 0)])
+    with zipfile.ZipFile(io.BytesIO(b''.join(iter_archive(many, ['text'], 'zip')))) as z:
+        assert len(z.infolist()) == 70000
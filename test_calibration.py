@@ -0,0 +1,36 @@
+import pytest
+np = pytest.importorskip('numpy')
+from calibration import CalibrationStore, behavior_layout
+from review_log import ReviewLog
+from role_registry import registry
+
+ROLE, LEVEL = 'Engineering Manager', 'm3'
+
+def log_reviews(log, reviewer, ratings, count):
+    version = registry.get(ROLE).version
+    for _ in range(count):
+        log.append({'timestamp': '2026-10-01T09:00:00', 'reviewer': reviewer, 'user_info': {'role': ROLE, 'level': LEVEL},
+                    'review': {'role': ROLE, 'level': LEVEL, 'version': version, 'ratings': ratings}})
+
+def test_store_aggregates_incrementally_and_flags_outliers(tmp_path):
+    store = CalibrationStore(str(tmp_path))
+    log = ReviewLog(str(tmp_path), compress=False, flush_interval=0.01)
+    sections, _, texts = behavior_layout(ROLE, LEVEL)
+    width = len(texts)
+    for i in range(10):
+        log_reviews(log, f'reviewer-{i}', '1' * (width - 1) + '12'[i % 2], 3)
+    log.flush(timeout=5)
+    assert store.refresh(force=True) == 30
+    report = store.report(ROLE, LEVEL)
+    assert report['reviews'] == 30 and report['outliers'] == []
+    assert report['behaviors'][0]['meets'] == 1.0 and report['behaviors'][-1]['exceeds'] == 0.5
+    assert [s['section'] for s in report['sections']] == list(dict.fromkeys(sections))
+
+    # Only the new reviews are read on the next refresh
+    log_reviews(log, 'harsh', '0' * width, 5)
+    log.close()
+    assert store.refresh(force=True) == 5
+    report = store.report(ROLE, LEVEL)
+    assert report['reviews'] == 35
+    assert [o['reviewer'] for o in report['outliers']] == ['harsh']
+    assert report['outliers'][0]['z'] < 0
@@ -0,0 +1,26 @@
+from fallback_narrative import FALLBACK_LABEL, build_fallback_narrative
+
+EXCEEDS = {'craft': ['Sam writes clear design docs.', 'Sam reviews code promptly.']}
+MEETS = {'results': ['Sam delivers on time.'], 'culture': ['Sam supports teammates.']}
+DOES_NOT_MEET = {'talent': ['Sam mentors junior engineers.'], 'results': ['Sam scopes projects well.']}
+
+
+def test_fallback_covers_the_three_prompt_sections():
+    text = build_fallback_narrative('Sam', EXCEEDS, MEETS, DOES_NOT_MEET, {'talent': 'Make time for mentoring.'})
+    assert text.startswith(FALLBACK_LABEL)
+    well = text.index("What are some things they do well?")
+    improve = text.index("How could they improve?")
+    challenges = text.index("What are their biggest challenges?")
+    assert well < improve < challenges
+    assert "Sam exceeds expectations in craft (2 of 6 rated skills)" in text[well:improve]
+    assert "- Sam mentors junior engineers. (talent)" in text[improve:challenges]
+    assert "Reviewer comment on talent: Make time for mentoring." in text[improve:challenges]
+    # talent has 1 of 1 skills below expectations, so it ranks above results (1 of 2)
+    assert text[challenges:].index("Talent: 1 of 1") < text[challenges:].index("Results: 1 of 2")
+    assert text == build_fallback_narrative('Sam', EXCEEDS, MEETS, DOES_NOT_MEET, {'talent': 'Make time for mentoring.'})
+
+
+def test_fallback_without_gaps():
+    text = build_fallback_narrative('Sam', {}, MEETS, {})
+    assert "No skills were rated below expectations." in text
+    assert "There are no clear gaps at this level" in text
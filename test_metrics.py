@@ -0,0 +1,29 @@
+from metrics import Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe('review_phase_seconds', ('llm_call',), 0.05)
+    metrics.observe('review_phase_seconds', ('llm_call',), 0.5)
+    metrics.observe('review_phase_seconds', ('llm_call',), 5.0)
+    metrics.inc('review_llm_retries_total', ('engine',), 2)
+    text = metrics.render()
+    assert 'review_phase_seconds_bucket{phase="llm_call",le="0.1"} 1' in text
+    assert 'review_phase_seconds_bucket{phase="llm_call",le="1.0"} 2' in text
+    assert 'review_phase_seconds_bucket{phase="llm_call",le="+Inf"} 3' in text
+    assert 'review_phase_seconds_sum{phase="llm_call"} 5.550000' in text
+    assert 'review_llm_retries_total{source="engine"} 2' in text
+
+
+def test_phase_records_duration_and_disabled_is_noop():
+    metrics = Metrics()
+    with metrics.phase('yaml_parse'):
+        pass
+    assert metrics.snapshot('review_phase_seconds') == {('yaml_parse',): 1}
+
+    disabled = Metrics(enabled=False)
+    with disabled.phase('yaml_parse'):
+        pass
+    disabled.inc('review_llm_retries_total', ('engine',))
+    assert disabled.snapshot('review_phase_seconds') == {}
+    assert disabled.snapshot('review_llm_retries_total') == {}
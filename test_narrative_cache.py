@@ -0,0 +1,62 @@
+import os
+import time
+from narrative_cache import NarrativeCache
+
+def test_cache_roundtrip_and_key(tmp_path):
+    cache = NarrativeCache(str(tmp_path))
+    assert cache.get('model', 'prompt', 'feedback') is None
+    cache.put('model', 'prompt', 'feedback', 'A narrative.')
+    assert cache.get('model', 'prompt', 'feedback') == 'A narrative.'
+    assert cache.get('other-model', 'prompt', 'feedback') is None
+    assert cache.get('model', 'prompt', 'changed feedback') is None
+    assert not [f for _, _, files in os.walk(tmp_path) for f in files if f.startswith('.tmp-')]
+
+def test_cache_expires_old_entries(tmp_path):
+    cache = NarrativeCache(str(tmp_path), max_age=60)
+    cache.put('model', 'prompt', 'feedback', 'A narrative.')
+    cache.max_age = -1
+    assert cache.get('model', 'prompt', 'feedback') is None
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = NarrativeCache(str(tmp_path), max_bytes=550)
+    for i in range(3):
+        cache.put('model', f'prompt {i}', 'feedback', 'x' * 100)
+        time.sleep(0.01)
+    cache.get('model', 'prompt 0', 'feedback')
+    cache.put('model', 'prompt 3', 'feedback', 'x' * 100)
+    assert cache.get('model', 'prompt 0', 'feedback') is not None
+    assert cache.get('model', 'prompt 1', 'feedback') is None
+
+def test_revised_review_only_regenerates_changed_sections(tmp_path, monkeypatch):
+    import contextlib, io
+    from fake_openai_server import FakeOpenAIServer
+    from narrative_engine import NarrativeEngine
+    from performance_review_generator import PerformanceReviewGenerator
+    from review_state import build_generator, encode_ratings
+    monkeypatch.setattr('performance_review_generator.narrative_cache', NarrativeCache(str(tmp_path)))
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    from review_model import level_definition
+    state = {'name': 'Sam', 'pronouns': ['they', 'their'], 'role': 'Software Engineer', 'level': 'junior',
+             'version': level_definition('Software Engineer', 'junior').version, 'comments': {'craft': 'Great reviews.'}}
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = PerformanceReviewGenerator('Sam', ['they', 'their'], 'Software Engineer', 'junior')
+    ratings = [1] * len(generator.behavior_items())
+    with FakeOpenAIServer(stream_delay=0) as server:
+        engine = NarrativeEngine(api_key='test', base_url=server.base_url)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                first = build_generator(dict(state, ratings=encode_ratings(ratings)))
+                first.get_chatgpt_feedback(engine=engine, sectioned=True)
+                sections = len(first.build_section_prompts())
+                ratings[-1] = 0
+                revised = build_generator(dict(state, ratings=encode_ratings(ratings)))
+                streamed = []
+                revised.get_chatgpt_feedback(engine=engine, sectioned=True, on_text=streamed.append)
+        finally:
+            engine.close()
+    assert first.sections_generated == sections > 1 and first.sections_reused == 0
+    assert revised.sections_generated == 1 and revised.sections_reused == sections - 1
+    assert server.requests == sections + 1
+    # The regenerated section streams word by word, not as one piece once it is done
+    assert ''.join(streamed) == revised.chatgpt_feedback and len(streamed) > 2 * sections
+    assert revised.chatgpt_feedback.startswith('Overview\n') and not revised.chatgpt_fallback
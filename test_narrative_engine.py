@@ -0,0 +1,101 @@
+import time
+
+import pytest
+from fake_openai_server import FakeOpenAIServer
+from fake_openai_server import default_reply
+from narrative_engine import NarrativeEngine, NarrativeRequest, TokenBucket
+
+@pytest.fixture
+def fake_server():
+    with FakeOpenAIServer(latency=0.05, fail_first=2) as server:
+        yield server
+
+def test_engine_runs_requests_concurrently_with_retries(fake_server):
+    engine = NarrativeEngine(api_key='test', base_url=fake_server.base_url, max_concurrency=4,
+                             backoff_min=0.01, backoff_max=0.05)
+    try:
+        requests = [NarrativeRequest(i, [{'role': 'user', 'content': f'Review {i}'}]) for i in range(6)]
+        results = list(engine.run_many(requests))
+    finally:
+        engine.close()
+    assert sorted(r.key for r in results) == list(range(6))
+    assert all(r.ok and 'What are some things they do well?' in r.text for r in results)
+    assert engine.stats()['retries'] == 2
+    assert fake_server.requests == 8
+
+def test_engine_gives_up_after_max_attempts(fake_server):
+    fake_server.fail_first = 100
+    engine = NarrativeEngine(api_key='test', base_url=fake_server.base_url, max_attempts=2,
+                             backoff_min=0.01, backoff_max=0.01)
+    try:
+        result = engine.submit([{'role': 'user', 'content': 'Review'}], key='a').result(timeout=10)
+    finally:
+        engine.close()
+    assert not result.ok
+    assert result.attempts == 2
+
+def test_token_bucket_limits_rate():
+    import asyncio, time
+
+    async def take(n):
+        bucket = TokenBucket(rate_per_minute=600, capacity=2)
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # Two tokens are available immediately, then one every 0.1s
+    assert asyncio.run(take(4)) >= 0.15
+
+
+def test_streamed_completion_delivers_deltas():
+    with FakeOpenAIServer(stream_delay=0.001) as server:
+        engine = NarrativeEngine(api_key='test', base_url=server.base_url)
+        try:
+            deltas = []
+            result = engine.submit([{'role': 'user', 'content': 'hello'}], on_text=deltas.append).result(10)
+        finally:
+            engine.close()
+    assert result.ok
+    assert len(deltas) > 5
+    assert ''.join(deltas) == result.text == default_reply([{'role': 'user', 'content': 'hello'}])
+    assert server.bodies[0]['stream'] is True
+
+
+def test_deadline_bounds_total_time_and_hedge_beats_slow_request():
+    with FakeOpenAIServer(slow_first=1, slow_latency=2.0) as server:
+        engine = NarrativeEngine(api_key='test', base_url=server.base_url, backoff_min=0.01, backoff_max=0.05)
+        try:
+            start = time.perf_counter()
+            result = engine.submit([{'role': 'user', 'content': 'slow'}], deadline=0.3).result(5)
+            assert not result.ok and isinstance(result.error, TimeoutError)
+            assert time.perf_counter() - start < 1.0
+        finally:
+            engine.close()
+    with FakeOpenAIServer(slow_first=1, slow_latency=2.0) as server:
+        engine = NarrativeEngine(api_key='test', base_url=server.base_url, hedge_after=0.1)
+        try:
+            start = time.perf_counter()
+            result = engine.submit([{'role': 'user', 'content': 'hedged'}]).result(5)
+            assert result.ok
+            assert time.perf_counter() - start < 1.5
+            assert engine.stats()['hedges'] == 1 and server.requests >= 1
+        finally:
+            engine.close()
+
+def test_generator_deadline_bounds_attempts_and_retries(monkeypatch):
+    import contextlib, io
+    from performance_review_generator import PerformanceReviewGenerator
+    with FakeOpenAIServer(latency=3.0) as server:
+        monkeypatch.setenv('OPENAI_BASE_URL', server.base_url)
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator = PerformanceReviewGenerator('Sam', ['they', 'their'], 'Software Engineer', 'junior')
+            generator.apply_ratings([1] * len(generator.behavior_items()), {})
+            generator.give_feedback()
+            start = time.perf_counter()
+            generator.get_chatgpt_feedback(use_cache=False, deadline=1.2)
+        # One attempt with the whole budget, and no retry once less than the minimum wait is left
+        # (the client's own retries used to make it three attempts of the full timeout)
+        assert time.perf_counter() - start < 3.0
+        assert generator.chatgpt_fallback and len(server.bodies) == 1
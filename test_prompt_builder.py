@@ -0,0 +1,56 @@
+from prompt_builder import SECTION_INSTRUCTIONS, SectionStream, abbreviate, build_prompt, join_sections
+
+EXCEEDS = {'craft': ['Alex writes clear design docs.']}
+MEETS = {'results': [f'Alex delivers project {i} on time.' for i in range(40)],
+         'culture': [f'Alex supports teammate {i}.' for i in range(40)]}
+DOES_NOT_MEET = {'talent': ['Talent - Alex mentors junior engineers.']}
+COMMENTS = {'talent': 'Needs to make time for mentoring.', 'craft': ''}
+
+
+def test_abbreviate_drops_leading_name_only():
+    assert abbreviate('Alex writes docs about Alex.', 'Alex') == 'writes docs about Alex.'
+    assert abbreviate('Craft – Alex writes docs.', 'Alex') == 'Craft – writes docs.'
+    assert abbreviate('Writes docs.', 'Alex') == 'Writes docs.'
+
+
+def test_prompt_sends_each_behavior_once():
+    prompt = build_prompt('Alex', ['they', 'their'], 'Software Engineer', 'senior',
+                          EXCEEDS, MEETS, DOES_NOT_MEET, COMMENTS, budget=100000)
+    system, user = (m['content'] for m in prompt.messages)
+    assert prompt.stage == 'full' and not prompt.over_budget
+    assert 'delivers project 7 on time' not in system
+    assert user.count('delivers project 7 on time') == 1
+    assert '- Talent - mentors junior engineers.' in user
+    assert 'talent: Needs to make time for mentoring.' in user
+    assert 'craft: ' not in user.split('SECTION COMMENTS')[1]
+
+
+def test_budget_summarises_meets_before_other_ratings():
+    full = build_prompt('Alex', ['they', 'their'], 'Software Engineer', 'senior',
+                        EXCEEDS, MEETS, DOES_NOT_MEET, COMMENTS, budget=100000)
+    prompt = build_prompt('Alex', ['they', 'their'], 'Software Engineer', 'senior',
+                          EXCEEDS, MEETS, DOES_NOT_MEET, COMMENTS, budget=full.prompt_tokens - 1)
+    user = prompt.messages[1]['content']
+    assert prompt.stage == 'meets_by_section'
+    assert prompt.prompt_tokens < full.prompt_tokens
+    assert 'results: 40 skills (not listed)' in user
+    assert 'writes clear design docs' in user and 'mentors junior engineers' in user
+    # An impossible budget still returns the most compact prompt, flagged
+    tiny = build_prompt('Alex', ['they', 'their'], 'Software Engineer', 'senior',
+                        EXCEEDS, MEETS, DOES_NOT_MEET, COMMENTS, budget=10)
+    assert tiny.stage == 'exceeds_by_section' and tiny.over_budget
+    assert 'mentors junior engineers' in tiny.messages[1]['content']
+
+
+def test_section_stream_relays_sections_in_order():
+    streamed = []
+    relay = SectionStream(['overview', 'craft'], streamed.append)
+    relay.feeder('craft')('Writes clear docs.')
+    relay.feeder('overview')('\nDelivers ')
+    assert ''.join(streamed) == 'Overview\nDelivers'
+    relay.finish('overview', '\nDelivers reliably. ')
+    assert ''.join(streamed).endswith('reliably.\n\nCraft\nWrites clear docs.')
+    relay.finish('craft', 'Writes clear docs.')
+    assert ''.join(streamed) == join_sections([('overview', 'Delivers reliably.'), ('craft', 'Writes clear docs.')])
+    assert 'biggest challenges' in SECTION_INSTRUCTIONS
+
@@ -0,0 +1,42 @@
+import glob
+import json
+import os
+from review_log import ReviewLog, iter_entries
+
+def entry(i, role='Software Engineer', level='junior', day=1):
+    return {'timestamp': f'2026-03-{day:02d}T10:00:{i % 60:02d}', 'user_info': {'name': f'R{i}', 'role': role, 'level': level},
+            'chatgpt_result': 'x' * 50}
+
+def test_log_batches_rotates_and_compresses(tmp_path):
+    log = ReviewLog(str(tmp_path), max_bytes=1000, compress=True, fsync='always', flush_interval=0.01)
+    for i in range(20):
+        log.append(entry(i, day=1 + i // 10))
+    log.close()
+    segments = sorted(glob.glob(str(tmp_path / 'reviews-*.jsonl.gz')))
+    assert len(segments) > 1 and log.stats()['written'] == 20
+    assert not glob.glob(str(tmp_path / '*.jsonl'))
+    with open(segments[0] + '.idx') as f:
+        manifest = json.load(f)
+    assert manifest['role_levels'] == [['Software Engineer', 'junior']]
+    assert [e['user_info']['name'] for e in iter_entries(str(tmp_path))] == [f'R{i}' for i in range(20)]
+    assert len(list(iter_entries(str(tmp_path), since='2026-03-02'))) == 10
+
+def test_reader_filters_and_skips_segments(tmp_path, monkeypatch):
+    log = ReviewLog(str(tmp_path), compress=False, flush_interval=0.01)
+    log.append(entry(0, role='Engineering Manager', level='m3'))
+    log.close()
+    log = ReviewLog(str(tmp_path), compress=False, flush_interval=0.01)
+    log.append(entry(1))
+    log.flush(timeout=5)
+    # Legacy one-file-per-review logs are still read
+    with open(tmp_path / 'old_software_engineer_senior.json', 'w') as f:
+        json.dump(entry(2, level='senior'), f)
+    opened = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda path, *a, **k: opened.append(str(path)) or real_open(path, *a, **k))
+    assert [e['user_info']['name'] for e in iter_entries(str(tmp_path), role='Software Engineer')] == ['R2', 'R1']
+    # The closed Engineering Manager segment was ruled out by its manifest alone
+    assert not [p for p in opened if p.endswith('.jsonl')
+                and os.path.exists(p + '.idx')]
+    assert [e['user_info']['name'] for e in iter_entries(str(tmp_path), level='m3')] == ['R0']
+    log.close()
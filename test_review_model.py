@@ -0,0 +1,86 @@
+import os
+import pytest
+from review_model import Review, level_definition, promotion_diff
+from role_registry import RoleRegistry
+
+ROLE_YAML = """
+level_map:
+  junior: IC1
+levels:
+  junior:
+    overview:
+      scope:
+        - "{name} does things."
+    craft:
+      quality:
+        - "{name} tests {pronouns[1]} code."
+        - "{name} reviews code."
+"""
+
+def test_level_definition_is_shared_and_ids_are_stable(tmp_path):
+    path = tmp_path / 'test_role.yaml'
+    path.write_text(ROLE_YAML, encoding='utf-8')
+    roles = RoleRegistry(str(tmp_path))
+    definition = level_definition('Test Role', 'junior', roles)
+    assert level_definition('Test Role', 'JUNIOR', roles) is definition
+    assert [b.section for b in definition.behaviors] == ['overview', 'craft', 'craft']
+    assert definition.items('Sam', ['they', 'their'])[1] == ('craft', 'quality', 'Sam tests their code.')
+    ids = [b.id for b in definition.behaviors]
+    path.write_text(ROLE_YAML.replace('quality:\n', 'quality:\n        - "{name} writes docs."\n'), encoding='utf-8')
+    os.utime(path, ns=(0, 10**18))
+    revised = level_definition('Test Role', 'junior', roles)
+    assert revised is not definition and len(revised) == 4
+    assert [revised.index_of(i) for i in ids] == [0, 2, 3]
+    with pytest.raises(ValueError):
+        level_definition('Test Role', 'senior', roles)
+
+def test_review_round_trip():
+    definition = level_definition('Software Engineer', 'junior')
+    ratings = [i % 3 for i in range(len(definition))]
+    review = Review('Sam', ['they', 'their'], 'Software Engineer', 'junior', ratings, {'overview': 'Good', 'craft': ''})
+    assert review.definition is definition
+    state = review.to_state()
+    assert state['comments'] == {'overview': 'Good'}
+    assert state['version'] == definition.version
+    restored = Review.from_state(state)
+    assert list(restored.ratings) == ratings
+    does_not_meet, meets, exceeds = restored.buckets()
+    assert sum(map(len, meets.values())) == ratings.count(1)
+    with pytest.raises(ValueError):
+        review.set_ratings([3] * len(definition))
+    with pytest.raises(ValueError):
+        review.set_ratings([1])
+    # Ratings are positional, so a state rated against another definition version is refused
+    with pytest.raises(ValueError, match='definition changed'):
+        Review.from_state(dict(state, version='older'))
+
+def test_promotion_diff(tmp_path):
+    (tmp_path / 'test_role.yaml').write_text("""
+level_map:
+  junior: IC1
+  senior: IC2
+  staff: IC3
+levels:
+  junior:
+    craft:
+      quality:
+        - "{name} tests {pronouns[1]} code."
+        - "{name} reviews code when asked."
+        - "{name} fixes bugs."
+  senior:
+    craft:
+      quality:
+        - "{name} tests {pronouns[1]} code."
+        - "{name} reviews code when asked and mentors others."
+        - "{name} sets the testing strategy."
+""", encoding='utf-8')
+    roles = RoleRegistry(str(tmp_path))
+    diff = promotion_diff('Test Role', 'junior', roles)
+    assert (diff.next_level, diff.unchanged, diff.dropped) == ('senior', 1, 1)
+    assert diff.render('Sam', ['they', 'their']) == {'craft': [
+        {'subsection': 'quality', 'kind': 'changed', 'text': 'Sam reviews code when asked and mentors others.',
+         'previous': 'Sam reviews code when asked.'},
+        {'subsection': 'quality', 'kind': 'added', 'text': 'Sam sets the testing strategy.', 'previous': None},
+    ]}
+    # staff has no behaviors, so senior is the top level
+    assert promotion_diff('Test Role', 'senior', roles) is None
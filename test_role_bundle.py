@@ -0,0 +1,64 @@
+import os
+import pytest
+from role_bundle import RoleValidationError, compile_bundle, validate_role
+from role_registry import RoleRegistry, DEFAULT_LEVEL_MAP
+
+ROLE_YAML = """
+level_map:
+  junior: IC1
+  senior: IC3
+levels:
+  junior:
+    overview:
+      scope:
+        - "{name} does things."
+        - "{name} shares {pronouns[1]} plans."
+"""
+
+@pytest.fixture
+def role_dir(tmp_path):
+    (tmp_path / 'test_role.yaml').write_text(ROLE_YAML, encoding='utf-8')
+    return tmp_path
+
+def test_validate_reports_errors_and_warnings():
+    data = {
+        'level_map': {'junior': 'IC1', 'senior': 'IC3'},
+        'levels': {
+            'junior': {'overview': {'scope': ["{name} does things."]}},
+            'staff': {'overview': {'scope': ["{name} owns {pronouns[2]} roadmap."]}},
+        },
+    }
+    errors, warnings = validate_role(data, 'test_role.yaml', DEFAULT_LEVEL_MAP)
+    assert any("'staff' has no entry in level_map" in e for e in errors)
+    assert any("{pronouns[2]}" in e for e in errors)
+    assert warnings == ["test_role.yaml: level 'senior' is in level_map but has no entry under levels"]
+
+def test_compile_rejects_invalid_roles(role_dir):
+    (role_dir / 'broken_role.yaml').write_text('levels:\n  junior:\n    overview:\n      scope: "{name}"\n')
+    with pytest.raises(RoleValidationError) as e:
+        compile_bundle(str(role_dir), DEFAULT_LEVEL_MAP)
+    assert 'expected a list of behaviors' in str(e.value)
+    assert not (role_dir / 'roles.bundle').exists()
+
+def test_registry_loads_bundle_and_falls_back_when_stale(role_dir):
+    yaml_view = RoleRegistry(str(role_dir)).render_level('Test Role', 'junior', 'Sam', ['they', 'their'])
+    compile_bundle(str(role_dir), DEFAULT_LEVEL_MAP)
+    reg = RoleRegistry(str(role_dir))
+    definition = reg.get('Test Role')
+    assert reg.stats()['bundle_loads'] == 1
+    assert reg.render_level('Test Role', 'junior', 'Sam', ['they', 'their']) == yaml_view
+    assert reg.level_map('Test Role') == {'junior': 'IC1'}
+
+    # Touched but unchanged: still served from the bundle
+    path = role_dir / 'test_role.yaml'
+    os.utime(path, ns=(0, definition.mtime_ns + 1_000_000))
+    reg.clear()
+    assert reg.get('Test Role').version == definition.version
+    assert reg.stats()['bundle_loads'] == 2
+
+    # Edited: parsed from YAML
+    path.write_text(ROLE_YAML.replace('does things', 'does more things'), encoding='utf-8')
+    os.utime(path, ns=(0, definition.mtime_ns + 2_000_000))
+    changed = reg.get('Test Role')
+    assert changed.levels['junior']['overview']['scope'][0] == "{name} does more things."
+    assert reg.stats()['bundle_loads'] == 2
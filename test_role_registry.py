@@ -0,0 +1,49 @@
+import os
+import pytest
+from role_registry import RoleRegistry, DEFAULT_LEVEL_MAP
+
+ROLE_YAML = """
+levels:
+  junior:
+    overview:
+      scope:
+        - "{name} does things."
+"""
+
+@pytest.fixture
+def role_dir(tmp_path):
+    (tmp_path / 'test_role.yaml').write_text(ROLE_YAML, encoding='utf-8')
+    return tmp_path
+
+def test_registry_caches_and_counts(role_dir):
+    reg = RoleRegistry(str(role_dir))
+    first = reg.get('Test Role')
+    second = reg.get('Test Role')
+    assert first is second
+    assert reg.stats()['misses'] == 1
+    assert reg.stats()['hits'] == 1
+    assert first.level_map == DEFAULT_LEVEL_MAP
+    assert first.levels['junior']['overview']['scope'] == ("{name} does things.",)
+    with pytest.raises(TypeError):
+        first.levels['senior'] = {}
+
+def test_registry_reloads_changed_file(role_dir):
+    reg = RoleRegistry(str(role_dir))
+    first = reg.get('Test Role')
+    path = role_dir / 'test_role.yaml'
+    path.write_text(ROLE_YAML.replace('does things', 'does more things'), encoding='utf-8')
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, first.mtime_ns + 1_000_000))
+    second = reg.get('Test Role')
+    assert second is not first
+    assert second.version != first.version
+    assert reg.stats()['reloads'] == 1
+
+def test_registry_lists_roles(role_dir):
+    reg = RoleRegistry(str(role_dir))
+    assert reg.list_roles() == ['Test Role']
+    (role_dir / 'other_role.yaml').write_text(ROLE_YAML, encoding='utf-8')
+    os.utime(role_dir, ns=(0, os.stat(role_dir).st_mtime_ns + 1_000_000))
+    assert reg.list_roles() == ['Other Role', 'Test Role']
+    with pytest.raises(FileNotFoundError):
+        reg.get('Missing Role')
@@ -0,0 +1,25 @@
+from session_index import SessionIndex
+
+def test_latest_and_list_are_per_reviewer(tmp_path):
+    index = SessionIndex(str(tmp_path / 'index.sqlite3'))
+    assert index.latest('alice') is None
+    index.save('alice', 'd1', {'user_info': {'name': 'Bob', 'role': 'Software Engineer', 'level': 'junior'}})
+    index.save('alice', 'd2', {'user_info': {'name': 'Cara', 'role': 'Software Engineer', 'level': 'senior'},
+                               'chatgpt_job_id': 'abc'})
+    index.save('zoe', 'd3', {'user_info': {'name': 'Dan', 'role': 'Engineering Manager', 'level': 'm3'}})
+    assert index.latest('alice') == {'user_info': {'name': 'Cara', 'role': 'Software Engineer', 'level': 'senior'}}
+    assert [d['draft_id'] for d in index.list_drafts('alice')] == ['d2', 'd1']
+    assert index.has_drafts('zoe') and not index.has_drafts('nobody')
+    # Updating an older draft makes it the latest
+    index.save('alice', 'd1', {'user_info': {'name': 'Bob', 'role': 'Software Engineer', 'level': 'junior'}, 'feedback': 'x'})
+    assert index.latest('alice')['feedback'] == 'x'
+    index.delete('alice', 'd1')
+    assert index.load('alice', 'd1') is None
+
+def test_old_drafts_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr('session_index.PRUNE_EVERY', 1)
+    index = SessionIndex(str(tmp_path / 'index.sqlite3'), max_age=3600)
+    index.save('alice', 'old', {'user_info': {'name': 'Bob'}})
+    index._conn().execute("UPDATE drafts SET updated_at = updated_at - 7200 WHERE draft_id = 'old'")
+    index.save('alice', 'new', {'user_info': {'name': 'Cara'}})
+    assert index.load('alice', 'old') is None and index.load('alice', 'new') is not None
@@ -0,0 +1,100 @@
+import os
+import threading
+import pytest
+from flask import Flask, session
+import shared_store
+from narrative_cache import NarrativeCache
+from narrative_jobs import DONE, NarrativeJobQueue, StoredJob
+from session_store import StoreSessionInterface, load_secret_key
+from shared_store import open_store
+
+@pytest.mark.parametrize('backend', ['filesystem', 'sqlite'])
+def test_store_expires_and_sweeps(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(shared_store, 'SWEEP_EVERY', 1)
+    store = open_store(f'{backend}://{tmp_path}', 'sessions')
+    store.set('a', b'one', 3600)
+    store.set('b', b'two', -1)
+    assert store.get('a') == b'one' and store.get('b') is None
+    store.delete('a')
+    assert store.get('a') is None
+    # Expired entries are removed by later writes without being read
+    for i in range(300):
+        store.set(f'old-{i}', b'x', -1)
+    store.set('c', b'three', 3600)
+    if backend == 'sqlite':
+        assert store._conn().execute('SELECT COUNT(*) FROM kv').fetchone()[0] < 300
+    else:
+        assert sum(len(files) for _, _, files in os.walk(tmp_path / 'sessions')) < 300
+    with pytest.raises(ValueError):
+        open_store('memcached://localhost', 'sessions')
+
+def test_sessions_survive_workers_and_restarts(tmp_path, monkeypatch):
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    # Workers starting together all end up with the one key on disk
+    keys = []
+    threads = [threading.Thread(target=lambda: keys.append(load_secret_key(str(tmp_path / 'secret_key'))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    key = load_secret_key(str(tmp_path / 'secret_key'))
+    assert set(keys) == {key} and len(keys) == 8
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.secret_key-')]
+
+    def make_app():
+        # A separate app per worker, sharing only the store and the key file
+        app = Flask(__name__)
+        app.secret_key = load_secret_key(str(tmp_path / 'secret_key'))
+        app.session_interface = StoreSessionInterface(open_store(f'sqlite://{tmp_path}', 'sessions'))
+        app.add_url_rule('/set', 'set', lambda: session.update(review={'ratings': '012'}, pronouns=('they', 'their')) or '')
+        app.add_url_rule('/get', 'get', lambda: repr(sorted(session.items())))
+        app.add_url_rule('/clear', 'clear', lambda: session.clear() or '')
+        return app
+
+    first, second = make_app().test_client(), make_app()
+    assert 'Set-Cookie' not in first.get('/get').headers
+    first.get('/set')
+    cookie = first.get_cookie('session')
+    client = second.test_client()
+    client.set_cookie('session', cookie.value)
+    assert client.get('/get').data == b"[('pronouns', ('they', 'their')), ('review', {'ratings': '012'})]"
+    client.set_cookie('session', cookie.value[:-2] + 'xx')
+    assert client.get('/get').data == b'[]'
+    client.set_cookie('session', cookie.value)
+    client.get('/clear')
+    assert first.get('/get').data == b'[]'
+
+def test_narrative_cache_on_shared_store(tmp_path):
+    store = open_store(f'sqlite://{tmp_path}', 'narratives')
+    NarrativeCache(str(tmp_path / 'unused'), store=store).put('gpt-4o', 'system', 'feedback', 'Narrative')
+    cache = NarrativeCache(str(tmp_path / 'unused'), store=store)
+    assert cache.get('gpt-4o', 'system', 'feedback') == 'Narrative'
+    assert cache.get('gpt-4o', 'system', 'other') is None and cache.stats()['hits'] == 1
+    assert not os.path.exists(tmp_path / 'unused')
+
+def test_narrative_jobs_are_visible_to_other_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr('narrative_jobs.PUBLISH_EVERY', 0.05)
+    release = threading.Event()
+
+    def runner(payload, on_text):
+        on_text('Sam ')
+        release.wait(5)
+        on_text('delivers.')
+        return {'chatgpt_result': 'Sam delivers.', 'chatgpt_cached': False}
+
+    # Two workers sharing only the store; the job runs on the first
+    first = NarrativeJobQueue(runner, store=open_store(f'sqlite://{tmp_path}', 'narrative_jobs'))
+    second = NarrativeJobQueue(runner, store=open_store(f'sqlite://{tmp_path}', 'narrative_jobs'))
+    job_id = first.submit({}, stream=True)
+    job = second.get(job_id)
+    assert isinstance(job, StoredJob) and job.stream and not job.finished
+    chunks = job.follow(heartbeat=1.0)
+    assert next(chunks) == 'Sam '
+    release.set()
+    assert ''.join(c for c in chunks if c) == 'delivers.'
+    assert job.status == DONE and job.result['chatgpt_result'] == 'Sam delivers.'
+    assert second.stats()['completed'] == 0
+    second.discard(job_id)
+    assert second.get(job_id) is None
+    first.shutdown()
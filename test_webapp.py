@@ -68,3 +68,344 @@ def test_chatgpt_results_route(client, monkeypatch):
     assert rv.status_code == 200
     assert b"LLM summary here." in rv.data
     assert b"Feedback Summary" in rv.data
+
+def test_chatgpt_results_uses_background_job(client, monkeypatch):
+    from webapp import narrative_jobs
+    monkeypatch.setitem(app.config, 'STREAM_NARRATIVES', False)
+    monkeypatch.setattr(narrative_jobs, 'runner', 
+                        lambda chatgpt_input: {'chatgpt_result': f"Narrative for {chatgpt_input['name']}", 'chatgpt_cached': False})
+    monkeypatch.setattr('webapp.write_review_log', lambda *args: None)
+    with client.session_transaction() as sess:
+        sess['summary'] = {'exceeds': {}, 'meets': {}, 'does_not_meet': {}, 'comments': {}, 'user': {}}
+        sess['chatgpt_input'] = {
+            'name': 'Test User',
+            'pronouns': ['they', 'their'],
+            'role': 'Software Engineer',
+            'level': 'junior',
+            'exceeds': {}, 'meets': {}, 'does_not_meet': {}, 'comments': {}
+        }
+    rv = client.get('/chatgpt_results')
+    assert b"Generating summary" in rv.data
+    with client.session_transaction() as sess:
+        job_id = sess['chatgpt_job_id']
+    narrative_jobs.wait(job_id, timeout=5)
+    assert client.get(f'/chatgpt_status/{job_id}').get_json() == {'status': 'done'}
+    rv = client.get('/chatgpt_results')
+    assert b"Narrative for Test User" in rv.data
+    assert client.get('/chatgpt_jobs').get_json()['completed'] >= 1
+
+def test_download_streams_review(client):
+    import json
+    with client.session_transaction() as sess:
+        sess['chatgpt_result'] = 'LLM summary here.'
+        sess['chatgpt_input'] = {
+            'name': 'Test User',
+            'pronouns': ['they', 'their'],
+            'role': 'Software Engineer',
+            'level': 'junior',
+            'exceeds': {'craft': ['Writes clear code.']}, 'meets': {}, 'does_not_meet': {},
+            'comments': {'craft': 'Great reviews.', 'culture': ''},
+        }
+    rv = client.get('/download/json')
+    assert rv.status_code == 200
+    assert 'test_user_software_engineer_junior.json' in rv.headers['Content-Disposition']
+    doc = json.loads(rv.data)
+    assert doc['ratings']['exceeds'] == {'craft': ['Writes clear code.']}
+    assert doc['comments'] == {'craft': 'Great reviews.'}
+    assert doc['narrative'] == 'LLM summary here.'
+    rv = client.get('/download/text')
+    assert b"OVER PERFORMING:\ncraft\n- Writes clear code." in rv.data
+    assert b"craft: Great reviews." in rv.data
+    assert client.get('/download/pdf').status_code == 404
+
+def test_resume_restores_own_latest_draft(client, monkeypatch, tmp_path):
+    from session_index import SessionIndex
+    monkeypatch.setattr('webapp.session_index', SessionIndex(str(tmp_path / 'index.sqlite3')))
+    client.post('/', data={
+        'name': 'Draft User',
+        'pronoun_subject': 'they',
+        'pronoun_possessive': 'their',
+        'role': 'Software Engineer',
+        'level': 'junior',
+    })
+    assert b"Resume Last Session" in client.get('/').data
+    assert client.get('/drafts').get_json()[0]['name'] == 'Draft User'
+    with client.session_transaction() as sess:
+        sess.clear()
+    rv = client.post('/resume', follow_redirects=True)
+    assert b"Draft User" in rv.data
+    # A different reviewer does not see the draft
+    other = app.test_client()
+    assert b"Resume Last Session" not in other.get('/').data
+
+def test_autosave_draft_then_finalize(client):
+    client.post('/', data={
+        'name': 'Test User',
+        'pronoun_subject': 'they',
+        'pronoun_possessive': 'their',
+        'role': 'Engineering Manager',
+        'level': 'm3',
+    })
+    client.get('/feedback')
+    with client.session_transaction() as sess:
+        size = sess['draft']['size']
+    ratings = {str(i): 2 if i == 0 else 1 for i in range(size)}
+    assert client.post('/feedback/draft', json={'seq': 1, 'ratings': ratings}).get_json() == {'seq': 1}
+    assert client.post('/feedback/draft', json={'seq': 2, 'comments': {'overview': 'Strong start'}}).status_code == 200
+    assert client.post('/feedback/draft', json={'seq': 3, 'ratings': {str(size): 1}}).status_code == 400
+    assert client.post('/feedback/draft', json={'seq': 3, 'comments': {'nope': 'x'}}).status_code == 400
+    assert client.post('/feedback/draft', json={'ratings': {'0': 1}}).status_code == 400
+    assert client.post('/feedback/draft', json={'seq': 3, 'ratings': {'0': True}}).status_code == 400
+    assert client.post('/feedback/draft', json={'seq': True, 'ratings': {'0': 1}}).status_code == 400
+    # A late batch older than the last one applied changes nothing
+    rv = client.post('/feedback/draft', json={'seq': 1, 'ratings': {'0': 0}, 'comments': {'overview': 'Old'}})
+    assert rv.get_json() == {'seq': 2, 'stale': True}
+    # Reloading the form restores the autosaved state
+    rv = client.get('/feedback')
+    assert b'value="2" checked' in rv.data
+    assert b"Strong start" in rv.data
+    assert b"var seq = 2;" in rv.data
+    # Final submit only needs to finalize the draft
+    rv = client.post('/feedback', data={})
+    assert rv.status_code == 302
+    with client.session_transaction() as sess:
+        assert sess['review']['comments'] == {'overview': 'Strong start'}
+        assert sess['review']['ratings'] == '2' + '1' * (size - 1)
+
+def test_legacy_session_is_migrated_to_compact_ratings(client):
+    from webapp import PerformanceReviewGenerator
+    gen = PerformanceReviewGenerator(name='Test User', pronouns=['they', 'their'], role='Engineering Manager', level='m3')
+    gen.apply_ratings([1] * len(gen.behavior_items()), {'overview': 'Solid'})
+    legacy_input = dict(name='Test User', pronouns=['they', 'their'], role='Engineering Manager', level='m3',
+                        exceeds=gen.exceeds_list, meets=gen.meets_list, does_not_meet=gen.does_not_meet_list,
+                        comments={'overview': 'Solid'})
+    with client.session_transaction() as sess:
+        sess['chatgpt_result'] = 'LLM summary here.'
+        sess['chatgpt_input'] = legacy_input
+        sess['summary'] = {'exceeds': {}, 'meets': gen.meets_list, 'does_not_meet': {}, 'comments': {}, 'user': {}}
+        sess['feedback'] = 'full text'
+    rv = client.get('/chatgpt_results')
+    assert b"LLM summary here." in rv.data
+    assert gen.meets_list['overview'][0].encode() in rv.data
+    with client.session_transaction() as sess:
+        assert 'chatgpt_input' not in sess and 'summary' not in sess and 'feedback' not in sess
+        assert sess['review']['ratings'] == '1' * len(gen.behavior_items())
+
+def test_metrics_endpoint_reports_phases_and_routes(client):
+    client.post('/', data={'name': 'Test User', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Software Engineer', 'level': 'junior'})
+    client.get('/feedback')
+    rv = client.get('/metrics')
+    assert rv.status_code == 200
+    assert rv.mimetype == 'text/plain'
+    text = rv.get_data(as_text=True)
+    assert '# TYPE review_request_seconds histogram' in text
+    assert 'review_request_seconds_count{route="/feedback",method="GET",status="200"}' in text
+    for phase in ('template_render', 'session_save', 'session_load'):
+        assert f'review_phase_seconds_count{{phase="{phase}"}}' in text
+
+def test_streamed_narrative_is_relayed_and_persisted(client, monkeypatch):
+    import threading
+    from webapp import narrative_jobs
+    release = threading.Event()
+
+    def runner(review, on_text=None):
+        on_text('First part. ')
+        release.wait(5)
+        on_text('Second part.')
+        return {'chatgpt_result': 'First part. Second part.', 'chatgpt_cached': False}
+
+    logged = []
+    monkeypatch.setitem(app.config, 'STREAM_NARRATIVES', True)
+    monkeypatch.setattr(narrative_jobs, 'runner', runner)
+    monkeypatch.setattr('webapp.write_review_log', lambda *args: logged.append(args))
+    client.post('/', data={'name': 'Test User', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Software Engineer', 'level': 'junior'})
+    client.get('/feedback')
+    with client.session_transaction() as sess:
+        size = sess['draft']['size']
+    client.post('/feedback', data={f'rating_{i}': '1' for i in range(size)})
+    # The results page renders straight away and subscribes to the stream
+    rv = client.get('/chatgpt_results')
+    assert b'EventSource' in rv.data and b'Writing narrative' in rv.data
+    with client.session_transaction() as sess:
+        job_id = sess['chatgpt_job_id']
+    assert client.post(f'/chatgpt_finish/{job_id}').status_code == 409
+    rv = client.get(f'/chatgpt_stream/{job_id}', buffered=False)
+    assert rv.mimetype == 'text/event-stream'
+    events = iter(rv.response)
+    # The first part arrives while the job is still running
+    assert next(events) == b'data: "First part. "\n\n'
+    release.set()
+    body = b''.join(events).decode()
+    assert body.index('data: "Second part."') < body.index('event: done')
+    rv.close()
+    assert client.post(f'/chatgpt_finish/{job_id}').get_json() == {'status': 'done'}
+    assert len(logged) == 1
+    with client.session_transaction() as sess:
+        assert sess['chatgpt_result'] == 'First part. Second part.'
+        assert 'chatgpt_job_id' not in sess
+    assert client.get(f'/chatgpt_stream/{job_id}').status_code == 404
+
+def test_late_narrative_shows_local_draft_then_upgrades(client, monkeypatch):
+    import threading
+    from webapp import narrative_jobs
+    release = threading.Event()
+
+    def runner(review, on_text=None):
+        release.wait(5)
+        if on_text:
+            on_text('The real narrative.')
+        return {'chatgpt_result': 'The real narrative.', 'chatgpt_cached': False}
+
+    monkeypatch.setitem(app.config, 'NARRATIVE_FALLBACK_AFTER', 0)
+    monkeypatch.setattr(narrative_jobs, 'runner', runner)
+    monkeypatch.setattr('webapp.write_review_log', lambda *args: None)
+    client.post('/', data={'name': 'Test User', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Software Engineer', 'level': 'junior'})
+    client.get('/feedback')
+    with client.session_transaction() as sess:
+        size = sess['draft']['size']
+    client.post('/feedback', data={f'rating_{i}': '1' for i in range(size)})
+
+    # Polling mode: past the deadline the results page shows the labelled local draft
+    monkeypatch.setitem(app.config, 'STREAM_NARRATIVES', False)
+    rv = client.get('/chatgpt_results')
+    assert b"Draft generated locally" in rv.data and b"What are their biggest challenges?" in rv.data
+    with client.session_transaction() as sess:
+        job_id = sess['chatgpt_job_id']
+        assert 'chatgpt_result' not in sess
+    release.set()
+    narrative_jobs.wait(job_id, timeout=5)
+    rv = client.get('/chatgpt_results')
+    assert b"The real narrative." in rv.data and b"Draft generated locally" not in rv.data
+
+    # Streaming mode: the draft arrives as a fallback event, then the real text replaces it
+    release.clear()
+    monkeypatch.setitem(app.config, 'STREAM_NARRATIVES', True)
+    client.get('/chatgpt_results?refresh=1')
+    with client.session_transaction() as sess:
+        job_id = sess['chatgpt_job_id']
+    rv = client.get(f'/chatgpt_stream/{job_id}', buffered=False)
+    events = iter(rv.response)
+    assert next(events).startswith(b'event: fallback\ndata: "[Draft generated locally')
+    release.set()
+    body = b''.join(events).decode()
+    assert 'data: "The real narrative."' in body and '"fallback": false' in body
+    rv.close()
+
+def test_calibration_page(client, monkeypatch, tmp_path):
+    pytest.importorskip('numpy')
+    from calibration import CalibrationStore, behavior_layout
+    from review_log import ReviewLog
+    from role_registry import registry
+    log = ReviewLog(str(tmp_path), flush_interval=0.01)
+    version = registry.get('Engineering Manager').version
+    width = len(behavior_layout('Engineering Manager', 'm3')[2])
+    log.append({'timestamp': '2026-10-01T09:00:00', 'reviewer': 'abc', 'user_info': {},
+                'review': {'role': 'Engineering Manager', 'level': 'm3', 'version': version, 'ratings': '1' * width}})
+    log.close()
+    monkeypatch.setattr('calibration.calibration_store', CalibrationStore(str(tmp_path)))
+    rv = client.get('/calibration')
+    assert rv.status_code == 200
+    assert b'Engineering Manager (m3) - 1 reviews' in rv.data
+    data = client.get('/calibration?format=json&group=Engineering Manager|m3').get_json()
+    assert data['report']['overall']['meets'] == 1.0
+
+def test_search(client):
+    data = client.get('/search?q=on-call&format=json').get_json()
+    assert data['results'] and all('call' in hit['text'].lower() for hit in data['results'])
+    rv = client.get('/search?q=mentor&role=Software Engineer')
+    assert rv.status_code == 200
+    assert b'mentor' in rv.data
+
+def test_promotion_view(client):
+    client.post('/', data={'name': 'Sam', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Software Engineer', 'level': 'senior'})
+    rv = client.get('/feedback')
+    assert b'Show what changes at Tech lead' in rv.data
+    rv = client.get('/feedback?promotion=1')
+    assert b'At Tech lead' in rv.data
+    client.post('/', data={'name': 'Sam', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Engineering Manager', 'level': 'm3'})
+    assert b'At M4' not in client.get('/feedback').data
+
+def test_export(client, monkeypatch, tmp_path):
+    import io
+    import zipfile
+    from review_log import ReviewLog
+    log = ReviewLog(str(tmp_path), flush_interval=0.01)
+    for level in ('senior', 'junior'):
+        log.append({'timestamp': '2026-10-01T09:00:00', 'chatgpt_result': 'Great year',
+                    'user_info': {'name': 'Sam', 'role': 'Software Engineer', 'level': level,
+                                  'exceeds': {}, 'meets': {}, 'does_not_meet': {}, 'comments': {}}})
+    monkeypatch.setattr('webapp.review_log', log)
+    rv = client.get('/export?level=senior&format=text&format=json')
+    assert rv.status_code == 200 and rv.mimetype == 'application/zip'
+    assert 'reviews_senior_' in rv.headers['Content-Disposition']
+    with zipfile.ZipFile(io.BytesIO(rv.data)) as z:
+        assert len(z.namelist()) == 2 and b'Great year' in z.read(z.namelist()[0])
+    assert client.get('/export?archive=rar').status_code == 400
+    log.close()
+
+def test_reordered_role_definition_invalidates_stored_ratings(client, monkeypatch, tmp_path):
+    import os
+    from review_state import StaleReviewError, materialize
+    from role_registry import registry
+    path = tmp_path / 'test_role.yaml'
+    role_yaml = 'level_map:\n  junior: IC1\nlevels:\n  junior:\n    craft:\n      quality:\n        - "{name} writes tests."\n        - "{name} ships bugs."\n'
+    path.write_text(role_yaml, encoding='utf-8')
+    monkeypatch.setattr(registry, 'role_dir', str(tmp_path))
+    monkeypatch.setattr(registry, '_roles', None)
+    client.post('/', data={'name': 'A', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Test Role', 'level': 'junior'})
+    client.get('/feedback')
+    client.post('/feedback', data={'rating_0': '2', 'rating_1': '0'})
+    with client.session_transaction() as sess:
+        state = sess['review']
+    assert materialize(state)['exceeds'] == {'craft': ['A writes tests.']}
+    # Same number of behaviors, different order: the stored ratings no longer apply
+    path.write_text(role_yaml.replace('writes tests', 'TMP').replace('ships bugs', 'writes tests').replace('TMP', 'ships bugs'),
+                    encoding='utf-8')
+    os.utime(path, ns=(0, 10**18))
+    with pytest.raises(StaleReviewError):
+        materialize(state)
+    rv = client.get('/chatgpt_results')
+    assert rv.status_code == 302 and rv.location.endswith('/feedback')
+    # The form starts over instead of carrying the ratings onto the swapped behaviors
+    assert b' checked' not in client.get('/feedback').data
+
+def test_narrative_is_kept_when_stream_is_abandoned(client, monkeypatch, tmp_path):
+    from session_index import SessionIndex
+    from webapp import narrative_jobs
+    logged = []
+    monkeypatch.setitem(app.config, 'STREAM_NARRATIVES', True)
+    monkeypatch.setattr('webapp.session_index', SessionIndex(str(tmp_path / 'index.sqlite3')))
+    monkeypatch.setattr(narrative_jobs, 'runner',
+                        lambda review, on_text=None: {'chatgpt_result': 'Kept narrative.', 'chatgpt_cached': False})
+    monkeypatch.setattr('webapp.write_review_log', lambda *args: logged.append(args))
+    client.post('/', data={'name': 'Test User', 'pronoun_subject': 'they', 'pronoun_possessive': 'their',
+                           'role': 'Software Engineer', 'level': 'junior'})
+    client.get('/feedback')
+    with client.session_transaction() as sess:
+        size = sess['draft']['size']
+    client.post('/feedback', data={f'rating_{i}': '1' for i in range(size)})
+    client.get('/chatgpt_results')
+    with client.session_transaction() as sess:
+        job_id = sess['chatgpt_job_id']
+    # The tab closes: no stream is read and /chatgpt_finish is never posted
+    narrative_jobs.wait(job_id, timeout=5)
+    assert len(logged) == 1 and logged[0][2] == 'Kept narrative.' and logged[0][5]
+    narrative_jobs.discard(job_id)
+    rv = client.get('/chatgpt_results')
+    assert b'Kept narrative.' in rv.data and len(logged) == 1
+
+def test_narrative_job_is_not_finished_until_on_done_returns():
+    from narrative_jobs import DONE, RUNNING, NarrativeJobQueue
+    seen = []
+    queue = NarrativeJobQueue(lambda payload: {'chatgpt_result': 'Text.'},
+                              on_done=lambda job: seen.append((job.status, job.finished)))
+    job = queue.wait(queue.submit({}), timeout=5)
+    # /chatgpt_status and streams only report the job done once its narrative has been kept
+    assert seen == [(RUNNING, False)] and job.status == DONE
+    queue.shutdown()
@@ -1,56 +1,131 @@
+import datetime
+import json
 import os
-import yaml
-from flask import Flask, render_template, request, redirect, url_for, session
-from flask_session import Session
+import time
+import uuid
+import flask
+from flask import Flask, Response, abort, g, jsonify, request, redirect, session, stream_with_context, url_for
 from performance_review_generator import PerformanceReviewGenerator, DEFAULT_LEVEL_MAP
-from resume_session_utils import get_latest_session_file, load_session_data
+from review_model import level_definition, promotion_diff
+from role_registry import registry
+from behavior_search import behavior_index
+from bulk_export import ARCHIVES, export_filename, iter_archive, select_entries
+from narrative_jobs import NarrativeJobQueue, QueueFullError, PENDING, FAILED
+from narrative_engine import NarrativeEngine
+from feedback_renderer import FORMATS, build_document, iter_render
+from fallback_narrative import build_fallback_narrative
+from session_index import session_index
+from session_store import init_app as init_sessions
+from shared_store import open_store
+from review_log import review_log
+from metrics import init_app as init_metrics, metrics
+from review_state import (LEGACY_KEYS, StaleReviewError, build_generator, decode_ratings, load_review,
+                          make_review_state, materialize, summary_for)
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
 
-# Configure server-side session (filesystem-based by default)
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(os.path.dirname(__file__), 'flask_session')
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
-Session(app)
+# Stable secret key (SECRET_KEY, else one kept in flask_session/secret_key) and server-side
+# sessions shared by all workers on SESSION_STORE: filesystem (default), sqlite, shm or redis://
+init_sessions(app)
+# Route latency, session timing and /metrics (set METRICS_ENABLED=0 to disable)
+init_metrics(app)
+
+# Long-lived cookie identifying the reviewer, so /resume only sees their own drafts
+REVIEWER_COOKIE = 'reviewer_id'
+REVIEWER_COOKIE_MAX_AGE = 365 * 24 * 3600
+
+# Session keys describing the review in progress; cleared when a new review starts
+REVIEW_KEYS = ('review', 'chatgpt_result', 'chatgpt_cached', 'chatgpt_job_id', 'draft') + LEGACY_KEYS
+
+# Longest section comment accepted by the autosave endpoint
+MAX_COMMENT_LENGTH = 5000
+
+# Seconds between keep-alive comments on an idle narrative stream
+SSE_KEEPALIVE = 15
+
+# Stream narratives to the results page as they are written instead of showing a spinner
+app.config['STREAM_NARRATIVES'] = os.environ.get('STREAM_NARRATIVES', '1') != '0'
+
+# Write the narrative one section at a time, so a revised review only regenerates the sections that changed.
+# Off by default: a first review then costs one request per section instead of one in all
+app.config['SECTIONED_NARRATIVES'] = os.environ.get('SECTIONED_NARRATIVES', '0') != '0'
+
+# Seconds to wait for the ChatGPT narrative before showing a locally built draft in its place
+app.config['NARRATIVE_FALLBACK_AFTER'] = float(os.environ.get('NARRATIVE_FALLBACK_AFTER', 20))
+
+
+def render_template(template_name, **context):
+    with metrics.phase('template_render'):
+        return flask.render_template(template_name, **context)
+
+
+def get_reviewer_id():
+    if 'reviewer_id' not in g:
+        g.reviewer_id = request.cookies.get(REVIEWER_COOKIE) or uuid.uuid4().hex
+    return g.reviewer_id
+
+
+@app.after_request
+def set_reviewer_cookie(response):
+    reviewer_id = get_reviewer_id()
+    if request.cookies.get(REVIEWER_COOKIE) != reviewer_id:
+        response.set_cookie(REVIEWER_COOKIE, reviewer_id, max_age=REVIEWER_COOKIE_MAX_AGE,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def save_draft():
+    # Keep the reviewer's draft index in step with their session; called by the routes that change the draft
+    if not (session.get('draft_id') and session.get('user_info')):
+        return
+    try:
+        with metrics.phase('draft_index_save'):
+            session_index.save(get_reviewer_id(), session['draft_id'], dict(session))
+    except Exception as e:
+        print(f'Could not save draft: {e}')
+
+
+def restore_draft(data):
+    # Restore all keys from the loaded draft into the current session
+    for k in REVIEW_KEYS:
+        session.pop(k, None)
+    for k, v in data.items():
+        session[k] = v
+    save_draft()
+    if session.get('review') or session.get('chatgpt_input'):
+        return redirect(url_for('chatgpt_results'))
+    return redirect(url_for('feedback'))
+
 
 # Resume last session route
 @app.route('/resume', methods=['POST'])
 def resume():
-    session_file = get_latest_session_file()
-    if not session_file:
+    data = session_index.latest(get_reviewer_id())
+    if not data:
         return redirect(url_for('index'))
-    data = load_session_data(session_file)
-    # Restore all keys from the loaded session into the current session
-    for k, v in data.items():
-        session[k] = v
-    return redirect(url_for('chatgpt_results'))
+    return restore_draft(data)
+
+
+@app.route('/resume/<draft_id>', methods=['POST'])
+def resume_draft(draft_id):
+    data = session_index.load(get_reviewer_id(), draft_id)
+    if not data:
+        return redirect(url_for('index'))
+    return restore_draft(data)
+
+
+@app.route('/drafts')
+def drafts():
+    return jsonify(session_index.list_drafts(get_reviewer_id()))
 
 # Utility to get available roles from YAML files
 def get_available_roles():
-    role_dir = os.path.join(os.path.dirname(__file__), 'role_definitions')
-    roles = []
-    for fname in os.listdir(role_dir):
-        if fname.endswith('.yaml'):
-            roles.append(fname.replace('.yaml', '').replace('_', ' ').title())
-    return sorted(roles)
+    return registry.list_roles()
 
 # Get the appropriate level map for a specific role
 def get_level_map_for_role(role):
-    yaml_path = os.path.join(os.path.dirname(__file__), 'role_definitions', 
-                          f"{role.lower().replace(' ', '_')}.yaml")
-    if not os.path.exists(yaml_path):
-        return DEFAULT_LEVEL_MAP
-    
-    try:
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-        
-        # Return the role-specific level map or default if not found
-        return data.get('level_map', DEFAULT_LEVEL_MAP)
-    except Exception:
-        return DEFAULT_LEVEL_MAP
+    # Return the role-specific level map or default if not found
+    return registry.level_map(role, DEFAULT_LEVEL_MAP)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -61,8 +136,9 @@ def index():
     level_map = get_level_map_for_role(selected_role)
     levels = list(level_map.keys())
     
-    # Check if there is a resumable session file
-    resume_available = get_latest_session_file() is not None
+    # List this reviewer's resumable drafts (an indexed lookup)
+    reviewer_drafts = session_index.list_drafts(get_reviewer_id(), limit=5)
+    resume_available = bool(reviewer_drafts)
     
     if request.method == 'POST':
         name = request.form['name']
@@ -78,143 +154,503 @@ def index():
             # If not valid, default to the first level available for this role
             level = next(iter(role_level_map.keys()), '')
             
+        # Start a fresh draft for the new review
+        for k in REVIEW_KEYS:
+            session.pop(k, None)
+        session['draft_id'] = uuid.uuid4().hex
         session['user_info'] = dict(name=name, pronouns=pronouns, role=role, level=level)
+        save_draft()
         return redirect(url_for('feedback'))
     
     return render_template('index.html', roles=roles, levels=levels, 
-                           selected_role=selected_role, resume_available=resume_available)
+                           selected_role=selected_role, resume_available=resume_available,
+                           drafts=reviewer_drafts)
+
+def promotion_context(reviewee, summary=None):
+    """
+    Next-level expectations for the promotion-readiness view, or None at a role's top level.
+    ``?promotion=1`` or ``0`` switches the view on or off for the rest of the session.
+    """
+    if 'promotion' in request.args:
+        session['promotion'] = request.args['promotion'] == '1'
+    try:
+        diff = promotion_diff(reviewee['role'], reviewee['level'])
+    except (KeyError, ValueError, FileNotFoundError):
+        return None
+    if diff is None:
+        return None
+    enabled = session.get('promotion', False)
+    context = dict(next_level=diff.next_level, next_ic_level=diff.next_ic_level, enabled=enabled,
+                   unchanged=diff.unchanged, sections={}, readiness={})
+    if enabled:
+        # Only the added and changed behaviors are rendered
+        context['sections'] = diff.render(reviewee['name'], reviewee['pronouns'])
+        for section in (summary or {}).get('exceeds', {}):
+            rated = sum(len(summary[k].get(section, ())) for k in ('exceeds', 'meets', 'does_not_meet'))
+            if rated:
+                context['readiness'][section] = len(summary['exceeds'][section]) / rated
+    return context
+
 
 @app.route('/feedback', methods=['GET', 'POST'])
 def feedback():
     user_info = session.get('user_info')
     if not user_info:
         return redirect(url_for('index'))
-    # Generate responsibilities from YAML
-    generator = PerformanceReviewGenerator(
-        name=user_info['name'],
-        pronouns=user_info['pronouns'],
-        role=user_info['role'],
-        level=user_info['level'],
-        get_chatgpt_feedback=False,
-    )
-    # Flatten for form rendering
-    items = []
-    section_order = []
-    for section, subs in generator.responsibilities.items():
-        for subsection, behaviors in subs.items():
-            for behavior in behaviors:
-                items.append((section, subsection, behavior))
-        section_order.append(section)
-    # Ensure 'overview' is first, then rest sorted
-    if 'overview' in section_order:
-        sections = ['overview'] + sorted([s for s in set(section_order) if s != 'overview'])
-    else:
-        sections = sorted(set(section_order))
+    # Shared per role level; only the behavior text is specific to the reviewee
+    definition = level_definition(user_info['role'], user_info['level'])
+    items = definition.items(user_info['name'], user_info['pronouns'])
+    sections = list(definition.sections)
+    draft = session.get('draft')
+    # Ratings are stored by position, so they only carry over within one version of the definition
+    draft_key = [user_info['role'], user_info['level'], definition.version]
+    if not draft or draft.get('key') != draft_key or draft.get('size') != len(items):
+        # Autosaved changes are applied against this; see feedback_draft()
+        draft = session['draft'] = dict(key=draft_key, size=len(items), sections=sections, ratings={}, comments={})
+        review = session.get('review')
+        if review and review.get('version') == definition.version and len(review['ratings']) == len(items):
+            # Revising a finished review: start from its ratings
+            draft['ratings'] = {str(i): r for i, r in enumerate(decode_ratings(review['ratings']))}
+            draft['comments'] = dict(review['comments'])
     if request.method == 'POST':
-        ratings = {}
+        # Form fields win; anything missing comes from the autosaved draft
+        ratings = []
+        for i in range(len(items)):
+            value = request.form.get(f'rating_{i}', draft['ratings'].get(str(i)))
+            if value is None:
+                abort(400)
+            ratings.append(value)
         comments = {}
-        for i, (section, subsection, behavior) in enumerate(items):
-            key = f'rating_{i}'
-            ratings[(section, subsection, behavior)] = int(request.form[key])
         for section in sections:
-            comments[section] = request.form.get(f'comment_{section}', '').strip()
-        # Fill feedback lists based on ratings
-        generator.exceeds_list = {}
-        generator.meets_list = {}
-        generator.does_not_meet_list = {}
-        for (section, subsection, behavior), rating in ratings.items():
-            if rating == 0:
-                generator.does_not_meet_list.setdefault(section, []).append(behavior)
-            elif rating == 1:
-                generator.meets_list.setdefault(section, []).append(behavior)
-            elif rating == 2:
-                generator.exceeds_list.setdefault(section, []).append(behavior)
-        # Set section comments
-        generator.section_comments = comments
-        generator.give_feedback()
-        # Prepare detailed summary for results
-        summary = {
-            'exceeds': generator.exceeds_list,
-            'meets': generator.meets_list,
-            'does_not_meet': generator.does_not_meet_list,
-            'comments': comments,
-            'user': user_info,
-        }
-        session['feedback'] = generator.feedback
-        session['summary'] = summary
-        # Store generator state for ChatGPT feedback
-        session['chatgpt_input'] = dict(
-            name=user_info['name'],
-            pronouns=user_info['pronouns'],
-            role=user_info['role'],
-            level=user_info['level'],
-            exceeds=generator.exceeds_list,
-            meets=generator.meets_list,
-            does_not_meet=generator.does_not_meet_list,
-            comments=comments,
-        )
+            comments[section] = request.form.get(f'comment_{section}', draft['comments'].get(section, '')).strip()
+        # Store ratings compactly; behavior text is re-materialized when needed
+        try:
+            session['review'] = make_review_state(user_info, [int(r) for r in ratings], comments)
+        except ValueError:
+            abort(400)
+        for k in LEGACY_KEYS + ('draft',):
+            session.pop(k, None)
+        # Any earlier narrative was for the previous ratings
+        for k in ('chatgpt_result', 'chatgpt_cached', 'chatgpt_job_id'):
+            session.pop(k, None)
+        save_draft()
         return redirect(url_for('chatgpt_results'))
-    return render_template('feedback.html', items=items, user=user_info, sections=sections)
+    return render_template('feedback.html', items=items, user=user_info, sections=sections,
+                           draft_ratings=draft['ratings'], draft_comments=draft['comments'],
+                           draft_seq=draft.get('seq', 0),
+                           promotion=promotion_context(user_info))
+
+
+@app.route('/feedback/draft', methods=['POST'])
+def feedback_draft():
+    """
+    Autosaves a batch of rating and comment changes into the server-side draft.
+
+    Accepts {"seq": n, "ratings": {"<index>": 0|1|2}, "comments": {"<section>": "..."}}. The page
+    sends one batch at a time with an increasing seq; a batch no newer than the last one applied
+    is ignored, so a late retry cannot overwrite newer changes.
+    """
+    draft = session.get('draft')
+    if not draft:
+        return jsonify(error='No review in progress'), 409
+    change = request.get_json(silent=True) or {}
+    seq = change.get('seq')
+    ratings = change.get('ratings') or {}
+    comments = change.get('comments') or {}
+    # JSON true/false and 1.0 compare equal to ints, so the type is checked exactly
+    if type(seq) is not int or not isinstance(ratings, dict) or not isinstance(comments, dict) \
+            or not (ratings or comments):
+        return jsonify(error='Expected a seq and rating or comment changes'), 400
+    for index, value in ratings.items():
+        if not index.isdigit() or not int(index) < draft['size'] or type(value) is not int \
+                or value not in (0, 1, 2):
+            return jsonify(error='Invalid rating'), 400
+    for section, value in comments.items():
+        if section not in draft['sections'] or not isinstance(value, str) or len(value) > MAX_COMMENT_LENGTH:
+            return jsonify(error='Invalid comment'), 400
+    if seq <= draft.get('seq', 0):
+        return jsonify(seq=draft.get('seq', 0), stale=True)
+    draft['ratings'].update((str(int(index)), value) for index, value in ratings.items())
+    draft['comments'].update(comments)
+    draft['seq'] = seq
+    session.modified = True
+    save_draft()
+    return jsonify(seq=seq)
+
+
+def run_narrative_job(review, on_text=None):
+    """Builds the ChatGPT narrative for a stored review. Runs on a narrative worker thread."""
+    generator = build_generator(review)
+    generator.get_chatgpt_feedback(refresh=review.get('refresh', False), engine=narrative_engine, on_text=on_text,
+                                   sectioned=review.get('sectioned', False))
+    return {'chatgpt_result': generator.chatgpt_feedback, 'chatgpt_cached': generator.chatgpt_cached,
+            'chatgpt_fallback': generator.chatgpt_fallback}
+
+
+# Job payload keys besides the review state itself
+JOB_KEYS = ('refresh', 'sectioned', 'reviewer', 'draft_id', 'user_info')
+
+
+def persist_narrative(job):
+    """
+    Logs a finished job's narrative and adds it to the reviewer's draft. Runs on the narrative
+    worker as the job finishes, so the narrative is kept even if the page was closed mid-stream.
+    Fallback narratives are not kept, so reloading the page tries ChatGPT again.
+    """
+    if job.result.get('chatgpt_fallback'):
+        return
+    payload = job.payload
+    review = {k: v for k, v in payload.items() if k not in JOB_KEYS}
+    text, cached = job.result['chatgpt_result'], job.result['chatgpt_cached']
+    chatgpt_input = materialize(review)
+    write_review_log(chatgpt_input, summary_for(chatgpt_input, payload.get('user_info')), text, cached, review,
+                     payload.get('reviewer'))
+    if payload.get('reviewer') and payload.get('draft_id'):
+        draft = session_index.load(payload['reviewer'], payload['draft_id'])
+        if draft and draft.get('review') == review:
+            draft.update(chatgpt_result=text, chatgpt_cached=cached)
+            session_index.save(payload['reviewer'], payload['draft_id'], draft)
+
+
+# LLM calls run on a bounded pool so they never block a request worker; the
+# engine shares one HTTP connection pool and rate limiter across all jobs, and
+# bounds each narrative by an overall deadline (optionally hedging slow requests).
+# Jobs are published to the session store, so any worker can follow, report on or finish a job
+# another worker is running, and a reload landing on another worker does not start it again
+narrative_engine = NarrativeEngine(
+    deadline=float(os.environ.get('NARRATIVE_DEADLINE', 90)),
+    hedge_after=float(os.environ['NARRATIVE_HEDGE_AFTER']) if os.environ.get('NARRATIVE_HEDGE_AFTER') else None,
+)
+narrative_jobs = NarrativeJobQueue(run_narrative_job, on_done=persist_narrative,
+                                   store=open_store(app.config['SESSION_STORE'], 'narrative_jobs'))
+
+
+def safe(s):
+    return ''.join(c if c.isalnum() else '_' for c in s.lower())
+
+
+def write_review_log(chatgpt_input, summary, chatgpt_result, chatgpt_cached=False, review=None, reviewer=None):
+    # Queued for the background writer; see review_log
+    log_entry = {
+        'timestamp': datetime.datetime.now().isoformat(),
+        'user_info': chatgpt_input,
+        'summary': summary,
+        'chatgpt_result': chatgpt_result,
+        'chatgpt_cached': chatgpt_cached,
+        # Anonymous reviewer cookie, so calibration can compare reviewers
+        'reviewer': reviewer or (get_reviewer_id() if flask.has_request_context() else None),
+    }
+    if review and 'ratings' in review:
+        # Compact form: ratings indexed against (role, level, version)
+        log_entry['review'] = review
+    review_log.append(log_entry)
+
+
+def keep_chatgpt_result(chatgpt_result, chatgpt_cached):
+    session['chatgpt_result'] = chatgpt_result
+    session['chatgpt_cached'] = chatgpt_cached
+    save_draft()
+
+
+def store_chatgpt_result(review, chatgpt_input, summary, chatgpt_result, chatgpt_cached):
+    keep_chatgpt_result(chatgpt_result, chatgpt_cached)
+    write_review_log(chatgpt_input, summary, chatgpt_result, chatgpt_cached, review)
+
+
+def current_review():
+    """
+    Returns (review, chatgpt_input, summary) for the session's review, or Nones if there is none.
+    Raises StaleReviewError if the stored ratings no longer fit the role definition.
+    """
+    review = load_review(session)
+    if review is None:
+        return None, None, None
+    chatgpt_input = materialize(review)
+    summary = session.get('summary') or summary_for(chatgpt_input, session.get('user_info'))
+    return review, chatgpt_input, summary
+
+
+def fallback_for(chatgpt_input):
+    """Local draft narrative shown while the ChatGPT narrative is late or unavailable."""
+    return build_fallback_narrative(chatgpt_input['name'], chatgpt_input.get('exceeds'), chatgpt_input.get('meets'),
+                                    chatgpt_input.get('does_not_meet'), chatgpt_input.get('comments'))
+
+
+def job_outcome(job, chatgpt_input):
+    """Returns (text, cached, fallback) for a finished narrative job."""
+    if job.status == FAILED:
+        return (f"ChatGPT feedback is not available - narrative job failed: {job.error}.\n\n"
+                f"{fallback_for(chatgpt_input)}"), False, True
+    return job.result['chatgpt_result'], job.result['chatgpt_cached'], job.result.get('chatgpt_fallback', False)
+
+
+def finish_narrative_job(job, review, chatgpt_input, summary):
+    """
+    Copies a finished job's narrative into the session; persist_narrative() has already logged it.
+    Returns (text, cached, fallback).
+    """
+    session.pop('chatgpt_job_id', None)
+    narrative_jobs.discard(job.id)
+    text, cached, fallback = job_outcome(job, chatgpt_input)
+    if not fallback:
+        keep_chatgpt_result(text, cached)
+    return text, cached, fallback
 
 
 @app.route('/chatgpt_results')
 def chatgpt_results():
-    import time
+    refresh = request.args.get('refresh') == '1'
+    if refresh:
+        # Regenerate: drop the stored narrative and bypass the narrative cache
+        session.pop('chatgpt_result', None)
+        session.pop('chatgpt_cached', None)
+        session.pop('chatgpt_job_id', None)
     chatgpt_result = session.get('chatgpt_result')
-    chatgpt_input = session.get('chatgpt_input')
-    summary = session.get('summary')
+    try:
+        review, chatgpt_input, summary = current_review()
+    except StaleReviewError:
+        # The role definition changed shape since these ratings were stored
+        return redirect(url_for('feedback'))
     # Compute all unique section names for summary
     all_sections = []
     if summary:
-        all_sections = set(summary['meets'].keys()) | set(summary['exceeds'].keys()) | set(summary['does_not_meet'].keys())
+        all_sections = set(summary.get('meets', {})) | set(summary.get('exceeds', {})) | set(summary.get('does_not_meet', {}))
         all_sections = sorted(all_sections)
+
+    promotion = promotion_context(review, summary) if review else None
+
+    def render_result(chatgpt_result, chatgpt_cached=False, chatgpt_fallback=False, stream_job_id=None,
+                      pending_job_id=None):
+        return render_template('chatgpt_results.html', chatgpt_result=chatgpt_result, chatgpt_cached=chatgpt_cached,
+                               chatgpt_fallback=chatgpt_fallback, summary=summary, all_sections=all_sections,
+                               stream_job_id=stream_job_id, pending_job_id=pending_job_id, promotion=promotion)
+
     if chatgpt_result:
-        return render_template('chatgpt_results.html', chatgpt_result=chatgpt_result, summary=summary, all_sections=all_sections)
-    if not chatgpt_input:
+        return render_result(chatgpt_result, session.get('chatgpt_cached', False))
+    if not review:
         return redirect(url_for('index'))
-    # Show loading page while waiting
-    if request.args.get('waited') != '1':
-        # Start feedback generation and redirect after a short wait
-        return render_template('loading.html')
-    # Actually generate feedback
-    generator = PerformanceReviewGenerator(
-        name=chatgpt_input['name'],
-        pronouns=chatgpt_input['pronouns'],
-        role=chatgpt_input['role'],
-        level=chatgpt_input['level'],
-        get_chatgpt_feedback=True,
-    )
-    # Restore feedback lists
-    generator.exceeds_list = chatgpt_input['exceeds']
-    generator.meets_list = chatgpt_input['meets']
-    generator.does_not_meet_list = chatgpt_input['does_not_meet']
-    generator.section_comments = chatgpt_input['comments']  # Fix: use section_comments instead of comments
-    generator.give_feedback()
-    generator.get_chatgpt_feedback()
-    session['chatgpt_result'] = generator.chatgpt_feedback
-    # LOGGING: Save user input/output to JSONL
-    import json, datetime
-    log_entry = {
-        'timestamp': datetime.datetime.now().isoformat(),
-        'user_info': chatgpt_input,
-        'summary': summary,
-        'chatgpt_result': generator.chatgpt_feedback,
-    }
+    job = narrative_jobs.get(session.get('chatgpt_job_id'))
+    if job is None and session.pop('chatgpt_job_id', None):
+        # The job finished and was dropped while no page was open; persist_narrative() kept its text in the draft
+        saved = session_index.load(get_reviewer_id(), session.get('draft_id') or '')
+        if saved and saved.get('review') == review and saved.get('chatgpt_result'):
+            keep_chatgpt_result(saved['chatgpt_result'], saved.get('chatgpt_cached', False))
+            return render_result(saved['chatgpt_result'], saved.get('chatgpt_cached', False))
+    if job is None:
+        if not refresh:
+            # A cached narrative is a disk read away; skip the job queue entirely
+            generator = build_generator(review)
+            cached = generator.get_cached_chatgpt_feedback(sectioned=app.config['SECTIONED_NARRATIVES'])
+            if cached is not None:
+                store_chatgpt_result(review, chatgpt_input, summary, cached, True)
+                return render_result(cached, True)
+        # Queue narrative generation
+        try:
+            session['chatgpt_job_id'] = narrative_jobs.submit(
+                dict(review, refresh=refresh, sectioned=app.config['SECTIONED_NARRATIVES'], reviewer=get_reviewer_id(),
+                     draft_id=session.get('draft_id'), user_info=session.get('user_info')),
+                stream=app.config['STREAM_NARRATIVES'])
+        except QueueFullError:
+            return render_template('loading.html', job_id=None), 503
+        job = narrative_jobs.get(session['chatgpt_job_id'])
+    if not job.finished:
+        if job.stream:
+            # The page fills in the narrative from /chatgpt_stream as it is written
+            return render_result('', stream_job_id=job.id)
+        waited = time.time() - job.submitted_at
+        if waited >= app.config['NARRATIVE_FALLBACK_AFTER']:
+            # Show a local draft now; the page reloads into the real narrative when the job finishes
+            return render_result(fallback_for(chatgpt_input), chatgpt_fallback=True, pending_job_id=job.id)
+        return render_template('loading.html', job_id=job.id,
+                               fallback_in=app.config['NARRATIVE_FALLBACK_AFTER'] - waited)
+    return render_result(*finish_narrative_job(job, review, chatgpt_input, summary))
+
+
+@app.route('/chatgpt_stream/<job_id>')
+def chatgpt_stream(job_id):
+    """
+    Relays a streaming narrative job's text as server-sent events, ending with a 'done' event.
+    If no text has arrived by the fallback deadline a 'fallback' event carries the local draft.
+    """
+    job = narrative_jobs.get(job_id)
+    if job is None or job_id != session.get('chatgpt_job_id'):
+        return jsonify(status='unknown'), 404
     try:
-        os.makedirs('logs', exist_ok=True)
-        # Build a safe filename
-        def safe(s):
-            return ''.join(c if c.isalnum() else '_' for c in s.lower())
-        username = safe(chatgpt_input.get('name', 'anon'))
-        role = safe(chatgpt_input.get('role', 'role'))
-        level = safe(chatgpt_input.get('level', 'level'))
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        fname = f'logs/{username}_{role}_{level}_{timestamp}.json'
-        with open(fname, 'w', encoding='utf-8') as f:
-            json.dump(log_entry, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f'Could not write log: {e}')
-    return render_template('chatgpt_results.html', chatgpt_result=generator.chatgpt_feedback, summary=summary, all_sections=all_sections)
+        _, chatgpt_input, _ = current_review()
+    except StaleReviewError:
+        chatgpt_input = None
+    if chatgpt_input is None:
+        return jsonify(status='unknown'), 404
+    fallback_at = job.submitted_at + app.config['NARRATIVE_FALLBACK_AFTER']
+
+    def events():
+        streaming = fallback_sent = False
+        last_event = time.time()
+        for text in job.follow(heartbeat=1.0):
+            now = time.time()
+            if text is not None:
+                streaming = True
+                yield f"data: {json.dumps(text)}\n\n"
+            elif not streaming and not fallback_sent and now >= fallback_at:
+                fallback_sent = True
+                yield f"event: fallback\ndata: {json.dumps(fallback_for(chatgpt_input))}\n\n"
+            elif now - last_event >= SSE_KEEPALIVE:
+                # A comment line keeps idle connections open
+                yield ": keep-alive\n\n"
+            else:
+                continue
+            last_event = now
+        text, cached, fallback = job_outcome(job, chatgpt_input)
+        yield f"event: done\ndata: {json.dumps(dict(status=job.status, text=text, cached=cached, fallback=fallback))}\n\n"
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/chatgpt_finish/<job_id>', methods=['POST'])
+def chatgpt_finish(job_id):
+    """Copies a finished streaming job's narrative into the session (it was logged as the job finished)."""
+    job = narrative_jobs.get(job_id)
+    if job is None or job_id != session.get('chatgpt_job_id'):
+        return jsonify(status='unknown'), 404
+    if not job.finished:
+        return jsonify(status=PENDING), 409
+    try:
+        review, chatgpt_input, summary = current_review()
+    except StaleReviewError:
+        return jsonify(status='stale'), 409
+    if review is None:
+        return jsonify(status='unknown'), 404
+    finish_narrative_job(job, review, chatgpt_input, summary)
+    return jsonify(status=job.status)
+
+
+@app.route('/chatgpt_status/<job_id>')
+def chatgpt_status(job_id):
+    job = narrative_jobs.get(job_id)
+    if job is None:
+        return jsonify(status='unknown'), 404
+    # Report 'running' as 'pending'; the page only cares whether it can stop polling
+    return jsonify(status=job.status if job.finished else PENDING)
+
+
+@app.route('/chatgpt_jobs')
+def chatgpt_jobs():
+    return jsonify(dict(narrative_jobs.stats(), engine=narrative_engine.stats()))
+
+@app.route('/calibration')
+def calibration():
+    """Rating distributions and outlier reviewers across logged reviews, per role and level."""
+    try:
+        from calibration import OUTLIER_Z, calibration_store
+    except ImportError as e:
+        return render_template('calibration.html', error=f"Calibration needs NumPy ({e}).", choices={}, report=None)
+    calibration_store.refresh()
+    groups = calibration_store.groups()
+    report = None
+    if groups:
+        role, _, level = request.args.get('group', '').partition('|')
+        if not level:
+            role, level = groups[0]['role'], groups[0]['level']
+        report = calibration_store.report(role, level)
+    if request.args.get('format') == 'json':
+        return jsonify(groups=groups, report=report)
+    # One choice per role and level, whatever definition versions its reviews were written against
+    choices = {}
+    for group in groups:
+        key = (group['role'], group['level'])
+        choices[key] = choices.get(key, 0) + group['reviews']
+    return render_template('calibration.html', choices=choices, report=report, z=OUTLIER_Z, error=None)
+
+
+@app.route('/search')
+def search():
+    """Behaviors across all roles and levels matching the query words (or their prefixes)."""
+    query = request.args.get('q', '').strip()
+    role = request.args.get('role') or None
+    level = request.args.get('level') or None
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        limit = 20
+    results = behavior_index.search(query, role, level, limit=limit) if query else []
+    if request.args.get('format') == 'json':
+        return jsonify(query=query, results=results)
+    return render_template('search.html', query=query, role=role, roles=registry.list_roles(), results=results)
+
+
+@app.route('/download/<fmt>')
+def download(fmt):
+    """Streams the current review as text, Markdown or JSON, including the narrative if there is one."""
+    review = load_review(session)
+    if not review:
+        return redirect(url_for('index'))
+    if fmt not in FORMATS:
+        abort(404)
+    try:
+        chatgpt_input = materialize(review)
+    except StaleReviewError:
+        return redirect(url_for('feedback'))
+    doc = build_document(
+        chatgpt_input['exceeds'], chatgpt_input['meets'], chatgpt_input['does_not_meet'],
+        chatgpt_input['comments'], name=chatgpt_input['name'], role=chatgpt_input['role'],
+        level=chatgpt_input['level'], narrative=session.get('chatgpt_result'),
+    )
+    mimetype, ext, _ = FORMATS[fmt]
+    filename = f"{safe(chatgpt_input['name'])}_{safe(chatgpt_input['role'])}_{safe(chatgpt_input['level'])}.{ext}"
+    return Response(
+        stream_with_context(iter_render(doc, fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
+
+@app.route('/export')
+def export():
+    """
+    Streams every logged review matching role, level, since and until as one archive
+    (archive=zip, tar.gz or tar), with a file per review in each requested format.
+    """
+    archive = request.args.get('archive', 'zip')
+    formats = request.args.getlist('format') or ['markdown']
+    if archive not in ARCHIVES or any(fmt not in FORMATS for fmt in formats):
+        abort(400)
+    role = request.args.get('role') or None
+    level = request.args.get('level') or None
+    # Include reviews still queued for the log writer
+    review_log.flush(timeout=5)
+    entries = select_entries(review_log.log_dir, role, level,
+                             request.args.get('since') or None, request.args.get('until') or None)
+    return Response(
+        stream_with_context(iter_archive(entries, formats, archive)),
+        mimetype=ARCHIVES[archive][0],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(archive, role, level)}"'},
+    )
+
+
+def preload():
+    """
+    Loads, compiles and indexes every role definition, with the level definitions and
+    promotion diffs built from it. Nothing here opens files or threads that a forked
+    worker could not use.
+    """
+    with metrics.phase('preload'):
+        for role in registry.list_roles():
+            levels = list(registry.get(role).available_level_map)
+            for level in levels:
+                level_definition(role, level)
+            if levels:
+                promotion_diff(role, levels[0])
+        behavior_index.indexes()
+
+
+def create_app():
+    """
+    App factory for multi-worker servers: ``gunicorn --preload -w 4 'webapp:create_app()'``
+    preloads the role caches once in the master, and the forked workers share them.
+    """
+    preload()
+    return app
 
 if __name__ == '__main__':
     app.run(debug=True)